@@ -0,0 +1,253 @@
+"""
+Tiered result caches for the underwriting graph.
+
+Every cache has an in-process LRU+TTL tier (cachetools) and an optional shared
+persistent tier (SQLite file or Mongo collection) so results are reused across
+workers and restarts. Values must be JSON-serializable.
+"""
+
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from cachetools import TTLCache
+
+from .config import LLM_CACHE_CONFIG, OCR_CACHE_CONFIG
+
+
+def content_hash(payload: Any) -> str:
+    """ Stable sha256 over a JSON-serializable payload. """
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class SQLiteStore:
+    """ Persistent tier in a local SQLite file, shared by processes on one host. """
+
+    PRUNE_EVERY = 100  # writes between size/expiry sweeps
+
+    def __init__(self, path: str, table: str, ttl: int, max_entries: Optional[int] = None):
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_created_at ON {table} (created_at)")
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        if not row:
+            return None
+        if self.ttl and time.time() - row[1] > self.ttl:
+            self.delete(key)
+            return None
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, default=str), time.time())
+            )
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self._prune()
+
+    def _prune(self) -> None:
+        # Drop expired rows, then the oldest rows beyond max_entries
+        if self.ttl:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (time.time() - self.ttl,))
+        if self.max_entries:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f"SELECT key FROM {self.table} ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def delete(self, key: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+
+class MongoStore:
+    """ Persistent tier in a Mongo collection; expiry is handled by a TTL index. """
+
+    def __init__(self, collection, ttl: int):
+        self.collection = collection
+        self.ttl = ttl
+        # In the background: the store is built at import, which must not wait on Mongo
+        threading.Thread(target=self._ensure_index, name=f"index-{collection.name}", daemon=True).start()
+
+    def _ensure_index(self) -> None:
+        try:
+            self.collection.create_index("created_at", expireAfterSeconds=self.ttl)
+        except Exception as e:
+            print(f"⚠️  Could not create TTL index on {self.collection.name}: {e}")
+
+    def get(self, key: str) -> Optional[Any]:
+        doc = self.collection.find_one({"_id": key}, {"value": 1})
+        return doc.get("value") if doc else None
+
+    def set(self, key: str, value: Any) -> None:
+        self.collection.replace_one(
+            {"_id": key},
+            {"_id": key, "value": value, "created_at": datetime.now(timezone.utc)},
+            upsert=True
+        )
+
+    def delete(self, key: str) -> None:
+        self.collection.delete_one({"_id": key})
+
+    def clear(self) -> None:
+        self.collection.delete_many({})
+
+
+class TieredCache:
+    """
+    Memory LRU+TTL tier in front of an optional persistent store, with hit/miss counters.
+    """
+
+    def __init__(self, name: str, max_entries: int, ttl: int, store=None):
+        self.name = name
+        self.store = store
+        self._memory = TTLCache(maxsize=max_entries, ttl=ttl)
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "store_hits": 0, "misses": 0, "errors": 0}
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            value = self._memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+
+        if self.store is not None:
+            try:
+                value = self.store.get(key)
+            except Exception as e:
+                self._count("errors")
+                print(f"⚠️  {self.name} cache store read failed: {e}")
+                value = None
+            if value is not None:
+                with self._lock:
+                    self._memory[key] = value
+                self._count("store_hits")
+                return value
+
+        self._count("misses")
+        return None
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._memory[key] = value
+        if self.store is not None:
+            try:
+                self.store.set(key, value)
+            except Exception as e:
+                self._count("errors")
+                print(f"⚠️  {self.name} cache store write failed: {e}")
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """ Drop one key, or everything when no key is given. """
+        with self._lock:
+            if key is None:
+                self._memory.clear()
+            else:
+                self._memory.pop(key, None)
+        if self.store is not None:
+            self.store.clear() if key is None else self.store.delete(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["store_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["memory_hits"] + stats["store_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+def build_store(db=None, name: str = "llm_cache", config: Dict[str, Any] = LLM_CACHE_CONFIG):
+    """
+    Build the configured persistent tier ('sqlite', 'mongo' or None) for a cache namespace.
+    """
+    backend = config.get('backend')
+    try:
+        if backend == 'sqlite':
+            return SQLiteStore(config['sqlite_path'], name, config['persistent_ttl'],
+                               config.get('persistent_max_entries'))
+        if backend == 'mongo' and db is not None:
+            return MongoStore(db[name], config['persistent_ttl'])
+    except Exception as e:
+        print(f"⚠️  Could not initialise {backend} store for {name}: {e} - using memory tier only")
+    return None
+
+
+def llm_cache_key(request: Dict[str, Any], deployment: str) -> str:
+    """
+    Cache key for a chat completion: model, deployment, prompt messages, max_tokens,
+    temperature and response_format.
+    """
+    return content_hash({
+        "model": request.get("model"),
+        "deployment": deployment,
+        "messages": request.get("messages"),
+        "max_tokens": request.get("max_tokens"),
+        "temperature": request.get("temperature"),
+        "response_format": request.get("response_format"),
+    })
+
+
+llm_response_cache = TieredCache(
+    "llm_response",
+    max_entries=LLM_CACHE_CONFIG['memory_max_entries'],
+    ttl=LLM_CACHE_CONFIG['memory_ttl']
+)
+
+
+def configure_llm_cache(db=None) -> TieredCache:
+    """ Attach the configured persistent tier to the LLM response cache. """
+    llm_response_cache.store = build_store(db, LLM_CACHE_CONFIG['mongo_collection'])
+    return llm_response_cache
+
+
+# Document extraction results keyed by image content hash (see insurance_graph.call_vision)
+ocr_cache = TieredCache(
+    "ocr_extraction",
+    max_entries=OCR_CACHE_CONFIG['memory_max_entries'],
+    ttl=OCR_CACHE_CONFIG['memory_ttl']
+)
+
+
+def configure_ocr_cache(db=None) -> TieredCache:
+    """ Attach the configured persistent tier to the OCR extraction cache. """
+    ocr_cache.store = build_store(db, OCR_CACHE_CONFIG['mongo_collection'], OCR_CACHE_CONFIG)
+    return ocr_cache
+
+
+def ocr_cache_key(digest: str, prompt_version: str) -> str:
+    """
+    OCR cache key: extraction prompt version + content digest (or HTTP validator digest),
+    so bumping the prompt version leaves old extractions unreachable until they expire.
+    """
+    return f"{prompt_version}:{digest}"
@@ -0,0 +1,167 @@
+"""
+Record/replay of LLM, MCP and document traffic.
+
+With CASSETTE_MODE=record every `chat.completions.create`, MCP endpoint call and
+document download for the OCR cache (HEAD validators and the image bytes) is appended to a JSON-lines cassette with its request, response (or error) and
+measured latency. With CASSETTE_MODE=replay the same calls are answered from the
+cassette, sleeping the recorded latency scaled by CASSETTE_TIMING_SCALE, so a
+production run can be replayed against a changed graph without network access.
+
+Requests are matched by content (prompt / tool + PAN / document URL), not by order, so a
+different node topology still finds its responses. Identical requests replay
+in recorded order and the last one repeats once they run out. Only calls that
+reach the network are recorded: LLM response cache hits are served before the
+cassette, so disable the cache (LLM_CACHE_ENABLED=false) for a complete capture.
+"""
+
+import json
+import time
+import asyncio
+import threading
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, Optional
+
+from .cache import content_hash
+from .config import CASSETTE_CONFIG
+from .metrics import current_node
+
+
+class CassetteMiss(LookupError):
+    """ Replay found no recorded call for a request. """
+
+
+class ReplayedError(RuntimeError):
+    """ A call that failed while recording fails the same way on replay. """
+
+
+def llm_request_key(kwargs: Dict[str, Any]) -> str:
+    # Model/deployment left out so a cassette replays against any deployment
+    return content_hash({
+        "kind": "llm",
+        "messages": kwargs.get("messages"),
+        "max_tokens": kwargs.get("max_tokens"),
+        "temperature": kwargs.get("temperature"),
+        "response_format": kwargs.get("response_format")
+    })
+
+
+def mcp_request_key(tool_name: str, pan_number: str) -> str:
+    return content_hash({"kind": "mcp", "tool": tool_name, "pan": pan_number})
+
+
+def document_request_key(method: str, url: str) -> str:
+    return content_hash({"kind": "document", "method": method, "url": url})
+
+
+class Cassette:
+    def __init__(self, mode: str, path: str, timing_scale: float = 1.0, on_miss: str = "error"):
+        self.mode = mode
+        self.path = path
+        self.timing_scale = timing_scale
+        self.on_miss = on_miss
+        self._lock = threading.Lock()
+        self._file = None
+        self._entries: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+        self._last: Dict[str, Dict[str, Any]] = {}
+        if mode == "replay":
+            self._load()
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def _load(self) -> None:
+        count = 0
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries[entry["key"]].append(entry)
+                    count += 1
+        print(f"📼 Replaying {count} recorded calls from {self.path}")
+
+    def record(self, kind: str, key: str, request: Any, response: Any, latency: float,
+               error: Optional[str] = None) -> None:
+        entry = {
+            "kind": kind,
+            "key": key,
+            "node": current_node.get(),
+            "latency": round(latency, 6),
+            "recorded_at": time.time(),
+            "request": request,
+            "response": response,
+            "error": error
+        }
+        line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+
+    def _next(self, kind: str, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            queue = self._entries.get(key)
+            if queue:
+                self._last[key] = queue.popleft()
+            entry = self._last.get(key)
+        if entry is None and self.on_miss != "live":
+            raise CassetteMiss(f"No recorded {kind} call for request {key[:12]} in {self.path}")
+        return entry
+
+    def delay(self, entry: Dict[str, Any]) -> float:
+        return max(0.0, entry["latency"] * self.timing_scale)
+
+    def replay(self, kind: str, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Recorded entry for a request after sleeping its scaled latency.
+        None means "make the call live" (on_miss='live').
+        """
+        entry = self._next(kind, key)
+        if entry is not None:
+            time.sleep(self.delay(entry))
+        return entry
+
+    async def areplay(self, kind: str, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._next(kind, key)
+        if entry is not None:
+            await asyncio.sleep(self.delay(entry))
+        return entry
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+            self._file = None
+
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette() -> Optional[Cassette]:
+    """ Process-wide cassette for CASSETTE_CONFIG, or None when record/replay is off. """
+    global _cassette
+    if CASSETTE_CONFIG['mode'] not in ("record", "replay"):
+        return None
+    if _cassette is None:
+        with _cassette_lock:
+            if _cassette is None:
+                _cassette = Cassette(
+                    CASSETTE_CONFIG['mode'],
+                    CASSETTE_CONFIG['path'],
+                    timing_scale=CASSETTE_CONFIG['timing_scale'],
+                    on_miss=CASSETTE_CONFIG['on_miss']
+                )
+    return _cassette
+
+
+def close_cassette() -> None:
+    global _cassette
+    if _cassette is not None:
+        _cassette.close()
+    _cassette = None
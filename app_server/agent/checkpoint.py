@@ -0,0 +1,329 @@
+"""
+Mongo-backed LangGraph checkpointer.
+
+With a checkpointer the graph saves its state after every super-step, and the
+results of nodes that finished in a step where another node failed. A run is a
+LangGraph thread keyed by application and run ID (`run_config`); invoking the
+graph again on the same thread with no input reruns only the nodes that had not
+completed, so a failed report does not repeat the eight LLM calls before it.
+
+Checkpoints are stored compactly: channel values are msgpack blobs written once
+per channel version (the application document is stored once per run, not once
+per step), and the checkpoint itself only holds versions. `put` / `put_writes`
+only queue the documents; a background thread inserts them in batches, so the graph
+never waits on Mongo between nodes. Documents have deterministic `_id`s and never
+change, so a repeated write is a duplicate key and is ignored. Reads of a thread
+first wait for its queued writes. All three collections expire through a TTL index
+on `created_at`.
+"""
+
+import queue
+import asyncio
+import threading
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (WRITES_IDX_MAP, BaseCheckpointSaver, ChannelVersions, Checkpoint,
+                                       CheckpointMetadata, CheckpointTuple, get_checkpoint_id,
+                                       get_checkpoint_metadata, writes_sort_key)
+
+from .config import CHECKPOINT_CONFIG
+
+BLOBS, WRITES, CHECKPOINTS = "blobs", "writes", "checkpoints"
+# Within a batch, a checkpoint is written after the blobs and writes it refers to
+WRITE_ORDER = (BLOBS, WRITES, CHECKPOINTS)
+
+
+class MongoCheckpointSaver(BaseCheckpointSaver):
+    def __init__(self, db, config: Dict[str, Any] = CHECKPOINT_CONFIG, serde=None):
+        super().__init__(serde=serde)
+        prefix = config['collection_prefix']
+        self.collections = {
+            CHECKPOINTS: db[prefix],
+            BLOBS: db[f"{prefix}_blobs"],
+            WRITES: db[f"{prefix}_writes"]
+        }
+        self.ttl = config['ttl']
+        self.batch_size = config['batch_size']
+        self._queue: queue.Queue = queue.Queue(maxsize=config['max_pending'])
+        self._pending: Dict[str, int] = defaultdict(int)
+        self._cond = threading.Condition()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        self._indexes_ready = False
+
+    # --- Background writer ---
+
+    def ensure_indexes(self) -> None:
+        for name, collection in self.collections.items():
+            collection.create_index("created_at", expireAfterSeconds=self.ttl)
+            if name != BLOBS:
+                collection.create_index([("thread_id", ASCENDING), ("checkpoint_ns", ASCENDING),
+                                         ("checkpoint_id", DESCENDING)])
+        self.collections[CHECKPOINTS].create_index([("application_id", ASCENDING), ("run_id", ASCENDING)])
+        self._indexes_ready = True
+
+    def _enqueue(self, thread_id: str, docs: List[Tuple[str, Dict[str, Any]]], block: bool = True) -> bool:
+        """ Queue documents for the writer; with `block=False`, returns False instead of waiting when it is full. """
+        if self._writer is None:
+            with self._writer_lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+                    self._writer.start()
+        with self._cond:
+            self._pending[thread_id] += 1
+        try:
+            self._queue.put((thread_id, docs), block=block)
+        except queue.Full:
+            self._done([thread_id])
+            return False
+        return True
+
+    async def _aenqueue(self, thread_id: str, docs: List[Tuple[str, Dict[str, Any]]]) -> None:
+        # Backpressure without blocking the event loop: wait for room on a worker thread
+        if not self._enqueue(thread_id, docs, block=False):
+            await asyncio.to_thread(self._enqueue, thread_id, docs)
+
+    def _run(self) -> None:
+        if not self._indexes_ready:
+            try:
+                self.ensure_indexes()
+            except Exception as e:
+                print(f"⚠️  Checkpoint index creation failed: {e}")
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            if stop:
+                return
+
+    def _insert(self, name: str, docs: List[Dict[str, Any]]) -> None:
+        try:
+            self.collections[name].insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+
+    def _write(self, batch: List[Tuple[str, List[Tuple[str, Dict[str, Any]]]]]) -> None:
+        docs: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for _, item_docs in batch:
+            for name, doc in item_docs:
+                docs[name].append(doc)
+        try:
+            for name in WRITE_ORDER:
+                if docs[name]:
+                    self._insert(name, docs[name])
+        except Exception as e:
+            # Checkpoints are best effort: the run goes on, a retry resumes from an earlier step
+            print(f"⚠️  Checkpoint write failed ({len(batch)} queued writes dropped): {e}")
+        finally:
+            self._done([thread_id for thread_id, _ in batch])
+
+    def _done(self, thread_ids: List[str]) -> None:
+        with self._cond:
+            for thread_id in thread_ids:
+                self._pending[thread_id] -= 1
+                if self._pending[thread_id] <= 0:
+                    del self._pending[thread_id]
+            self._cond.notify_all()
+
+    def _wait(self, thread_id: Optional[str] = None) -> None:
+        """ Wait until the queued writes of `thread_id` (all threads when None) are in Mongo. """
+        with self._cond:
+            while self._pending.get(thread_id) if thread_id is not None else self._pending:
+                self._cond.wait()
+
+    def flush(self) -> None:
+        self._wait()
+
+    def close(self) -> None:
+        """ Write everything still queued and stop the writer (it restarts on the next write). """
+        with self._writer_lock:
+            writer, self._writer = self._writer, None
+            if writer is not None:
+                self._queue.put(None)
+                writer.join()
+
+    # --- Reads ---
+
+    def _load(self, doc: Dict[str, Any]) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id = doc["thread_id"], doc["checkpoint_ns"], doc["checkpoint_id"]
+        checkpoint: Checkpoint = self.serde.loads_typed((doc["type"], doc["checkpoint"]))
+
+        blob_ids = [f"{thread_id}|{checkpoint_ns}|{channel}|{version}"
+                    for channel, version in checkpoint["channel_versions"].items()]
+        channel_values = {}
+        for blob in self.collections[BLOBS].find({"_id": {"$in": blob_ids}}):
+            if blob["type"] != "empty":
+                channel_values[blob["channel"]] = self.serde.loads_typed((blob["type"], blob["value"]))
+
+        writes = sorted(self.collections[WRITES].find({"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                                       "checkpoint_id": checkpoint_id}),
+                        key=lambda w: writes_sort_key(w["task_path"], w["task_id"], w["idx"]))
+
+        parent_id = doc.get("parent_checkpoint_id")
+        return CheckpointTuple(
+            config=_config(thread_id, checkpoint_ns, checkpoint_id),
+            checkpoint={**checkpoint, "channel_values": channel_values},
+            metadata=self.serde.loads_typed((doc["metadata_type"], doc["metadata"])),
+            parent_config=_config(thread_id, checkpoint_ns, parent_id) if parent_id else None,
+            pending_writes=[(w["task_id"], w["channel"], self.serde.loads_typed((w["type"], w["value"])))
+                            for w in writes]
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        configurable = config["configurable"]
+        thread_id = configurable["thread_id"]
+        self._wait(thread_id)
+        query = {"thread_id": thread_id, "checkpoint_ns": configurable.get("checkpoint_ns", "")}
+        if checkpoint_id := get_checkpoint_id(config):
+            query["checkpoint_id"] = checkpoint_id
+        doc = self.collections[CHECKPOINTS].find_one(query, sort=[("checkpoint_id", DESCENDING)])
+        return self._load(doc) if doc else None
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        query: Dict[str, Any] = {}
+        if config:
+            configurable = config["configurable"]
+            query["thread_id"] = configurable["thread_id"]
+            self._wait(configurable["thread_id"])
+            if configurable.get("checkpoint_ns") is not None:
+                query["checkpoint_ns"] = configurable["checkpoint_ns"]
+            if checkpoint_id := get_checkpoint_id(config):
+                query["checkpoint_id"] = checkpoint_id
+        else:
+            self._wait()
+        if before and (before_id := get_checkpoint_id(before)):
+            query["checkpoint_id"] = {"$lt": before_id}
+
+        count = 0
+        for doc in self.collections[CHECKPOINTS].find(query).sort("checkpoint_id", DESCENDING):
+            found = self._load(doc)
+            if filter and any(found.metadata.get(k) != v for k, v in filter.items()):
+                continue
+            yield found
+            count += 1
+            if limit and count >= limit:
+                return
+
+    # --- Writes (queued) ---
+
+    def _checkpoint_docs(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                         new_versions: ChannelVersions) -> Tuple[str, List[Tuple[str, Dict[str, Any]]], RunnableConfig]:
+        configurable = config["configurable"]
+        thread_id = configurable["thread_id"]
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        now = datetime.now(timezone.utc)
+
+        saved = checkpoint.copy()
+        values = saved.pop("channel_values")
+        docs = []
+        # Only channels updated in this step get a new blob
+        for channel, version in new_versions.items():
+            value_type, value = self.serde.dumps_typed(values[channel]) if channel in values else ("empty", b"")
+            docs.append((BLOBS, {
+                "_id": f"{thread_id}|{checkpoint_ns}|{channel}|{version}",
+                "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "channel": channel,
+                "type": value_type, "value": value, "created_at": now
+            }))
+
+        checkpoint_type, data = self.serde.dumps_typed(saved)
+        metadata_type, metadata_data = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        docs.append((CHECKPOINTS, {
+            "_id": f"{thread_id}|{checkpoint_ns}|{checkpoint['id']}",
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": checkpoint["id"],
+            "parent_checkpoint_id": configurable.get("checkpoint_id"),
+            "application_id": configurable.get("application_id"),
+            "run_id": configurable.get("run_id"),
+            "step": metadata.get("step"),
+            "type": checkpoint_type,
+            "checkpoint": data,
+            "metadata_type": metadata_type,
+            "metadata": metadata_data,
+            "created_at": now
+        }))
+        return thread_id, docs, _config(thread_id, checkpoint_ns, checkpoint["id"])
+
+    def _writes_docs(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                     task_path: str) -> Tuple[str, List[Tuple[str, Dict[str, Any]]]]:
+        configurable = config["configurable"]
+        thread_id = configurable["thread_id"]
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        checkpoint_id = configurable["checkpoint_id"]
+        now = datetime.now(timezone.utc)
+        docs = []
+        for idx, (channel, value) in enumerate(writes):
+            # Special channels (errors, interrupts) have fixed negative indexes
+            idx = WRITES_IDX_MAP.get(channel, idx)
+            value_type, data = self.serde.dumps_typed(value)
+            docs.append((WRITES, {
+                "_id": f"{thread_id}|{checkpoint_ns}|{checkpoint_id}|{task_id}|{idx}",
+                "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id,
+                "task_id": task_id, "task_path": task_path, "idx": idx, "channel": channel,
+                "type": value_type, "value": data, "created_at": now
+            }))
+        return thread_id, docs
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id, docs, saved_config = self._checkpoint_docs(config, checkpoint, metadata, new_versions)
+        self._enqueue(thread_id, docs)
+        return saved_config
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        self._enqueue(*self._writes_docs(config, writes, task_id, task_path))
+
+    def delete_thread(self, thread_id: str) -> None:
+        self._wait(thread_id)
+        for collection in self.collections.values():
+            collection.delete_many({"thread_id": thread_id})
+
+    # --- Async API: reads run on a worker thread, writes are queued without blocking the loop ---
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None,
+                    limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        found = await asyncio.to_thread(lambda: [*self.list(config, filter=filter, before=before, limit=limit)])
+        for item in found:
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id, docs, saved_config = self._checkpoint_docs(config, checkpoint, metadata, new_versions)
+        await self._aenqueue(thread_id, docs)
+        return saved_config
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        await self._aenqueue(*self._writes_docs(config, writes, task_id, task_path))
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+def _config(thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> RunnableConfig:
+    return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                             "checkpoint_id": checkpoint_id}}
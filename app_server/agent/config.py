@@ -3,6 +3,8 @@ Configuration for Insurance Underwriting POC
 Centralized configuration for easy tuning without code changes
 """
 
+import os
+
 UNDERWRITING_CONFIG = {
     # Risk score thresholds for final decision
     'risk_thresholds': {
@@ -36,8 +38,27 @@ UNDERWRITING_CONFIG = {
     # Timeout settings (seconds)
     'timeouts': {
         'llm_api': 30,
-        'mcp_api': 10,
-        'thread_join': 15
+        'mcp_api': {          # per MCP endpoint, 'default' for the rest
+            'default': 10,
+            'insurance_history': 10,
+            'financial_eligibility': 10
+        },
+        'thread_join': 15,
+        'document_fetch': 10  # downloading document images for the OCR cache
+    },
+    
+    # Concurrency caps for fan-out work inside a node
+    'concurrency': {
+        'ocr_per_application': 4,   # parallel vision calls for one application
+        'ocr_per_process': 16       # parallel vision calls across all applications
+    },
+    
+    # Shared HTTP connection pools (Azure OpenAI and MCP clients)
+    'connection_pool': {
+        'max_connections': 100,
+        'max_keepalive_connections': 20,
+        'keepalive_expiry': 30,  # seconds
+        'http2': False           # requires the 'h2' package
     },
     
     # Retry settings
@@ -63,6 +84,255 @@ AZURE_CONFIG = {
     'temperature': 0.0  # Deterministic for underwriting decisions
 }
 
+# Local decision engine (see agent/scoring.py)
+DECISION_CONFIG = {
+    # 'deferred': LLM ai_summary runs alongside the report text; 'inline': in the decision node;
+    # 'off': template summary only
+    'ai_summary': os.getenv("DECISION_AI_SUMMARY", "deferred"),
+    # Share of risk weight that may be missing/errored and still allow an automatic Accept
+    'max_missing_weight_for_accept': 0.1
+}
+
+# Rule-based fast path for clear-cut components (see agent/rules.py)
+FAST_PATH_CONFIG = {
+    'enabled': os.getenv("FAST_PATH_ENABLED", "true").lower() == "true",
+    'health': {
+        'base_score': 0.05,
+        'min_bmi': 18.5,                          # below this the LLM decides
+        'max_age': 45,
+        'max_non_medical_sum_assured': 10000000   # 1 crore
+    },
+    'occupation': {
+        'base_score': 0.05,
+        'low_risk_industries': ['it', 'software', 'technology', 'banking', 'finance', 'insurance',
+                                'education', 'healthcare', 'government', 'consulting', 'telecom'],
+        'high_risk_industries': ['export', 'jewel', 'real estate', 'scrap', 'shipping',
+                                 'stock brok', 'mining', 'aviation'],
+        'hazardous_terms': ['construction', 'driver', 'pilot', 'diver', 'explosive', 'security guard',
+                            'armed', 'police', 'army', 'navy', 'factory', 'chemical', 'oil', 'offshore']
+    },
+    'financial': {
+        'base_score': 0.1,
+        'max_ratio_utilisation': 0.8,   # coverage/income must stay under 80% of the age limit
+        'max_liabilities_to_income': 2
+    }
+}
+
+# Local application normalization in ingest (see agent/normalizer.py)
+NORMALIZATION_CONFIG = {
+    # Ask the LLM for a patch covering only the fields the local pass could not resolve
+    'llm_fallback': os.getenv("NORMALIZER_LLM_FALLBACK", "true").lower() == "true",
+    'default_country_code': '+91',
+    # Tried in order after ISO; day-first as on Indian application forms
+    'date_formats': ['%d-%m-%Y', '%d/%m/%Y', '%d.%m.%Y', '%Y/%m/%d', '%d %b %Y', '%d %B %Y',
+                     '%b %d %Y', '%B %d %Y', '%d-%b-%Y', '%d-%B-%Y', '%Y%m%d'],
+    'patch_max_tokens': 300
+}
+
+# Early exit for applications an earlier node has already decided (see agent/short_circuit.py)
+SHORT_CIRCUIT_CONFIG = {
+    'enabled': os.getenv("SHORT_CIRCUIT_ENABLED", "true").lower() == "true",
+    # Checked right after ingest: no component node runs
+    'missing_pan': {'enabled': True, 'decision': 'Manual Review'},
+    'missing_sections': {
+        'enabled': True,
+        'decision': 'Manual Review',
+        # Required section -> the names it may be stored under
+        'sections': {
+            'personal_details': ['personal_details'],
+            'health_info': ['health_info', 'health_information'],
+            'coverage_selection': ['coverage_selection']
+        }
+    },
+    # Checked on component results: remaining component nodes are skipped
+    'kyc_rejected': {'enabled': True, 'decision': 'Decline'},
+    'health_decline': {'enabled': True, 'decision': 'Decline', 'min_risk_score': 0.8},
+    # Nodes that do not run once a short-circuit has fired
+    'skip_nodes': ['kyc', 'financial', 'insurance_history'],
+    # Template report instead of the LLM-written one (and no deferred AI summary)
+    'brief_report': True
+}
+
+# OpenTelemetry tracing (see agent/tracing.py)
+TRACING_CONFIG = {
+    # 'otlp' (collector at OTEL_EXPORTER_OTLP_ENDPOINT), 'file' (JSON lines), 'console' or 'none'
+    'exporter': os.getenv("TRACING_EXPORTER", "otlp" if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT") else "none"),
+    'otlp_endpoint': os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318"),
+    'file_path': os.getenv("TRACING_FILE_PATH", "traces.jsonl"),
+    'service_name': os.getenv("OTEL_SERVICE_NAME", "insurance-underwriting"),
+    # openinference LangChain spans carry full node inputs/outputs (application PII); opt in
+    'instrument_langchain': os.getenv("TRACING_INSTRUMENT_LANGCHAIN", "false").lower() == "true"
+}
+
+# Request deadline and per-node time budgets (see agent/deadline.py)
+DEADLINE_CONFIG = {
+    'enabled': os.getenv("DEADLINE_ENABLED", "true").lower() == "true",
+    'default_seconds': float(os.getenv("UNDERWRITING_DEADLINE_SECONDS", "120")),
+    # Relative cost of each node; a node gets the remaining time x its share of the
+    # heaviest remaining path through the graph
+    'node_weights': {
+        'ingest': 1,
+        'document_processing': 4,
+        'kyc': 3,
+        'health': 3,
+        'fetch_mcp': 1,
+        'financial': 2,
+        'insurance_history': 2,
+        'occupation': 2,
+        'decision': 0.5,
+        'report': 4,
+        'brief_report': 1
+    },
+    # Local, fast nodes that always run so a decision is returned even past the deadline
+    'exempt_nodes': ['decision', 'brief_report'],
+    'ingest_timeout_decision': 'Manual Review',
+    'min_call_timeout': 0.5,        # seconds; floor for LLM / MCP / Mongo call timeouts
+    'sync_workers': 64              # threads running budgeted nodes on the sync (invoke) path
+}
+
+# Reading application documents from Mongo
+APPLICATION_FETCH_CONFIG = {
+    'collection': 'life_insurance_applications',
+    # Only the sections the graph reads are fetched (false: the whole document)
+    'projection': os.getenv("APPLICATION_PROJECTION", "true").lower() == "true",
+    'sections': ['personal_details', 'contact_info', 'health_info', 'health_information', 'coverage_selection',
+                 'policy_selection', 'nominee_details', 'payment', 'occupation_details', 'financial_information'],
+    # Per uploaded document, the fields OCR and the report use; embedded file contents stay in Mongo
+    'document_fields': ['docType', 'filename', 'url'],
+    # ObjectId / datetime to strings while decoding: "typed" (BSON type decoders in the driver)
+    # or "json" (one json round-trip, for clients without custom type registries such as mongomock)
+    'codec': os.getenv("APPLICATION_CODEC", "typed")
+}
+
+# Mongo clients (see agent/mongo.py); both are created on first use
+MONGO_CONFIG = {
+    'uri': os.getenv("MONGODB_URI"),
+    'database': os.getenv("MONGODB_DATABASE", "insurance_ai"),
+    # Per client (sync and async each have a pool); size it to the nodes and workers running at once
+    'max_pool_size': int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+    'min_pool_size': int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+    'max_idle_time_ms': 300000,
+    'wait_queue_timeout_ms': int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000")),
+    # Fail fast instead of the driver's 30s when Mongo is unreachable
+    'server_selection_timeout_ms': int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+    'connect_timeout_ms': 5000,
+    # For the read-heavy collections below: primary, primary_preferred, secondary,
+    # secondary_preferred or nearest. Everything else reads from the primary.
+    'read_preference': os.getenv("MONGO_READ_PREFERENCE", "primary"),
+    'max_staleness_seconds': int(os.getenv("MONGO_MAX_STALENESS_SECONDS", "-1")),  # -1: no limit
+    'read_collections': [APPLICATION_FETCH_CONFIG['collection'], 'medical_reports'],
+    # PyMongo's AsyncMongoClient for async nodes and the API (false: sync client on worker threads)
+    'async_driver': os.getenv("MONGO_ASYNC_DRIVER", "true").lower() == "true"
+}
+
+# /underwrite/batch
+BATCH_CONFIG = {
+    # Graphs running at once per batch; size it to the LLM rate limit, not the batch
+    'max_concurrency': int(os.getenv("BATCH_MAX_CONCURRENCY", "8")),
+    'max_items': int(os.getenv("BATCH_MAX_ITEMS", "5000")),
+    'prefetch_chunk_size': 500,   # ids per $in query
+    # Mongo filter operators that run server-side JavaScript; rejected in batch filters
+    'forbidden_filter_operators': ['$where', '$function', '$accumulator']
+}
+
+# Job mode for /underwrite (see agent/jobs.py)
+JOBS_CONFIG = {
+    'collection': 'underwriting_jobs',
+    # Worker tasks inside each API process; 0 leaves jobs to `python -m app_server.agent.jobs`
+    'workers': int(os.getenv("JOB_WORKERS", "4")),
+    'lease_seconds': 120,           # a job whose worker stops renewing is reclaimed after this
+    'heartbeat_interval': 30,       # seconds between lease renewals
+    'poll_interval': 1.0,           # idle worker sleep between claim attempts
+    'max_attempts': 3,
+    'result_ttl': 7 * 24 * 3600     # finished jobs are removed by a TTL index
+}
+
+# Durable LangGraph checkpoints so a failed or crashed run resumes from its last completed node
+# (see agent/checkpoint.py)
+CHECKPOINT_CONFIG = {
+    'enabled': os.getenv("CHECKPOINT_ENABLED", "true").lower() == "true",
+    'collection_prefix': 'graph_checkpoints',   # <prefix>, <prefix>_blobs, <prefix>_writes
+    'ttl': int(os.getenv("CHECKPOINT_TTL_SECONDS", str(3 * 24 * 3600))),
+    'batch_size': 200,              # writes per bulk_write from the background writer
+    'max_pending': 10000            # queued writes before callers block on the writer
+}
+
+# Reuse of /underwrite results (see agent/results.py)
+RESULTS_CONFIG = {
+    'enabled': os.getenv("RESULT_STORE_ENABLED", "true").lower() == "true",
+    'collection': 'underwriting_results',
+    'ttl': int(os.getenv("RESULT_TTL_SECONDS", str(30 * 24 * 3600))),
+    'version': 'v1',                # bump when prompts / guidelines / scoring change
+    # Amended applications re-run only the nodes fed by the changed sections
+    'incremental': os.getenv("INCREMENTAL_UNDERWRITING", "true").lower() == "true"
+}
+
+# Record/replay of LLM, MCP and document traffic (see agent/cassette.py)
+CASSETTE_CONFIG = {
+    'mode': os.getenv("CASSETTE_MODE", "off"),              # 'off' | 'record' | 'replay'
+    'path': os.getenv("CASSETTE_PATH", "cassette.jsonl"),
+    # Replayed calls sleep recorded latency x scale: 1.0 original timing, 0 instant
+    'timing_scale': float(os.getenv("CASSETTE_TIMING_SCALE", "1.0")),
+    # Replay of a request not in the cassette: 'error' (no network access) or 'live'
+    'on_miss': os.getenv("CASSETTE_ON_MISS", "error")
+}
+
+# Process-wide Azure OpenAI quota limiter (see agent/rate_limit.py); retries use UNDERWRITING_CONFIG['retry']
+RATE_LIMIT_CONFIG = {
+    'enabled': os.getenv("LLM_RATE_LIMIT_ENABLED", "true").lower() == "true",
+    # Deployment quota; each process gets its share when several share the deployment (0: unlimited)
+    'requests_per_minute': int(os.getenv("AZURE_OPENAI_RPM", "300")),
+    'tokens_per_minute': int(os.getenv("AZURE_OPENAI_TPM", "50000")),
+    'burst_seconds': 10,          # Azure enforces the per-minute quota over ~10s windows
+    'image_tokens': 765,          # prompt-token estimate per attached image
+    'default_max_tokens': 1000,   # counted against TPM when a request sets no max_tokens
+    # AIMD concurrency: +1 per `limit` successes, x decrease_factor on a 429
+    'initial_concurrency': 8,
+    'min_concurrency': 1,
+    'max_concurrency': int(os.getenv("LLM_MAX_CONCURRENCY", "32")),
+    'decrease_factor': 0.5,
+    'max_retry_after': 60         # seconds; longer Retry-After values are capped
+}
+
+# LLM response cache (see agent/cache.py)
+LLM_CACHE_CONFIG = {
+    'enabled': os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true",
+    'memory_max_entries': 2048,
+    'memory_ttl': 3600,                 # seconds
+    'backend': os.getenv("LLM_CACHE_BACKEND"),  # None | 'sqlite' | 'mongo'
+    'sqlite_path': os.getenv("LLM_CACHE_SQLITE_PATH", "llm_cache.sqlite3"),
+    'mongo_collection': 'llm_cache',
+    'persistent_ttl': 7 * 24 * 3600,    # seconds
+    'cache_report': False               # report_node runs at temperature 0.3; opt in explicitly
+}
+
+# Document extraction (OCR) cache keyed by image content hash
+OCR_CACHE_CONFIG = {
+    'enabled': os.getenv("OCR_CACHE_ENABLED", "true").lower() == "true",
+    'memory_max_entries': 512,
+    'memory_ttl': 24 * 3600,            # seconds
+    'backend': os.getenv("OCR_CACHE_BACKEND", LLM_CACHE_CONFIG['backend']),  # None | 'sqlite' | 'mongo'
+    'sqlite_path': os.getenv("OCR_CACHE_SQLITE_PATH", LLM_CACHE_CONFIG['sqlite_path']),
+    'mongo_collection': 'ocr_cache',
+    'persistent_ttl': 30 * 24 * 3600,   # seconds
+    'persistent_max_entries': 100000,   # SQLite only; Mongo relies on the TTL index
+    'prompt_version': 'v1',             # bump when the extraction prompt changes
+    'use_http_validators': True,        # reuse results by ETag / Last-Modified for remote images
+    # Document store hosts the service may download images from for the OCR cache (exact host,
+    # or ".example.com" for its subdomains). Other URLs are passed to the model uncached.
+    'document_hosts': [h.strip().lower() for h in os.getenv("DOCUMENT_STORE_HOSTS", "").split(",") if h.strip()],
+    'max_document_bytes': int(os.getenv("MAX_DOCUMENT_BYTES", str(10 * 1024 * 1024)))
+}
+
+# Underwriting guidelines retrieval for the health node (see agent/guidelines.py)
+GUIDELINES_CONFIG = {
+    'chunk_max_chars': 800,
+    'top_k': 4,                   # sections sent to the LLM
+    'max_excerpt_chars': 2400,    # prompt budget for the excerpt
+    'min_relative_score': 0.2,    # drop sections scoring below 20% of the best match
+    'reload_check_interval': 5    # seconds between mtime checks
+}
+
 # MongoDB collections
 MONGODB_COLLECTIONS = {
     'applications': 'applications',
@@ -0,0 +1,107 @@
+"""
+Request deadlines and per-node time budgets.
+
+An underwriting carries an absolute `deadline` in the graph state (per request, or
+DEADLINE_CONFIG['default_seconds'] from the start of ingest). When a node starts it
+gets a share of the remaining time proportional to its weight over the heaviest
+remaining path to the end of the graph, so parallel branches share the same window
+and later nodes keep their part. The node budget is enforced in `timed_node` and
+published through `node_deadline`, which LLM, MCP, Mongo and document calls use to
+cap their own timeouts.
+"""
+
+import time
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .config import DEADLINE_CONFIG
+from .metrics import bind_node
+
+# Absolute (time.time()) end of the current node's budget
+node_deadline: contextvars.ContextVar = contextvars.ContextVar("underwriting_node_deadline", default=None)
+
+_sync_pool = ThreadPoolExecutor(max_workers=DEADLINE_CONFIG['sync_workers'], thread_name_prefix="node")
+
+
+class NodeTimeout(TimeoutError):
+    """ A node did not finish within its budget. """
+
+
+def request_deadline(seconds: Optional[float] = None) -> Optional[float]:
+    """ Absolute deadline `seconds` (default from config) from now, or None when deadlines are off. """
+    if not DEADLINE_CONFIG['enabled']:
+        return None
+    return time.time() + (seconds if seconds is not None else DEADLINE_CONFIG['default_seconds'])
+
+
+def critical_path_weights(successors: Dict[str, List[str]]) -> Dict[str, float]:
+    """ For each node, the weight of the heaviest path from it (inclusive) to the end of the graph. """
+    weights = DEADLINE_CONFIG['node_weights']
+    paths: Dict[str, float] = {}
+
+    def path(node: str) -> float:
+        if node not in paths:
+            paths[node] = weights.get(node, 1) + max((path(n) for n in successors.get(node, [])), default=0)
+        return paths[node]
+
+    for node in successors:
+        path(node)
+    return paths
+
+
+def node_budget(name: str, deadline: Optional[float], path_weights: Dict[str, float]) -> Optional[float]:
+    """ Seconds this node may take (<= 0 once the deadline has passed), or None if unbounded. """
+    if deadline is None or not DEADLINE_CONFIG['enabled'] or name in DEADLINE_CONFIG['exempt_nodes']:
+        return None
+    share = DEADLINE_CONFIG['node_weights'].get(name, 1) / path_weights.get(name, 1)
+    return (deadline - time.time()) * share
+
+
+@contextmanager
+def deadline_context(budget: Optional[float]) -> Iterator[None]:
+    token = node_deadline.set(time.time() + budget if budget is not None else None)
+    try:
+        yield
+    finally:
+        node_deadline.reset(token)
+
+
+def time_left() -> Optional[float]:
+    """ Seconds left in the current node's budget, or None when it is unbounded. """
+    deadline = node_deadline.get()
+    return None if deadline is None else deadline - time.time()
+
+
+def call_timeout(default: Optional[float]) -> Optional[float]:
+    """ `default` (None: no timeout) capped to what is left of the current node's budget. """
+    left = time_left()
+    if left is None:
+        return default
+    left = max(DEADLINE_CONFIG['min_call_timeout'], left)
+    return left if default is None else min(default, left)
+
+
+def run_with_budget(fn: Callable[[Any], Any], state: Any, budget: Optional[float]) -> Any:
+    """
+    Run a sync node within its budget. The node runs on a worker thread so the graph
+    can move on when it overruns; the abandoned call ends on its own capped timeouts.
+    """
+    if budget is None:
+        return fn(state)
+    future = _sync_pool.submit(bind_node(fn), state)
+    try:
+        return future.result(timeout=budget)
+    except FutureTimeout:
+        raise NodeTimeout(f"exceeded its {budget:.1f}s budget") from None
+
+
+async def arun_with_budget(afn: Callable[[Any], Any], state: Any, budget: Optional[float]) -> Any:
+    if budget is None:
+        return await afn(state)
+    try:
+        return await asyncio.wait_for(afn(state), budget)
+    except asyncio.TimeoutError:
+        raise NodeTimeout(f"exceeded its {budget:.1f}s budget") from None
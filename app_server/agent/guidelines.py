@@ -0,0 +1,204 @@
+"""
+Underwriting guidelines index for the health node.
+
+The guidelines file is loaded and chunked once, indexed with BM25, and reloaded
+only when its modification time changes. `health_node` retrieves the sections
+relevant to the applicant (age band, sum assured, BMI, disclosed conditions)
+instead of sending the first few thousand characters of the file.
+"""
+
+import os
+import re
+import math
+import time
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+from .config import GUIDELINES_CONFIG, PATHS
+
+_TOKEN_RE = re.compile(r"[a-z]+|\d+")
+_HEADING_RE = re.compile(r"^\s*(#+\s+|\d+(\.\d+)*[.)]?\s+[A-Z]|[A-Z][A-Z0-9 /&()-]{3,}:?\s*$)")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "if", "in", "is", "it",
+    "of", "on", "or", "the", "to", "with", "will", "should", "may", "than", "this", "that"
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def chunk_guidelines(text: str, max_chars: int) -> List[str]:
+    """
+    Split the guidelines into one chunk per section (a heading line starts a section).
+    Sections longer than `max_chars` are split at paragraph, then line, boundaries,
+    and every piece keeps the section heading so it stays self-describing.
+    """
+    sections, current = [], []
+    for line in text.splitlines():
+        if _HEADING_RE.match(line) and current:
+            sections.append(current)
+            current = []
+        current.append(line)
+    if current:
+        sections.append(current)
+
+    chunks = []
+    for lines in sections:
+        section = "\n".join(lines).strip()
+        if not section:
+            continue
+        if len(section) <= max_chars:
+            chunks.append(section)
+            continue
+        heading = lines[0].strip() if _HEADING_RE.match(lines[0]) else ""
+        body = "\n".join(lines[1:] if heading else lines)
+        pieces = [p.strip() for p in re.split(r"\n\s*\n|\n", body) if p.strip()]
+        buf = heading
+        for piece in pieces:
+            while len(piece) > max_chars:
+                chunks.append(f"{heading}\n{piece[:max_chars]}".strip())
+                piece = piece[max_chars:]
+            if buf and len(buf) + len(piece) + 1 > max_chars:
+                chunks.append(buf)
+                buf = heading
+            buf = f"{buf}\n{piece}" if buf else piece
+        if buf and buf != heading:
+            chunks.append(buf)
+    return chunks
+
+
+class BM25:
+    """ Minimal Okapi BM25 over pre-tokenized documents. """
+
+    def __init__(self, docs: List[List[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.tfs = [Counter(d) for d in docs]
+        self.lengths = [len(d) for d in docs]
+        self.avgdl = (sum(self.lengths) / len(docs)) if docs else 0.0
+        df = Counter(t for d in docs for t in set(d))
+        n = len(docs)
+        self.idf = {t: math.log(1 + (n - f + 0.5) / (f + 0.5)) for t, f in df.items()}
+
+    def scores(self, query: Iterable[str]) -> List[float]:
+        terms = [t for t in query if t in self.idf]
+        out = []
+        for tf, length in zip(self.tfs, self.lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / self.avgdl) if self.avgdl else self.k1
+            for t in terms:
+                f = tf.get(t)
+                if f:
+                    score += self.idf[t] * f * (self.k1 + 1) / (f + norm)
+            out.append(score)
+        return out
+
+
+class GuidelinesIndex:
+    """
+    Lazily loaded, mtime-reloaded BM25 index over the underwriting guidelines file.
+    """
+
+    def __init__(self, candidate_paths: List[str], config: Dict[str, Any] = GUIDELINES_CONFIG):
+        self.candidate_paths = candidate_paths
+        self.config = config
+        self.path = None
+        self.chunks: List[str] = []
+        self._bm25: Optional[BM25] = None
+        self._mtime = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def _resolve_path(self) -> Optional[str]:
+        for p in self.candidate_paths:
+            p_norm = os.path.normpath(p)
+            if os.path.exists(p_norm):
+                return p_norm
+        return None
+
+    def ensure_loaded(self) -> None:
+        """ Load on first use, then re-check the file's mtime at most every `reload_check_interval`. """
+        now = time.monotonic()
+        if self._bm25 is not None and now - self._last_check < self.config['reload_check_interval']:
+            return
+        with self._lock:
+            self._last_check = now
+            path = self._resolve_path()
+            if not path:
+                if self.path:
+                    print(f"⚠️  Underwriting guidelines no longer found at {self.path}")
+                self.path, self.chunks, self._bm25, self._mtime = None, [], BM25([]), None
+                return
+            mtime = os.path.getmtime(path)
+            if path == self.path and mtime == self._mtime:
+                return
+            with open(path, "r", encoding="utf-8", errors="ignore") as gf:
+                text = gf.read()
+            chunks = chunk_guidelines(text, self.config['chunk_max_chars'])
+            self.chunks, self._bm25 = chunks, BM25([tokenize(c) for c in chunks])
+            self.path, self._mtime = path, mtime
+            print(f"📚 Indexed underwriting guidelines: {len(chunks)} sections from {path}")
+
+    def search(self, query_terms: List[str], top_k: Optional[int] = None, max_chars: Optional[int] = None) -> List[str]:
+        """
+        Return the best-matching sections (in document order) within the character budget.
+        Falls back to the leading sections when nothing in the query matches.
+        """
+        self.ensure_loaded()
+        top_k = top_k or self.config['top_k']
+        max_chars = max_chars or self.config['max_excerpt_chars']
+        if not self.chunks:
+            return []
+
+        scores = self._bm25.scores(query_terms)
+        cutoff = max(scores) * self.config['min_relative_score']
+        ranked = [i for i in sorted(range(len(scores)), key=lambda i: -scores[i]) if scores[i] > 0 and scores[i] >= cutoff]
+        if not ranked:
+            ranked = list(range(len(self.chunks)))
+
+        picked, used = [], 0
+        for i in ranked:
+            size = len(self.chunks[i])
+            if used + size > max_chars:
+                continue
+            picked.append(i)
+            used += size
+            if len(picked) >= top_k:
+                break
+        return [self.chunks[i] for i in sorted(picked)]
+
+
+def applicant_query(age: Optional[int], sum_assured: Optional[float], bmi: Optional[float],
+                    conditions: List[str]) -> List[str]:
+    """
+    Build BM25 query terms for the applicant. Numbers are expanded to the band
+    boundaries guideline tables usually use (5/10-year ages, lakh/crore amounts).
+    """
+    terms = tokenize("medical examination requirements chart non medical limits")
+    if age:
+        terms += tokenize("age years")
+        terms += [str(age), str(age // 5 * 5), str(age // 5 * 5 + 5), str(age // 10 * 10), str(age // 10 * 10 + 10)]
+    if sum_assured:
+        terms += tokenize("sum assured cover")
+        lakhs = int(sum_assured // 100000)
+        if lakhs:
+            terms += ["lakh", "lakhs", "lac", str(lakhs)]
+        if sum_assured >= 10000000:
+            terms += ["crore", "crores", "cr", str(int(sum_assured // 10000000))]
+    if bmi:
+        terms += tokenize("bmi build height weight obesity overweight")
+        terms += [str(int(bmi)), str(int(bmi) // 5 * 5)]
+    for condition in conditions:
+        terms += tokenize(condition)
+    return terms
+
+
+GUIDELINE_PATHS = [
+    PATHS['underwriting_guidelines'],
+    os.path.join("..", "insurance mcp", "underwriting_guidelines.txt"),
+    os.path.join(os.path.dirname(__file__), "..", "..", "..", "insurance mcp", "underwriting_guidelines.txt")
+]
+
+guidelines_index = GuidelinesIndex(GUIDELINE_PATHS)
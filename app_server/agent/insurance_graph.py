@@ -1,32 +1,52 @@
 import os
+import copy
 import json
 import base64
+import hashlib
 import time
+import uuid
+import asyncio
 import threading
-import requests
-from typing import TypedDict, Annotated, List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypedDict, Annotated, Awaitable, Callable, List, Dict, Any, Iterable, Optional, Set
 from datetime import datetime
-from pymongo import MongoClient
-from openai import AzureOpenAI
-from langgraph.graph import StateGraph, END
+from urllib.parse import urlsplit
+import httpx
+import pymongo
+from bson import ObjectId
+from bson.codec_options import TypeDecoder, TypeRegistry
+from langchain_core.runnables import RunnableLambda
+from langgraph.graph import StateGraph, START, END
 
-from .config import UNDERWRITING_CONFIG, AZURE_CONFIG
-from .medical_workflow import check_medical_exam_status, integrate_medical_findings_llm
+from .config import (UNDERWRITING_CONFIG, LLM_CACHE_CONFIG, OCR_CACHE_CONFIG, DECISION_CONFIG,
+                     FAST_PATH_CONFIG, SHORT_CIRCUIT_CONFIG, NORMALIZATION_CONFIG, DEADLINE_CONFIG,
+                     CHECKPOINT_CONFIG, APPLICATION_FETCH_CONFIG, MONGO_CONFIG)
+from .medical_workflow import acheck_medical_exam_status, check_medical_exam_status, integrate_medical_findings_llm
+from .llm import AZURE_DEPLOYMENT_NAME, chat_completion, achat_completion
+from .guidelines import guidelines_index, applicant_query
+from .scoring import DECISIONS, compute_decision, template_summary
+from .rules import (applicant_age, disclosed_conditions, prescore_health, prescore_occupation,
+                    prescore_financial, record_path)
+from .normalizer import normalize_application, apply_patch, unresolved_issues, KIND_DESCRIPTIONS
+from .short_circuit import after_ingest, after_component, should_skip, keep_first
+from .metrics import bind_node, has_error, node_context, record_node, record_node_timeout
+from .cassette import close_cassette, document_request_key, get_cassette
+from .checkpoint import MongoCheckpointSaver
+from .mongo import acollection, collection, db
+from .deadline import (NodeTimeout, arun_with_budget, call_timeout, critical_path_weights, deadline_context,
+                       node_budget, request_deadline, run_with_budget)
+from .tracing import configure_tracing, shutdown_tracing, span, set_attributes
+from .cache import configure_llm_cache, configure_ocr_cache, content_hash, ocr_cache, ocr_cache_key
+from .mcp import call_mcp_tool, fetch_mcp_tools, afetch_mcp_tools, get_http_client, get_async_http_client
 
-# Initialize Clients
-MONGODB_URI = os.getenv("MONGODB_URI")
-mongo_client = MongoClient(MONGODB_URI)
-db = mongo_client.insurance_ai
+# Mongo clients are created on first use (see agent/mongo.py)
 
-AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
-AZURE_OPENAI_KEY = os.getenv("AZURE_OPENAI_KEY")
-AZURE_DEPLOYMENT_NAME = os.getenv("AZURE_DEPLOYMENT_NAME", "gpt-4o")
+# Attach the configured shared tiers (SQLite / Mongo) to the LLM response and OCR caches
+configure_llm_cache(db)
+configure_ocr_cache(db)
 
-client = AzureOpenAI(
-    azure_endpoint=AZURE_OPENAI_ENDPOINT,
-    api_key=AZURE_OPENAI_KEY,
-    api_version=AZURE_CONFIG['api_version']
-)
+# Per-step graph checkpoints, so a failed run can resume (see agent/checkpoint.py)
+checkpointer = MongoCheckpointSaver(db) if CHECKPOINT_CONFIG['enabled'] else None
 
 # --- Helper Functions ---
 
@@ -46,88 +66,182 @@ def encode_image_to_b64(path):
     with open(path, "rb") as f:
         return base64.b64encode(f.read()).decode("utf-8")
 
-def fetch_application_from_mongodb(application_id: str, collection_name: str = "life_insurance_applications"):
-    from bson import ObjectId
-    
-    def json_serial(obj):
-        if isinstance(obj, (datetime, )):
-            return obj.isoformat()
-        elif isinstance(obj, ObjectId):
-            return str(obj)
-        raise TypeError(f"Type {type(obj)} not serializable")
+def _read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+class _ObjectIdAsString(TypeDecoder):
+    bson_type = ObjectId
+
+    def transform_bson(self, value):
+        return str(value)
+
+class _DatetimeAsISO(TypeDecoder):
+    bson_type = datetime
+
+    def transform_bson(self, value):
+        return value.isoformat()
+
+# Applications are decoded straight into their JSON-safe form (ObjectId / datetime to strings)
+APPLICATION_TYPE_REGISTRY = TypeRegistry([_ObjectIdAsString(), _DatetimeAsISO()])
+
+def _application_projection() -> Optional[Dict[str, int]]:
+    if not APPLICATION_FETCH_CONFIG['projection']:
+        return None
+    fields = APPLICATION_FETCH_CONFIG['sections'] + [f"documents.{field}" for field in APPLICATION_FETCH_CONFIG['document_fields']]
+    return {field: 1 for field in fields}
+
+APPLICATION_PROJECTION = _application_projection()
+
+def _with_application_codec(applications):
+    if APPLICATION_FETCH_CONFIG['codec'] != "typed":
+        return applications
+    return applications.with_options(
+        codec_options=applications.codec_options.with_options(type_registry=APPLICATION_TYPE_REGISTRY))
+
+def _applications(collection_name: str):
+    return _with_application_codec(collection(collection_name))
+
+def _aapplications(collection_name: str):
+    return _with_application_codec(acollection(collection_name))
+
+def _bson_default(obj):
+    return obj.isoformat() if isinstance(obj, datetime) else str(obj)
+
+def _json_safe_application(app: Dict[str, Any]) -> Dict[str, Any]:
+    """ The typed codec already decoded the document JSON-safe; otherwise one json round-trip does. """
+    if APPLICATION_FETCH_CONFIG['codec'] == "typed":
+        return app
+    return json.loads(json.dumps(app, default=_bson_default))
 
+def _id_filter(application_ids: List[str]) -> Dict[str, Any]:
+    """ One query matching each id as a string or an ObjectId, whichever the documents use. """
+    keys = list(application_ids) + [ObjectId(a) for a in application_ids if ObjectId.is_valid(a)]
+    return {"_id": {"$in": keys}}
+
+def _sample_application(error: Exception) -> Dict[str, Any]:
+    print(f"⚠️ Error fetching from MongoDB: {str(error)}")
+    # Fallback to sample
+    try:
+        # Assuming running from app_server root or similar, adjust path if needed
+        # For simplicity, we'll try a few paths or fail gracefully
+        sample_path = os.path.join(os.path.dirname(__file__), '..', '..', 'agentic_ai', 'data', 'sample_application.json')
+        if os.path.exists(sample_path):
+             with open(sample_path, 'r') as f:
+                return json.load(f)
+    except:
+        pass
+    raise ValueError(f"Failed to fetch application: {str(error)}")
+
+def fetch_application_from_mongodb(application_id: str, collection_name: str = APPLICATION_FETCH_CONFIG['collection']):
     if not application_id:
         raise ValueError("Application ID is required")
 
-    collection = db[collection_name]
     print(f"🔍 Fetching application with _id: {application_id}")
 
     try:
-        app = collection.find_one({"_id": application_id})
-        if not app and ObjectId.is_valid(application_id):
-            app = collection.find_one({"_id": ObjectId(application_id)})
+        # Bounded by the ingest node's share of the request deadline (None: no limit)
+        with pymongo.timeout(call_timeout(None)):
+            app = _applications(collection_name).find_one(_id_filter([application_id]), APPLICATION_PROJECTION)
 
         if not app:
             raise ValueError(f"No application found with _id: {application_id}")
 
-        app['_id'] = str(app['_id'])
-        
-        def make_serializable(obj):
-            if isinstance(obj, dict):
-                return {k: make_serializable(v) for k, v in obj.items()}
-            elif isinstance(obj, list):
-                return [make_serializable(v) for v in obj]
-            else:
-                return json_serial(obj) if isinstance(obj, (datetime, ObjectId)) else obj
-                
-        return make_serializable(app)
+        return _json_safe_application(app)
         
     except Exception as e:
-        print(f"⚠️ Error fetching from MongoDB: {str(e)}")
-        # Fallback to sample
-        try:
-            # Assuming running from app_server root or similar, adjust path if needed
-            # For simplicity, we'll try a few paths or fail gracefully
-            sample_path = os.path.join(os.path.dirname(__file__), '..', '..', 'agentic_ai', 'data', 'sample_application.json')
-            if os.path.exists(sample_path):
-                 with open(sample_path, 'r') as f:
-                    return json.load(f)
-        except:
-            pass
-        raise ValueError(f"Failed to fetch application: {str(e)}")
+        return _sample_application(e)
+
+async def afetch_application_from_mongodb(application_id: str,
+                                          collection_name: str = APPLICATION_FETCH_CONFIG['collection']):
+    if not MONGO_CONFIG['async_driver']:
+        return await asyncio.to_thread(fetch_application_from_mongodb, application_id, collection_name)
+    if not application_id:
+        raise ValueError("Application ID is required")
+
+    print(f"🔍 Fetching application with _id: {application_id}")
 
-def call_mcp_tool(tool_name: str, pan_number: str, mcp_base_url: str = "http://localhost:9000") -> dict:
     try:
-        mcp_url = os.getenv("MCP_SERVER_URL", mcp_base_url)
-        tool_map = {
-            "insurance_history": "insurance_history_tool",
-            "financial_eligibility": "financial_eligibility",
-        }
-        mcp_tool_name = tool_map.get(tool_name)
-        if not mcp_tool_name:
-            return {"error": f"Unknown tool: {tool_name}"}
-        
-        api_base = os.getenv("INSURANCE_API_BASE", "http://localhost:8000")
-        endpoint_map = {
-            "insurance_history": f"{api_base}/insurance-history/{pan_number}",
-            "financial_eligibility": f"{api_base}/financial-eligibility/{pan_number}",
-        }
-        
-        url = endpoint_map.get(tool_name)
-        if not url:
-            return {"error": f"No endpoint found for tool: {tool_name}"}
-        
-        resp = requests.get(url, timeout=10)
-        resp.raise_for_status()
-        return resp.json()
-        
+        with pymongo.timeout(call_timeout(None)):
+            app = await _aapplications(collection_name).find_one(_id_filter([application_id]), APPLICATION_PROJECTION)
+
+        if not app:
+            raise ValueError(f"No application found with _id: {application_id}")
+
+        return _json_safe_application(app)
+
     except Exception as e:
-        return {"error": str(e), "status": "failed"}
+        return _sample_application(e)
+
+def fetch_applications_from_mongodb(application_ids: Optional[List[str]] = None, query: Optional[Dict[str, Any]] = None,
+                                    limit: int = 0, chunk_size: int = 500,
+                                    collection_name: str = APPLICATION_FETCH_CONFIG['collection']) -> Dict[str, Dict[str, Any]]:
+    """
+    Bulk fetch for batch underwriting: one `$in` query per `chunk_size` ids (or one
+    `find(query)`) instead of a `find_one` per application. Returns {str(_id): application};
+    ids with no document are simply absent.
+    """
+    applications = _applications(collection_name)
+    apps: Dict[str, Dict[str, Any]] = {}
+    if application_ids is None:
+        for app in applications.find(query or {}, APPLICATION_PROJECTION, limit=limit):
+            app = _json_safe_application(app)
+            apps[str(app["_id"])] = app
+        return apps
+
+    for i in range(0, len(application_ids), chunk_size):
+        for app in applications.find(_id_filter(application_ids[i:i + chunk_size]), APPLICATION_PROJECTION):
+            app = _json_safe_application(app)
+            apps[str(app["_id"])] = app
+    return apps
+
+async def afetch_applications_from_mongodb(application_ids: Optional[List[str]] = None,
+                                           query: Optional[Dict[str, Any]] = None, limit: int = 0,
+                                           chunk_size: int = 500,
+                                           collection_name: str = APPLICATION_FETCH_CONFIG['collection']
+                                           ) -> Dict[str, Dict[str, Any]]:
+    if not MONGO_CONFIG['async_driver']:
+        return await asyncio.to_thread(fetch_applications_from_mongodb, application_ids, query, limit, chunk_size,
+                                       collection_name)
+    applications = _aapplications(collection_name)
+    apps: Dict[str, Dict[str, Any]] = {}
+    if application_ids is None:
+        async for app in applications.find(query or {}, APPLICATION_PROJECTION, limit=limit):
+            app = _json_safe_application(app)
+            apps[str(app["_id"])] = app
+        return apps
+
+    for i in range(0, len(application_ids), chunk_size):
+        async for app in applications.find(_id_filter(application_ids[i:i + chunk_size]), APPLICATION_PROJECTION):
+            app = _json_safe_application(app)
+            apps[str(app["_id"])] = app
+    return apps
+
+def _use_llm_cache(state) -> bool:
+    """ Per-request opt-out of the LLM response cache (`llm_cache_bypass` in the state). """
+    return not state.get("llm_cache_bypass", False)
+
+def _json_completion(request: Dict[str, Any], cache: bool = True) -> Dict[str, Any]:
+    resp = chat_completion(cache=cache, **request)
+    return safe_parse_json(resp.choices[0].message.content)
+
+async def _ajson_completion(request: Dict[str, Any], cache: bool = True) -> Dict[str, Any]:
+    resp = await achat_completion(cache=cache, **request)
+    return safe_parse_json(resp.choices[0].message.content)
 
 # --- State Definition ---
 
+def merge_dicts(left: Optional[Dict[str, Any]], right: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Reducer for channels that several parallel branches update in the same step.
+    """
+    merged = dict(left or {})
+    merged.update(right or {})
+    return merged
+
 class AgentState(TypedDict):
     application_id: str
+    llm_cache_bypass: bool
     application: Dict[str, Any]
     normalized_by_llm: Dict[str, Any]
     ingest_llm: Dict[str, Any]
@@ -143,191 +257,550 @@ class AgentState(TypedDict):
     underwriting_report: Dict[str, Any]
     medical_exam_workflow: Dict[str, Any]
     health_underwriting_with_medicals: Dict[str, Any]
+    short_circuit: Annotated[Optional[Dict[str, Any]], keep_first]
+    node_timings: Annotated[Dict[str, float], merge_dicts]
+    deadline: Optional[float]  # absolute time.time(); see agent/deadline.py
+    reused_results: Dict[str, Dict[str, Any]]  # node -> its update from a previous run (incremental mode)
+
 
 # --- Nodes ---
+#
+# Every node has a sync implementation (used by `insurance_graph.invoke` and the CLI)
+# and an async one (used by `insurance_graph.ainvoke` from the API). Prompt building
+# and result shaping are shared; only the I/O differs.
 
-def ingest_node(state: AgentState):
-    print("--- Ingest Node ---")
-    if "application" not in state or not state.get("application"):
-        application_id = state.get("application_id")
-        if not application_id:
-             # Fallback if no ID provided
-             pass 
-        else:
-            app = fetch_application_from_mongodb(application_id=application_id)
-            state["application"] = app or {}
-
-    app = state.get("application", {})
-    
-    # Define required fields for insurance application
-    required_fields = {
-        "personal_details": ["fullName", "dob", "address", "panNumber", "occupation", "annualIncome"],
-        "contact_info": ["phone", "email"],
-        "health_info": ["weight", "height", "tobacco_consumption"],
-        "coverage_selection": ["coverageAmount", "term", "selectedPlan"],
-        "nominee_details": ["name", "relation", "dob"],
-        "payment": ["method", "status"]
-    }
+REQUIRED_FIELDS = {
+    "personal_details": ["fullName", "dob", "address", "panNumber", "occupation", "annualIncome"],
+    "contact_info": ["phone", "email"],
+    "health_info": ["weight", "height", "tobacco_consumption"],
+    "coverage_selection": ["coverageAmount", "term", "selectedPlan"],
+    "nominee_details": ["name", "relation", "dob"],
+    "payment": ["method", "status"]
+}
 
-    # Validate presence of required fields
+def _validate_required_fields(app: Dict[str, Any]) -> List[str]:
     validation_issues = []
-    for section, fields in required_fields.items():
+    for section, fields in REQUIRED_FIELDS.items():
         if section not in app:
             validation_issues.append(f"Missing section: {section}")
         else:
             for field in fields:
                 if field not in app[section]:
                     validation_issues.append(f"Missing field: {section}.{field}")
+    return validation_issues
 
+def _normalization_patch_request(unresolved: List[Dict[str, Any]]) -> Dict[str, Any]:
+    # Only the fields the local normalizer could not resolve are sent, and only a patch comes back
+    fields = [{"field": e["field"], "expected": KIND_DESCRIPTIONS[e["kind"]], "value": e["value"]} for e in unresolved]
     prompt = f"""
-You are a data-normalizer assistant. Inspect the provided application JSON and normalize it properly.
-Your role:
-1) Check presence of required fields and report any missing ones.
-2) For mobile numbers, normalize to format: +91XXXXXXXXXX
-3) For dates (DOB), ensure ISO YYYY-MM-DD format
-4) For state/addresses, ensure Title Case
-5) Validate email format
-6) Ensure numeric fields are proper numbers
-7) Return a JSON object only with keys:
-  - validated (boolean)
-  - issues (list of short strings describing validation issues)
-  - normalized_application (the input JSON with normalization applied where possible)
-  - missing_fields (list of critically missing fields)
-  - llm_explanation (1-2 sentence summary)
+You are a data-normalizer assistant. The application fields below could not be normalized automatically.
+For each field, give the value normalized to the expected format, or null if it cannot be determined.
+Return a JSON object only with key:
+  - patch (object mapping each field path to its normalized value or null)
 
 Do not include chain-of-thought, only the JSON.
 
-Application JSON:
-{json.dumps(app)}
+Fields:
+{json.dumps(fields, default=str)}
 """
-    try:
-        resp = client.chat.completions.create(
-            model=AZURE_DEPLOYMENT_NAME,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=1000,
-            temperature=0.0,
-            response_format={"type": "json_object"}
-        )
-        out = safe_parse_json(resp.choices[0].message.content)
-    except Exception as e:
-        out = {"error": str(e)}
+    return dict(
+        model=AZURE_DEPLOYMENT_NAME,
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=NORMALIZATION_CONFIG['patch_max_tokens'],
+        temperature=0.0,
+        response_format={"type": "json_object"}
+    )
+
+def _apply_llm_patch(normalized: Dict[str, Any], unresolved: List[Dict[str, Any]], out: Dict[str, Any]):
+    if "error" in out:
+        print(f"⚠️  Normalization patch failed, keeping values as submitted: {out['error']}")
+        return [], unresolved
+    return apply_patch(normalized, out.get("patch") or {}, unresolved)
 
+def _ingest_out(normalized: Dict[str, Any], changes: List[str], patched: List[str],
+                unresolved: List[Dict[str, Any]], validation_issues: List[str]) -> Dict[str, Any]:
+    issues = validation_issues + unresolved_issues(unresolved)
+    explanation = f"Normalized {len(changes)} field(s) locally"
+    if patched:
+        explanation += f" and {len(patched)} via LLM patch"
+    return {
+        "validated": not issues,
+        "issues": issues,
+        "normalized_application": normalized,
+        "missing_fields": [issue.split(": ", 1)[1] for issue in validation_issues],
+        "llm_explanation": f"{explanation}; {len(issues)} issue(s) remaining.",
+        "normalization": {
+            "engine": "local+llm" if patched else "local",
+            "changed_fields": changes,
+            "llm_patched_fields": patched,
+            "unresolved_fields": [e["field"] for e in unresolved]
+        }
+    }
+
+def _ingest_update(update: Dict[str, Any], out: Dict[str, Any], validation_issues: List[str]) -> Dict[str, Any]:
     # Include manual validation issues
     if isinstance(out, dict) and validation_issues:
         out["manual_validation_issues"] = validation_issues
         out["validated"] = out.get("validated", False)
 
-    state["normalized_by_llm"] = out.get("normalized_application", out)
-    state["ingest_llm"] = out
-    return state
+    update["normalized_by_llm"] = out.get("normalized_application", out)
+    update["ingest_llm"] = out
+    return update
 
-def document_processing_node(state: AgentState):
-    print("--- Document Processing Node ---")
-    normalized_app = state.get("normalized_by_llm", state.get("application", {}))
-    documents = normalized_app.get("documents", [])
-    
-    if not documents:
-        out = {"ocr_status": "skipped", "reason": "no_documents_found"}
-        state["document_processing"] = out
-        return state
-    
-    def call_vision(image_path):
+def _short_circuit_ingest_update(update: Dict[str, Any], out: Dict[str, Any], validation_issues: List[str],
+                                 fired: Dict[str, Any]) -> Dict[str, Any]:
+    # Incomplete application: no LLM patch, the graph routes straight to the decision
+    print(f"⏭️  Short-circuit after ingest: {fired['reason']}")
+    out["llm_explanation"] = fired["reason"]
+    update["short_circuit"] = fired
+    return _ingest_update(update, out, validation_issues)
+
+def ingest_node(state: AgentState):
+    print("--- Ingest Node ---")
+    update = {}
+    app = state.get("application")
+    if not app:
+        application_id = state.get("application_id")
+        if not application_id:
+             # Fallback if no ID provided
+             app = {}
+        else:
+            app = fetch_application_from_mongodb(application_id=application_id) or {}
+            update["application"] = app
+
+    validation_issues = _validate_required_fields(app)
+    normalized, changes, unresolved = normalize_application(app)
+    fired = after_ingest(normalized)
+    if fired:
+        return _short_circuit_ingest_update(update, _ingest_out(normalized, changes, [], unresolved, validation_issues),
+                                            validation_issues, fired)
+
+    patched = []
+    if unresolved and NORMALIZATION_CONFIG['llm_fallback']:
         try:
-            # Check if it's a URL or local file
-            if image_path.startswith(('http://', 'https://')):
-                # For URLs, use URL directly in vision API
-                prompt = """
-You are a document extraction model. Extract the fields from PAN or Aadhaar document if visible. Return JSON only:
-{ "document_type": "PAN|Aadhaar", "name":"", "father_name":"","gender":"","dob":"","id_number":"" }
-If a field is not present, set it to null.
-"""
-                resp = client.chat.completions.create(
-                    model=AZURE_DEPLOYMENT_NAME,
-                    messages=[{
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {"type": "image_url", "image_url": {"url": image_path}}
-                        ]
-                    }],
-                    max_tokens=500,
-                    temperature=0.0,
-                    response_format={"type": "json_object"}
-                )
-            else:
-                # For local files, encode to base64
-                if os.path.exists(image_path):
-                    img_b64 = encode_image_to_b64(image_path)
-                    prompt = """
+            out = _json_completion(_normalization_patch_request(unresolved), cache=_use_llm_cache(state))
+        except Exception as e:
+            out = {"error": str(e)}
+        patched, unresolved = _apply_llm_patch(normalized, unresolved, out)
+    return _ingest_update(update, _ingest_out(normalized, changes, patched, unresolved, validation_issues), validation_issues)
+
+async def aingest_node(state: AgentState):
+    print("--- Ingest Node ---")
+    update = {}
+    app = state.get("application")
+    if not app:
+        application_id = state.get("application_id")
+        if not application_id:
+             app = {}
+        else:
+            app = await afetch_application_from_mongodb(application_id) or {}
+            update["application"] = app
+
+    validation_issues = _validate_required_fields(app)
+    normalized, changes, unresolved = normalize_application(app)
+    fired = after_ingest(normalized)
+    if fired:
+        return _short_circuit_ingest_update(update, _ingest_out(normalized, changes, [], unresolved, validation_issues),
+                                            validation_issues, fired)
+
+    patched = []
+    if unresolved and NORMALIZATION_CONFIG['llm_fallback']:
+        try:
+            out = await _ajson_completion(_normalization_patch_request(unresolved), cache=_use_llm_cache(state))
+        except Exception as e:
+            out = {"error": str(e)}
+        patched, unresolved = _apply_llm_patch(normalized, unresolved, out)
+    return _ingest_update(update, _ingest_out(normalized, changes, patched, unresolved, validation_issues), validation_issues)
+
+VISION_PROMPT = """
 You are a document extraction model. Extract the fields from PAN or Aadhaar document if visible. Return JSON only:
 { "document_type": "PAN|Aadhaar", "name":"", "father_name":"","gender":"","dob":"","id_number":"" }
 If a field is not present, set it to null.
 """
-                    resp = client.chat.completions.create(
-                        model=AZURE_DEPLOYMENT_NAME,
-                        messages=[{
-                            "role": "user",
-                            "content": [
-                                {"type": "text", "text": prompt},
-                                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{img_b64}"}}
-                            ]
-                        }],
-                        max_tokens=500,
-                        temperature=0.0,
-                        response_format={"type": "json_object"}
-                    )
-                else:
-                    return {"error": "file_not_found", "path": image_path}
-            
-            out = safe_parse_json(resp.choices[0].message.content)
-            return out
-        except Exception as e:
-            return {"error": str(e), "path": image_path}
-    
-    # Process each document
+
+def _vision_request_for_url(image_url: str) -> Dict[str, Any]:
+    return dict(
+        model=AZURE_DEPLOYMENT_NAME,
+        messages=[{
+            "role": "user",
+            "content": [
+                {"type": "text", "text": VISION_PROMPT},
+                {"type": "image_url", "image_url": {"url": image_url}}
+            ]
+        }],
+        max_tokens=500,
+        temperature=0.0,
+        response_format={"type": "json_object"}
+    )
+
+def _vision_request(image_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Build the vision request for a URL or local file, or None if the file is missing.
+    """
+    if image_path.startswith(('http://', 'https://')):
+        # For URLs, use URL directly in vision API
+        return _vision_request_for_url(image_path)
+    if os.path.exists(image_path):
+        # For local files, encode to base64
+        return _vision_request_for_url(f"data:image/jpeg;base64,{encode_image_to_b64(image_path)}")
+    return None
+
+def _image_data_url(data: bytes, content_type: Optional[str]) -> str:
+    content_type = (content_type or "image/jpeg").split(";")[0].strip()
+    if not content_type.startswith("image/"):
+        content_type = "image/jpeg"
+    return f"data:{content_type};base64,{base64.b64encode(data).decode('utf-8')}"
+
+def _ocr_key(digest: str) -> str:
+    return ocr_cache_key(digest, OCR_CACHE_CONFIG['prompt_version'])
+
+def _validator_key(url: str, validators: Dict[str, Optional[str]]) -> Optional[str]:
+    """
+    Shortcut key for a remote image from its ETag / Last-Modified headers, if the server sends them.
+    """
+    etag = validators.get("etag")
+    last_modified = validators.get("last_modified")
+    if not (etag or last_modified):
+        return None
+    return _ocr_key(content_hash({"url": url, "etag": etag, "last_modified": last_modified}))
+
+def _cacheable_ocr(out: Dict[str, Any]) -> bool:
+    return isinstance(out, dict) and "error" not in out and "raw" not in out
+
+class DocumentFetchError(Exception):
+    """ A document could not be downloaded within the OCR cache's limits. """
+
+def _document_fetch_allowed(url: str) -> bool:
+    """ Only http(s) URLs on a configured document store host are downloaded by the service. """
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if parts.scheme not in ("http", "https") or not host:
+        return False
+    return any(host == allowed or (allowed.startswith(".") and host.endswith(allowed))
+               for allowed in OCR_CACHE_CONFIG['document_hosts'])
+
+def _document_too_large(size: int) -> bool:
+    return size > OCR_CACHE_CONFIG['max_document_bytes']
+
+def _check_document_response(resp: httpx.Response) -> None:
+    # Redirects are not followed: they could point anywhere, including internal endpoints
+    resp.raise_for_status()
+    length = resp.headers.get("content-length")
+    if length and length.isdigit() and _document_too_large(int(length)):
+        raise DocumentFetchError(f"document larger than {OCR_CACHE_CONFIG['max_document_bytes']} bytes")
+
+def _download_document(http: httpx.Client, url: str, timeout: Optional[float]):
+    """ (bytes, content type), streamed and capped at OCR_CACHE_CONFIG['max_document_bytes']. """
+    with http.stream("GET", url, follow_redirects=False, timeout=timeout) as resp:
+        _check_document_response(resp)
+        data = bytearray()
+        for chunk in resp.iter_bytes():
+            data += chunk
+            if _document_too_large(len(data)):
+                raise DocumentFetchError(f"document larger than {OCR_CACHE_CONFIG['max_document_bytes']} bytes")
+        return bytes(data), resp.headers.get("content-type")
+
+async def _adownload_document(http: httpx.AsyncClient, url: str, timeout: Optional[float]):
+    async with http.stream("GET", url, follow_redirects=False, timeout=timeout) as resp:
+        _check_document_response(resp)
+        data = bytearray()
+        async for chunk in resp.aiter_bytes():
+            data += chunk
+            if _document_too_large(len(data)):
+                raise DocumentFetchError(f"document larger than {OCR_CACHE_CONFIG['max_document_bytes']} bytes")
+        return bytes(data), resp.headers.get("content-type")
+
+def _head_document(http: httpx.Client, url: str, timeout: Optional[float]) -> Optional[Dict[str, Optional[str]]]:
+    """ HTTP validators of a remote document, or None when HEAD does not succeed. """
+    return _validators(http.head(url, follow_redirects=False, timeout=timeout))
+
+async def _ahead_document(http: httpx.AsyncClient, url: str,
+                          timeout: Optional[float]) -> Optional[Dict[str, Optional[str]]]:
+    return _validators(await http.head(url, follow_redirects=False, timeout=timeout))
+
+def _validators(head: httpx.Response) -> Optional[Dict[str, Optional[str]]]:
+    if not head.is_success:
+        return None
+    return {"etag": head.headers.get("etag"), "last_modified": head.headers.get("last-modified")}
+
+# Document requests go through the cassette like LLM and MCP calls, so a replay
+# needs no access to the (often signed, expiring) document URLs
+
+def _document_response(method: str, result: Any) -> Any:
+    if method == "GET":
+        data, content_type = result
+        return {"content_type": content_type, "data": base64.b64encode(data).decode("ascii")}
+    return result
+
+def _replayed_document(method: str, entry: Dict[str, Any]) -> Any:
+    if entry["error"]:
+        raise DocumentFetchError(entry["error"])
+    response = entry["response"]
+    if method == "GET":
+        return base64.b64decode(response["data"]), response["content_type"]
+    return response
+
+def _record_document(cassette, method: str, url: str, elapsed: float, result: Any = None,
+                     error: Optional[Exception] = None) -> None:
+    if cassette is not None and cassette.recording:
+        cassette.record("document", document_request_key(method, url), {"method": method, "url": url},
+                        None if error else _document_response(method, result), elapsed,
+                        error=str(error) if error else None)
+
+def _document_call(method: str, url: str, fetch: Callable[[], Any]) -> Any:
+    cassette = get_cassette()
+    if cassette is not None and cassette.replaying:
+        entry = cassette.replay("document", document_request_key(method, url))
+        if entry is not None:
+            return _replayed_document(method, entry)
+    start = time.perf_counter()
+    try:
+        result = fetch()
+    except (httpx.HTTPError, DocumentFetchError) as e:
+        _record_document(cassette, method, url, time.perf_counter() - start, error=e)
+        raise
+    _record_document(cassette, method, url, time.perf_counter() - start, result)
+    return result
+
+async def _adocument_call(method: str, url: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+    cassette = get_cassette()
+    if cassette is not None and cassette.replaying:
+        entry = await cassette.areplay("document", document_request_key(method, url))
+        if entry is not None:
+            return _replayed_document(method, entry)
+    start = time.perf_counter()
+    try:
+        result = await fetch()
+    except (httpx.HTTPError, DocumentFetchError) as e:
+        _record_document(cassette, method, url, time.perf_counter() - start, error=e)
+        raise
+    _record_document(cassette, method, url, time.perf_counter() - start, result)
+    return result
+
+def _cached_call_vision(image_path: str) -> Dict[str, Any]:
+    """
+    Vision extraction through the OCR cache, keyed by the sha256 of the image bytes.
+    Remote images are first looked up by their HTTP validators to skip the download.
+    Only images on the configured document store hosts are downloaded; others are
+    passed to the model by URL, uncached.
+    """
+    validator_key = None
+    if image_path.startswith(('http://', 'https://')):
+        if not _document_fetch_allowed(image_path):
+            return _json_completion(_vision_request_for_url(image_path), cache=False)
+        http = get_http_client()
+        timeout = call_timeout(UNDERWRITING_CONFIG['timeouts']['document_fetch'])
+        try:
+            if OCR_CACHE_CONFIG['use_http_validators']:
+                validators = _document_call("HEAD", image_path, lambda: _head_document(http, image_path, timeout))
+                if validators:
+                    validator_key = _validator_key(image_path, validators)
+                    hit = ocr_cache.get(validator_key) if validator_key else None
+                    if hit is not None:
+                        return copy.deepcopy(hit)
+            data, content_type = _document_call("GET", image_path,
+                                                lambda: _download_document(http, image_path, timeout))
+        except (httpx.HTTPError, DocumentFetchError):
+            # Not fetchable from here (e.g. signed for the model only, too large) - let the model fetch it, uncached
+            return _json_completion(_vision_request_for_url(image_path), cache=False)
+    elif os.path.exists(image_path):
+        with open(image_path, "rb") as f:
+            data, content_type = f.read(), "image/jpeg"
+    else:
+        return {"error": "file_not_found", "path": image_path}
+
+    content_key = _ocr_key(hashlib.sha256(data).hexdigest())
+    out = ocr_cache.get(content_key)
+    if out is None:
+        # The OCR cache replaces the response cache here; no need to store the base64 prompt twice
+        out = _json_completion(_vision_request_for_url(_image_data_url(data, content_type)), cache=False)
+        if _cacheable_ocr(out):
+            ocr_cache.set(content_key, out)
+    if validator_key and _cacheable_ocr(out):
+        ocr_cache.set(validator_key, out)
+    return copy.deepcopy(out)
+
+async def _aocr_cache_get(key: str):
+    if ocr_cache.store is None:
+        return ocr_cache.get(key)
+    return await asyncio.to_thread(ocr_cache.get, key)
+
+async def _aocr_cache_set(key: str, value: Dict[str, Any]) -> None:
+    if ocr_cache.store is None:
+        ocr_cache.set(key, value)
+    else:
+        await asyncio.to_thread(ocr_cache.set, key, value)
+
+async def _acached_call_vision(image_path: str) -> Dict[str, Any]:
+    validator_key = None
+    if image_path.startswith(('http://', 'https://')):
+        if not _document_fetch_allowed(image_path):
+            return await _ajson_completion(_vision_request_for_url(image_path), cache=False)
+        http = get_async_http_client()
+        timeout = call_timeout(UNDERWRITING_CONFIG['timeouts']['document_fetch'])
+        try:
+            if OCR_CACHE_CONFIG['use_http_validators']:
+                validators = await _adocument_call("HEAD", image_path,
+                                                   lambda: _ahead_document(http, image_path, timeout))
+                if validators:
+                    validator_key = _validator_key(image_path, validators)
+                    hit = await _aocr_cache_get(validator_key) if validator_key else None
+                    if hit is not None:
+                        return copy.deepcopy(hit)
+            data, content_type = await _adocument_call("GET", image_path,
+                                                       lambda: _adownload_document(http, image_path, timeout))
+        except (httpx.HTTPError, DocumentFetchError):
+            return await _ajson_completion(_vision_request_for_url(image_path), cache=False)
+    elif os.path.exists(image_path):
+        data = await asyncio.to_thread(_read_bytes, image_path)
+        content_type = "image/jpeg"
+    else:
+        return {"error": "file_not_found", "path": image_path}
+
+    content_key = _ocr_key(hashlib.sha256(data).hexdigest())
+    out = await _aocr_cache_get(content_key)
+    if out is None:
+        out = await _ajson_completion(_vision_request_for_url(_image_data_url(data, content_type)), cache=False)
+        if _cacheable_ocr(out):
+            await _aocr_cache_set(content_key, out)
+    if validator_key and _cacheable_ocr(out):
+        await _aocr_cache_set(validator_key, out)
+    return copy.deepcopy(out)
+
+def call_vision(image_path: str, cache: bool = True) -> Dict[str, Any]:
+    try:
+        if cache and OCR_CACHE_CONFIG['enabled']:
+            return _cached_call_vision(image_path)
+        request = _vision_request(image_path)
+        if request is None:
+            return {"error": "file_not_found", "path": image_path}
+        return _json_completion(request, cache=cache)
+    except Exception as e:
+        return {"error": str(e), "path": image_path}
+
+async def acall_vision(image_path: str, cache: bool = True) -> Dict[str, Any]:
+    try:
+        if cache and OCR_CACHE_CONFIG['enabled']:
+            return await _acached_call_vision(image_path)
+        request = _vision_request(image_path)
+        if request is None:
+            return {"error": "file_not_found", "path": image_path}
+        return await _ajson_completion(request, cache=cache)
+    except Exception as e:
+        return {"error": str(e), "path": image_path}
+
+# Process-wide OCR caps; the async semaphore is bound to the loop that uses it
+_ocr_process_semaphore = threading.BoundedSemaphore(UNDERWRITING_CONFIG['concurrency']['ocr_per_process'])
+_aocr_process_semaphore = None
+_aocr_process_semaphore_loop = None
+
+def _get_aocr_process_semaphore() -> asyncio.Semaphore:
+    global _aocr_process_semaphore, _aocr_process_semaphore_loop
+    loop = asyncio.get_running_loop()
+    if _aocr_process_semaphore is None or _aocr_process_semaphore_loop is not loop:
+        _aocr_process_semaphore = asyncio.Semaphore(UNDERWRITING_CONFIG['concurrency']['ocr_per_process'])
+        _aocr_process_semaphore_loop = loop
+    return _aocr_process_semaphore
+
+def _document_key(doc: Dict[str, Any]) -> str:
+    if doc.get("url"):
+        return f"{doc.get('filename', 'unknown')}_{doc.get('docType', 'unknown')}"
+    return doc.get("filename", "unknown")
+
+def _document_entry(doc: Dict[str, Any], ocr_result: Dict[str, Any], elapsed: float) -> Dict[str, Any]:
+    return {
+        "document_type": doc.get("docType", "unknown"),
+        "filename": doc.get("filename", "unknown"),
+        "url": doc.get("url", ""),
+        "ocr_result": ocr_result,
+        "elapsed_ms": round(elapsed * 1000, 1)
+    }
+
+def _ocr_document(doc: Dict[str, Any], cache: bool = True) -> Dict[str, Any]:
+    if not doc.get("url"):
+        return {"error": "no_url_provided"}
+    start = time.perf_counter()
+    try:
+        with _ocr_process_semaphore:
+            ocr_result = call_vision(doc["url"], cache=cache)
+    except Exception as e:
+        ocr_result = {"error": str(e), "path": doc["url"]}
+    return _document_entry(doc, ocr_result, time.perf_counter() - start)
+
+async def _aocr_document(doc: Dict[str, Any], application_semaphore: asyncio.Semaphore, cache: bool = True) -> Dict[str, Any]:
+    if not doc.get("url"):
+        return {"error": "no_url_provided"}
+    start = time.perf_counter()
+    try:
+        async with application_semaphore, _get_aocr_process_semaphore():
+            ocr_result = await acall_vision(doc["url"], cache=cache)
+    except Exception as e:
+        ocr_result = {"error": str(e), "path": doc["url"]}
+    return _document_entry(doc, ocr_result, time.perf_counter() - start)
+
+def _document_processing_update(documents: List[Dict[str, Any]], entries: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    # Results keep the original document order; failures are isolated per document
     results = {}
-    for doc in documents:
-        doc_type = doc.get("docType", "unknown")
-        filename = doc.get("filename", "unknown")
-        url = doc.get("url", "")
-        
-        if url:
-            try:
-                doc_key = f"{filename}_{doc_type}"
-                results[doc_key] = {
-                    "document_type": doc_type,
-                    "filename": filename,
-                    "url": url,
-                    "ocr_result": call_vision(url)
-                }
-            except Exception as e:
-                results[filename] = {"error": str(e)}
-        else:
-            results[filename] = {"error": "no_url_provided"}
-    
-    state["document_processing"] = {
-        "ocr_status": "completed",
-        "documents_processed": len(documents),
-        "results": results
+    for doc, entry in zip(documents, entries):
+        results[_document_key(doc)] = entry
+    return {
+        "document_processing": {
+            "ocr_status": "completed",
+            "documents_processed": len(documents),
+            "results": results,
+            "elapsed_ms": round(elapsed * 1000, 1)
+        }
     }
-    return state
 
-def kyc_node(state: AgentState):
-    print("--- KYC Node ---")
+def document_processing_node(state: AgentState):
+    print("--- Document Processing Node ---")
+    normalized_app = state.get("normalized_by_llm", state.get("application", {}))
+    documents = normalized_app.get("documents", [])
+
+    if not documents:
+        out = {"ocr_status": "skipped", "reason": "no_documents_found"}
+        return {"document_processing": out}
+
+    # Process documents concurrently, bounded per application and per process
+    start = time.perf_counter()
+    workers = max(1, min(UNDERWRITING_CONFIG['concurrency']['ocr_per_application'], len(documents)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ocr") as pool:
+        cache = _use_llm_cache(state)
+        entries = list(pool.map(bind_node(lambda doc: _ocr_document(doc, cache)), documents))
+
+    return _document_processing_update(documents, entries, time.perf_counter() - start)
+
+async def adocument_processing_node(state: AgentState):
+    print("--- Document Processing Node ---")
+    normalized_app = state.get("normalized_by_llm", state.get("application", {}))
+    documents = normalized_app.get("documents", [])
+
+    if not documents:
+        out = {"ocr_status": "skipped", "reason": "no_documents_found"}
+        return {"document_processing": out}
+
+    start = time.perf_counter()
+    application_semaphore = asyncio.Semaphore(UNDERWRITING_CONFIG['concurrency']['ocr_per_application'])
+    cache = _use_llm_cache(state)
+    entries = await asyncio.gather(*[_aocr_document(doc, application_semaphore, cache) for doc in documents])
+
+    return _document_processing_update(documents, entries, time.perf_counter() - start)
+
+def _kyc_request(state: AgentState):
     normalized_app = state.get("normalized_by_llm", state.get("application", {}))
     doc_processing = state.get("document_processing", {})
     ocr_results = doc_processing.get("results", {})
-    
+
     # Extract personal and nominee details from normalized application
     personal_details = normalized_app.get("personal_details", {})
     nominee_details = normalized_app.get("nominee_details", {})
-    
+
     # Extract OCR data from all processed documents
     ocr_extractions = {}
     for doc_key, doc_result in ocr_results.items():
         if "ocr_result" in doc_result:
             ocr_extractions[doc_key] = doc_result["ocr_result"]
-    
+
     prompt = f"""
 You are a KYC reconciliation assistant. Compare user-supplied personal and nominee details with OCR-extracted data from submitted documents.
 Analyze the extracted document data and form data to verify:
@@ -373,30 +846,76 @@ Decision rules:
 - If documents not readable -> Manual Review
 - If no critical mismatches -> Verified
 """
-    try:
-        resp = client.chat.completions.create(
-            model=AZURE_DEPLOYMENT_NAME,
-            messages=[{"role":"user","content":prompt}],
-            max_tokens=600,
-            temperature=0.0,
-            response_format={"type":"json_object"}
-        )
-        out = safe_parse_json(resp.choices[0].message.content)
-        
+    request = dict(
+        model=AZURE_DEPLOYMENT_NAME,
+        messages=[{"role":"user","content":prompt}],
+        max_tokens=600,
+        temperature=0.0,
+        response_format={"type":"json_object"}
+    )
+    return request, ocr_extractions
+
+def _kyc_update(out: Dict[str, Any], ocr_extractions: Dict[str, Any]) -> Dict[str, Any]:
+    if "error" not in out:
         # Add source information
         out["documents_verified"] = len(ocr_extractions)
         out["source"] = "Document OCR + Form Data Reconciliation"
+    return {"kyc_reconciliation": out}
+
+def kyc_node(state: AgentState):
+    print("--- KYC Node ---")
+    request, ocr_extractions = _kyc_request(state)
+    try:
+        out = _json_completion(request, cache=_use_llm_cache(state))
     except Exception as e:
         out = {"error": str(e)}
-    
-    state["kyc_reconciliation"] = out
-    return state
+    return _kyc_update(out, ocr_extractions)
 
-def health_node(state: AgentState):
-    print("--- Health Node ---")
+async def akyc_node(state: AgentState):
+    print("--- KYC Node ---")
+    request, ocr_extractions = _kyc_request(state)
+    try:
+        out = await _ajson_completion(request, cache=_use_llm_cache(state))
+    except Exception as e:
+        out = {"error": str(e)}
+    return _kyc_update(out, ocr_extractions)
+
+def _fast_path(node: str, prescore, state: AgentState) -> Optional[Dict[str, Any]]:
+    """
+    Run a node's deterministic pre-scorer; None means fall through to the LLM.
+    The path taken is recorded for the fast-path hit ratio.
+    """
+    if not FAST_PATH_CONFIG['enabled']:
+        return None
+    try:
+        out = prescore(state)
+    except Exception as e:
+        print(f"⚠️  {node} fast path failed, using LLM: {e}")
+        out = None
+    record_path(node, "rules" if out is not None else "llm")
+    return out
+
+def _llm_path(out: Dict[str, Any]) -> Dict[str, Any]:
+    if isinstance(out, dict):
+        out["decision_path"] = "llm"
+    return out
+
+def _sum_assured(app: Dict[str, Any]) -> Optional[float]:
+    try:
+        return float(app.get("coverage_selection", {}).get("coverageAmount") or 0) or None
+    except (TypeError, ValueError):
+        return None
+
+def _guidelines_excerpt(app: Dict[str, Any], health: Dict[str, Any], bmi: Optional[float]) -> str:
+    # Retrieve only the guideline sections relevant to this applicant
+    query = applicant_query(applicant_age(app.get("personal_details", {})), _sum_assured(app), bmi,
+                            disclosed_conditions(health))
+    return "\n---\n".join(guidelines_index.search(query))
+
+def _health_inputs(state: AgentState):
     app = state.get("normalized_by_llm", state.get("application", {}))
     health = app.get("health_info", app.get("health_information", {})) or {}
-    
+
     # compute BMI locally if possible
     bmi = None
     try:
@@ -406,27 +925,15 @@ def health_node(state: AgentState):
             bmi = round(weight / ((height_cm / 100.0) ** 2), 1)
     except Exception:
         bmi = None
+    return app, health, bmi
 
-    # Load underwriting guidelines
-    guidelines_text = ""
-    # In LangGraph structure, we might need to adjust path or use config
-    # For now, we'll try to find it relative to current file or use a default
-    possible_paths = [
-        os.path.join("insurance mcp", "underwriting_guidelines.txt"),
-        os.path.join("..", "insurance mcp", "underwriting_guidelines.txt"),
-        os.path.join(os.path.dirname(__file__), "..", "..", "..", "insurance mcp", "underwriting_guidelines.txt")
-    ]
-    for p in possible_paths:
-        try:
-            p_norm = os.path.normpath(p)
-            if os.path.exists(p_norm):
-                with open(p_norm, "r", encoding="utf-8", errors="ignore") as gf:
-                    guidelines_text = gf.read()
-                break
-        except Exception:
-            continue
+def _health_prescore(state: AgentState) -> Optional[Dict[str, Any]]:
+    app, health, bmi = _health_inputs(state)
+    return prescore_health(health, bmi, applicant_age(app.get("personal_details", {})), _sum_assured(app))
 
-    guidelines_excerpt = (guidelines_text.replace("\n", " ")[:3000]) if guidelines_text else ""
+def _health_request(state: AgentState):
+    app, health, bmi = _health_inputs(state)
+    guidelines_excerpt = _guidelines_excerpt(app, health, bmi)
 
     prompt = f"""
 You are an underwriting assistant. Use the provided underwriting guidelines excerpt to decide if a medical examination is required and to estimate underwriting risk.
@@ -454,76 +961,128 @@ Rules to apply (these are suggestions; use guidelines excerpt to refine):
 
 Return JSON only (no explanation beyond the llm_explanation field).
 """
-    try:
-        resp = client.chat.completions.create(
-            model=AZURE_DEPLOYMENT_NAME,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=500,
-            temperature=0.0,
-            response_format={"type": "json_object"}
-        )
-        out = safe_parse_json(resp.choices[0].message.content)
-    except Exception as e:
-        out = {"error": str(e)}
-        
+    request = dict(
+        model=AZURE_DEPLOYMENT_NAME,
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=500,
+        temperature=0.0,
+        response_format={"type": "json_object"}
+    )
+    return request, bmi
+
+def _health_result(out: Dict[str, Any], bmi: Optional[float]) -> Dict[str, Any]:
     # ensure bmi present in output
     if isinstance(out, dict) and out.get("bmi") is None and bmi is not None:
         out["bmi"] = bmi
-        
-    state["health_underwriting"] = out
-    
-    # Check medical workflow
-    state = check_medical_exam_status(state, db)
-    return state
+    return _llm_path(out)
+
+def _health_update(state: AgentState, out: Dict[str, Any],
+                   previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    # Check medical workflow against a view of the state that includes this node's result
+    medical_state = check_medical_exam_status({**state, "health_underwriting": out}, previous)
+    return {
+        "health_underwriting": out,
+        "medical_exam_workflow": medical_state.get("medical_exam_workflow", {})
+    }
+
+async def _ahealth_update(state: AgentState, out: Dict[str, Any],
+                          previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    medical_state = await acheck_medical_exam_status({**state, "health_underwriting": out}, previous)
+    return {
+        "health_underwriting": out,
+        "medical_exam_workflow": medical_state.get("medical_exam_workflow", {})
+    }
+
+def health_node(state: AgentState):
+    print("--- Health Node ---")
+    out = _fast_path("health", _health_prescore, state)
+    if out is None:
+        request, bmi = _health_request(state)
+        try:
+            out = _json_completion(request, cache=_use_llm_cache(state))
+        except Exception as e:
+            out = {"error": str(e)}
+        out = _health_result(out, bmi)
+    return _health_update(state, out)
+
+async def ahealth_node(state: AgentState):
+    print("--- Health Node ---")
+    out = _fast_path("health", _health_prescore, state)
+    if out is None:
+        request, bmi = _health_request(state)
+        try:
+            out = await _ajson_completion(request, cache=_use_llm_cache(state))
+        except Exception as e:
+            out = {"error": str(e)}
+        out = _health_result(out, bmi)
+    return await _ahealth_update(state, out)
+
+def _mcp_update(hist: Dict[str, Any], fin: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "insurance_history_mcp": {"data": hist, "timestamp": datetime.now().isoformat()},
+        "financial_eligibility_mcp": {"data": fin, "timestamp": datetime.now().isoformat()}
+    }
+
+MCP_TOOLS = ["insurance_history", "financial_eligibility"]
+
+NO_PAN_MCP_UPDATE = {
+    "insurance_history_mcp": {"error": "No PAN"},
+    "financial_eligibility_mcp": {"error": "No PAN"}
+}
 
 def fetch_mcp_data_node(state: AgentState):
     print("--- Fetch MCP Data Node ---")
     app = state.get("normalized_by_llm", state.get("application", {}))
     pan_number = app.get("personal_details", {}).get("panNumber")
-    
+
     if pan_number:
-        # Sequential for simplicity in graph, can be parallelized
-        hist = call_mcp_tool("insurance_history", pan_number)
-        fin = call_mcp_tool("financial_eligibility", pan_number)
-        
-        state["insurance_history_mcp"] = {"data": hist, "timestamp": datetime.now().isoformat()}
-        state["financial_eligibility_mcp"] = {"data": fin, "timestamp": datetime.now().isoformat()}
-    else:
-        state["insurance_history_mcp"] = {"error": "No PAN"}
-        state["financial_eligibility_mcp"] = {"error": "No PAN"}
-        
-    return state
+        # All MCP endpoints are fetched concurrently over the pooled client
+        results = fetch_mcp_tools(MCP_TOOLS, pan_number)
+        return _mcp_update(results["insurance_history"], results["financial_eligibility"])
 
-def financial_node(state: AgentState):
-    print("--- Financial Node ---")
+    return dict(NO_PAN_MCP_UPDATE)
+
+async def afetch_mcp_data_node(state: AgentState):
+    print("--- Fetch MCP Data Node ---")
+    app = state.get("normalized_by_llm", state.get("application", {}))
+    pan_number = app.get("personal_details", {}).get("panNumber")
+
+    if pan_number:
+        results = await afetch_mcp_tools(MCP_TOOLS, pan_number)
+        return _mcp_update(results["insurance_history"], results["financial_eligibility"])
+
+    return dict(NO_PAN_MCP_UPDATE)
+
+def _mcp_prompt_payload(mcp_result: Dict[str, Any]) -> Dict[str, Any]:
+    # The fetch timestamp carries no underwriting signal and would defeat the LLM response cache
+    return {k: v for k, v in mcp_result.items() if k != "timestamp"}
+
+def _financial_request(state: AgentState):
+    """
+    Return (request, None), or (None, update) when the MCP data is unusable.
+    """
     # Get the MCP financial data we already fetched
     mcp_financial = state.get("financial_eligibility_mcp", {})
-    
+
     # If we have an error from MCP, return it
     if "error" in mcp_financial:
-        state["financial_eligibility"] = {
-            "status": "error",
-            "error": mcp_financial.get("error"),
-            "source": "MCP"
+        return None, {
+            "financial_eligibility": {
+                "status": "timed_out" if mcp_financial.get("status") == "timed_out" else "error",
+                "error": mcp_financial.get("error"),
+                "source": "MCP"
+            }
         }
-        return state
-    
+
     # Get other necessary data
     app = state.get("normalized_by_llm", state.get("application", {}))
     fin = app.get("financial_information", {})
     policy = app.get("policy_selection", {})
     personal = app.get("personal_details", {})
-    
+
     # Calculate age from DOB if available
-    age = None
-    if personal.get("dob"):
-        try:
-            from datetime import datetime
-            birth_date = datetime.strptime(personal["dob"], "%Y-%m-%d")
-            age = (datetime.now() - birth_date).days // 365
-        except:
-            pass
-    
+    age = applicant_age(personal)
+
     prompt = f"""
 You are a financial eligibility engine. Given the applicant's financial data from MCP and application, compute:
 - income_to_coverage_ratio
@@ -532,7 +1091,7 @@ You are a financial eligibility engine. Given the applicant's financial data fro
 Return JSON only with these keys.
 
 MCP Financial Data:
-{json.dumps(mcp_financial, indent=2)}
+{json.dumps(_mcp_prompt_payload(mcp_financial), indent=2)}
 
 Application Financial Data:
 {json.dumps(fin, indent=2)}
@@ -549,15 +1108,35 @@ Rules:
 4. Check income_to_sum_assured_ratio from MCP data if available
 5. Higher risk if premium_to_income_ratio > 0.15
 """
+    request = dict(
+        model=AZURE_DEPLOYMENT_NAME,
+        messages=[{"role":"user","content":prompt}],
+        max_tokens=400,
+        temperature=0.0,
+        response_format={"type":"json_object"}
+    )
+    return request, None
+
+def _financial_prescore(state: AgentState) -> Optional[Dict[str, Any]]:
+    mcp_data = state.get("financial_eligibility_mcp", {}).get("data")
+    if not isinstance(mcp_data, dict) or "error" in mcp_data:
+        return None
+    app = state.get("normalized_by_llm", state.get("application", {}))
+    out = prescore_financial(mcp_data, app, applicant_age(app.get("personal_details", {})))
+    if out is not None:
+        out["source"] = "MCP Financial Data"
+    return out
+
+def financial_node(state: AgentState):
+    print("--- Financial Node ---")
+    request, update = _financial_request(state)
+    if request is None:
+        return update
+    fast = _fast_path("financial", _financial_prescore, state)
+    if fast is not None:
+        return {"financial_eligibility": fast}
     try:
-        resp = client.chat.completions.create(
-            model=AZURE_DEPLOYMENT_NAME,
-            messages=[{"role":"user","content":prompt}],
-            max_tokens=400,
-            temperature=0.0,
-            response_format={"type":"json_object"}
-        )
-        out = safe_parse_json(resp.choices[0].message.content)
+        out = _llm_path(_json_completion(request, cache=_use_llm_cache(state)))
         out["source"] = "MCP Financial Data"
     except Exception as e:
         out = {
@@ -565,29 +1144,49 @@ Rules:
             "error": str(e),
             "source": "MCP"
         }
-    
-    state["financial_eligibility"] = out
-    return state
+    return {"financial_eligibility": out}
 
-def insurance_history_node(state: AgentState):
-    print("--- Insurance History Node ---")
+async def afinancial_node(state: AgentState):
+    print("--- Financial Node ---")
+    request, update = _financial_request(state)
+    if request is None:
+        return update
+    fast = _fast_path("financial", _financial_prescore, state)
+    if fast is not None:
+        return {"financial_eligibility": fast}
+    try:
+        out = _llm_path(await _ajson_completion(request, cache=_use_llm_cache(state)))
+        out["source"] = "MCP Financial Data"
+    except Exception as e:
+        out = {
+            "status": "error",
+            "error": str(e),
+            "source": "MCP"
+        }
+    return {"financial_eligibility": out}
+
+def _insurance_history_request(state: AgentState):
+    """
+    Return (request, None), or (None, update) when the MCP data is unusable.
+    """
     # Get the MCP insurance history data we already fetched
     mcp_history = state.get("insurance_history_mcp", {})
-    
+
     # If we have an error from MCP, return it
     if "error" in mcp_history:
-        state["insurance_history"] = {
-            "status": "error",
-            "error": mcp_history.get("error"),
-            "source": "MCP"
+        return None, {
+            "insurance_history": {
+                "status": "timed_out" if mcp_history.get("status") == "timed_out" else "error",
+                "error": mcp_history.get("error"),
+                "source": "MCP"
+            }
         }
-        return state
-    
+
     # Get other necessary data
     app = state.get("normalized_by_llm", state.get("application", {}))
     personal = app.get("personal_details", {})
     fin = app.get("financial_information", {})
-    
+
     prompt = f"""
 You are an insurance history risk evaluator.
 Analyze the applicant's existing insurance history from MCP and return JSON with:
@@ -598,7 +1197,7 @@ Analyze the applicant's existing insurance history from MCP and return JSON with
 - llm_explanation (1-2 sentences)
 
 MCP Insurance History:
-{json.dumps(mcp_history, indent=2)}
+{json.dumps(_mcp_prompt_payload(mcp_history), indent=2)}
 
 Applicant Details:
 {json.dumps(personal, indent=2)}
@@ -613,15 +1212,22 @@ Rules:
 4. Consider the underwritingFlag from MCP data
 5. Higher risk if multiple claims or lapses in coverage
 """
+    request = dict(
+        model=AZURE_DEPLOYMENT_NAME,
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=500,
+        temperature=0.0,
+        response_format={"type": "json_object"}
+    )
+    return request, None
+
+def insurance_history_node(state: AgentState):
+    print("--- Insurance History Node ---")
+    request, update = _insurance_history_request(state)
+    if request is None:
+        return update
     try:
-        resp = client.chat.completions.create(
-            model=AZURE_DEPLOYMENT_NAME,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=500,
-            temperature=0.0,
-            response_format={"type": "json_object"}
-        )
-        out = safe_parse_json(resp.choices[0].message.content)
+        out = _json_completion(request, cache=_use_llm_cache(state))
         out["source"] = "MCP Insurance History"
     except Exception as e:
         out = {
@@ -629,12 +1235,25 @@ Rules:
             "error": str(e),
             "source": "MCP"
         }
-    
-    state["insurance_history"] = out
-    return state
+    return {"insurance_history": out}
 
-def occupation_node(state: AgentState):
-    print("--- Occupation Node ---")
+async def ainsurance_history_node(state: AgentState):
+    print("--- Insurance History Node ---")
+    request, update = _insurance_history_request(state)
+    if request is None:
+        return update
+    try:
+        out = await _ajson_completion(request, cache=_use_llm_cache(state))
+        out["source"] = "MCP Insurance History"
+    except Exception as e:
+        out = {
+            "status": "error",
+            "error": str(e),
+            "source": "MCP"
+        }
+    return {"insurance_history": out}
+
+def _occupation_request(state: AgentState) -> Dict[str, Any]:
     occ = state.get("normalized_by_llm", {}).get("occupation_details", {})
     prompt = f"""
 You are an occupation risk assessor. Given occupation_details JSON, return:
@@ -649,69 +1268,120 @@ Rules:
 - Self-employed -> +0.2
 - Physical hazardous jobs -> +0.3
 """
+    return dict(
+        model=AZURE_DEPLOYMENT_NAME,
+        messages=[{"role":"user","content":prompt}],
+        max_tokens=250,
+        temperature=0.0,
+        response_format={"type":"json_object"}
+    )
+
+def _occupation_prescore(state: AgentState) -> Optional[Dict[str, Any]]:
+    return prescore_occupation(state.get("normalized_by_llm", {}).get("occupation_details", {}))
+
+def occupation_node(state: AgentState):
+    print("--- Occupation Node ---")
+    out = _fast_path("occupation", _occupation_prescore, state)
+    if out is None:
+        try:
+            out = _llm_path(_json_completion(_occupation_request(state), cache=_use_llm_cache(state)))
+        except Exception as e:
+            out = {"error": str(e)}
+    return {"occupation_risk": out}
+
+async def aoccupation_node(state: AgentState):
+    print("--- Occupation Node ---")
+    out = _fast_path("occupation", _occupation_prescore, state)
+    if out is None:
+        try:
+            out = _llm_path(await _ajson_completion(_occupation_request(state), cache=_use_llm_cache(state)))
+        except Exception as e:
+            out = {"error": str(e)}
+    return {"occupation_risk": out}
+
+def _decision_components(state: AgentState) -> Dict[str, Any]:
+    return {
+        "kyc": state.get("kyc_reconciliation"),
+        "health": state.get("health_underwriting"),
+        "financial": state.get("financial_eligibility"),
+        "occupation": state.get("occupation_risk")
+    }
+
+def _summary_request(state: AgentState, decision: Dict[str, Any]) -> Dict[str, Any]:
+    # Only the prose is generated by the LLM; score and decision are already final
+    components = {
+        name: {k: v for k, v in (result or {}).items()
+               if k in ("risk_score", "recommendation", "kyc_status", "kyc_confidence", "risk_factors", "red_flags", "reasons")}
+        for name, result in _decision_components(state).items()
+    }
+    prompt = f"""
+You are a senior underwriter. Write a 2-sentence human-readable explanation of the underwriting decision below.
+Do not change the score or the decision.
+Return JSON only with key: ai_summary
+Decision JSON:
+{json.dumps({k: decision.get(k) for k in ("overall_risk_score", "final_decision", "reasons", "missing_components")})}
+Component summaries:
+{json.dumps(components)}
+"""
+    return dict(
+        model=AZURE_DEPLOYMENT_NAME,
+        messages=[{"role":"user","content":prompt}],
+        max_tokens=150,
+        temperature=0.0,
+        response_format={"type":"json_object"}
+    )
+
+def _with_summary(decision: Dict[str, Any], out: Dict[str, Any]) -> Dict[str, Any]:
+    summary = out.get("ai_summary") if isinstance(out, dict) else None
+    if not summary:
+        return decision
+    return {**decision, "ai_summary": summary, "ai_summary_source": "llm"}
+
+def ai_summary(state: AgentState, decision: Dict[str, Any]) -> Dict[str, Any]:
     try:
-        resp = client.chat.completions.create(
-            model=AZURE_DEPLOYMENT_NAME,
-            messages=[{"role":"user","content":prompt}],
-            max_tokens=250,
-            temperature=0.0,
-            response_format={"type":"json_object"}
-        )
-        out = safe_parse_json(resp.choices[0].message.content)
+        out = _json_completion(_summary_request(state, decision), cache=_use_llm_cache(state))
     except Exception as e:
         out = {"error": str(e)}
-        
-    state["occupation_risk"] = out
-    return state
+    return _with_summary(decision, out)
 
-def decision_node(state: AgentState):
-    print("--- Decision Node ---")
-    # Aggregate scores
-    kyc = state.get("kyc_reconciliation", {})
-    health = state.get("health_underwriting", {})
-    fin = state.get("financial_eligibility", {})
-    occ = state.get("occupation_risk", {})
-    
-    prompt = f"""
-You are a senior underwriting decision engine. Combine the following component JSONs and produce:
-- overall_risk_score (0-1) computed by weighting: kyc 0.1, health 0.4, financial 0.3, occupation 0.2
-- final_decision: Accept | Manual Review | Decline (thresholds: <=0.3 accept, <=0.6 manual review, >0.6 decline)
-- reasons: short bullet list of top 3 reasons
-- ai_summary: 2-sentence human-readable explanation
-Return JSON only with keys: overall_risk_score, final_decision, reasons (array), ai_summary
-KYC JSON:
-{json.dumps(kyc)}
-Health JSON:
-{json.dumps(health)}
-Financial JSON:
-{json.dumps(fin)}
-Occupation JSON:
-{json.dumps(occ)}
-"""
+async def aai_summary(state: AgentState, decision: Dict[str, Any]) -> Dict[str, Any]:
     try:
-        resp = client.chat.completions.create(
-            model=AZURE_DEPLOYMENT_NAME,
-            messages=[{"role":"user","content":prompt}],
-            max_tokens=300,
-            temperature=0.0,
-            response_format={"type":"json_object"}
-        )
-        out = safe_parse_json(resp.choices[0].message.content)
+        out = await _ajson_completion(_summary_request(state, decision), cache=_use_llm_cache(state))
     except Exception as e:
         out = {"error": str(e)}
-        
-    state["policy_decision"] = out
-    return state
+    return _with_summary(decision, out)
 
-def report_node(state: AgentState):
-    print("--- Report Node ---")
-    from fpdf import FPDF
-    out_dir = "reports"
-    os.makedirs(out_dir, exist_ok=True)
+def _local_decision(state: AgentState) -> Dict[str, Any]:
+    out = compute_decision(_decision_components(state))
+    fired = state.get("short_circuit")
+    if fired:
+        # The rule's decision stands unless the scores are already more severe
+        out["final_decision"] = max(out["final_decision"], fired["decision"], key=DECISIONS.index)
+        out["reasons"] = [fired["reason"]] + out["reasons"]
+        out["decision_engine"] = "short_circuit"
+        out["short_circuit"] = fired
+    out["ai_summary"] = template_summary(out)
+    out["ai_summary_source"] = "template"
+    return out
+
+def decision_node(state: AgentState):
+    print("--- Decision Node ---")
+    out = _local_decision(state)
+    if DECISION_CONFIG['ai_summary'] == "inline" and not state.get("short_circuit"):
+        out = ai_summary(state, out)
+    return {"policy_decision": out}
+
+async def adecision_node(state: AgentState):
+    print("--- Decision Node ---")
+    out = _local_decision(state)
+    if DECISION_CONFIG['ai_summary'] == "inline" and not state.get("short_circuit"):
+        out = await aai_summary(state, out)
+    return {"policy_decision": out}
+
+def _report_request(state: AgentState) -> Dict[str, Any]:
     app = state.get("normalized_by_llm", state.get("application", {}))
-    name = app.get("personal_details", {}).get("full_name", "Applicant")
     decision = state.get("policy_decision", {})
-    
+
     # Generate report text using LLM
     prompt = f"""
 You are a professional underwriting report writer. Write a concise 2-paragraph underwriting summary based on the following:
@@ -721,26 +1391,42 @@ Final Decision JSON:
 {json.dumps(decision, ensure_ascii=False)}
 Return plain text (no JSON).
 """
-    try:
-        resp = client.chat.completions.create(
-            model=AZURE_DEPLOYMENT_NAME,
-            messages=[{"role":"user","content":prompt}],
-            max_tokens=400,
-            temperature=0.3
-        )
-        text = resp.choices[0].message.content.strip()
-    except Exception as e:
-        text = f"Error generating report text: {str(e)}"
+    return dict(
+        model=AZURE_DEPLOYMENT_NAME,
+        messages=[{"role":"user","content":prompt}],
+        max_tokens=400,
+        temperature=0.3
+    )
+
+def _report_cache(state: AgentState) -> bool:
+    # The report prose is sampled at temperature 0.3, so caching it is opt-in
+    return LLM_CACHE_CONFIG['cache_report'] and _use_llm_cache(state)
+
+def render_report_pdf(state: AgentState, text: str) -> str:
+    """
+    Render the report text to a PDF under `reports/` and return its path.
+    """
+    with span("report.render_pdf", **{"report.text_chars": len(text)}) as current:
+        path = _write_report_pdf(state, text)
+        set_attributes(current, **{"report.bytes": os.path.getsize(path)})
+        return path
+
+def _write_report_pdf(state: AgentState, text: str) -> str:
+    from fpdf import FPDF
+    out_dir = "reports"
+    os.makedirs(out_dir, exist_ok=True)
+    app = state.get("normalized_by_llm", state.get("application", {}))
+    name = app.get("personal_details", {}).get("full_name", "Applicant")
 
     # Build PDF with Unicode support
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
     path = os.path.join(out_dir, f"Underwriting_Report_{name.replace(' ', '_')}_{ts}.pdf")
-    
+
     # Create PDF with Unicode support
     pdf = FPDF()
     pdf.add_page()
     pdf.set_auto_page_break(True, 15)
-    
+
     # Add a Unicode-compatible font (DejaVuSans supports many Unicode characters including ₹)
     try:
         # Try to use DejaVuSans if available
@@ -754,60 +1440,435 @@ Return plain text (no JSON).
         except:
             # Final fallback to standard font (may not support all Unicode chars)
             pdf.set_font('Arial', size=11)
-    
+
     # Add header
     pdf.set_font('Arial', 'B', 14)
     pdf.cell(0, 8, "Underwriting Report", ln=True, align="C")
     pdf.ln(6)
-    
+
     # Add main content with proper Unicode handling
     pdf.set_font('Arial', '', 11)
-    
+
     # Replace Rupee symbol with 'Rs.' if the current font doesn't support it
     if '₹' in text and pdf.get_string_width('₹') == 0:
         text = text.replace('₹', 'Rs.')
-    
+
     # Add multi-line text with proper encoding
     pdf.multi_cell(0, 6, text.encode('latin-1', 'replace').decode('latin-1') if pdf.font_family == 'Arial' else text)
-    
+
     # Add footer
     pdf.ln(6)
     pdf.set_font('Arial', 'I', 9)
     pdf.cell(0, 6, f"Generated: {datetime.now().isoformat()}", ln=True)
-    
+
     # Save the PDF
     pdf.output(path, 'F')
-    
-    out = {"report_path": path, "status": "success"}
-    state["underwriting_report"] = out
-    return state
+    return path
+
+def _report_text(state: AgentState) -> str:
+    try:
+        resp = chat_completion(cache=_report_cache(state), **_report_request(state))
+        return resp.choices[0].message.content.strip()
+    except Exception as e:
+        return f"Error generating report text: {str(e)}"
+
+async def _areport_text(state: AgentState) -> str:
+    try:
+        resp = await achat_completion(cache=_report_cache(state), **_report_request(state))
+        return resp.choices[0].message.content.strip()
+    except Exception as e:
+        return f"Error generating report text: {str(e)}"
+
+def _summary_deferred(state: AgentState) -> bool:
+    decision = state.get("policy_decision") or {}
+    return DECISION_CONFIG['ai_summary'] == "deferred" and decision.get("ai_summary_source") == "template"
+
+def report_node(state: AgentState):
+    print("--- Report Node ---")
+    update = {}
+    if _summary_deferred(state):
+        # Deferred decision summary runs alongside the report text instead of on the decision's critical path
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="summary") as pool:
+            summary_future = pool.submit(bind_node(ai_summary), state, state["policy_decision"])
+            text = _report_text(state)
+            update["policy_decision"] = summary_future.result()
+    else:
+        text = _report_text(state)
+
+    path = render_report_pdf(state, text)
+    update["underwriting_report"] = {"report_path": path, "status": "success"}
+    return update
+
+async def areport_node(state: AgentState):
+    print("--- Report Node ---")
+    update = {}
+    if _summary_deferred(state):
+        update["policy_decision"], text = await asyncio.gather(
+            aai_summary(state, state["policy_decision"]),
+            _areport_text(state)
+        )
+    else:
+        text = await _areport_text(state)
+
+    # PDF rendering is CPU/disk bound; keep it off the event loop
+    path = await asyncio.to_thread(render_report_pdf, state, text)
+    update["underwriting_report"] = {"report_path": path, "status": "success"}
+    return update
+
+def _brief_report_text(state: AgentState) -> str:
+    decision = state.get("policy_decision", {})
+    fired = state.get("short_circuit") or {}
+    paragraphs = [
+        f"Decision: {decision.get('final_decision')} (decided early after the {fired.get('node')} step).",
+        f"Reason: {fired.get('reason')}.",
+        decision.get("ai_summary", "")
+    ]
+    issues = (state.get("ingest_llm") or {}).get("manual_validation_issues")
+    if issues:
+        paragraphs.append("Validation issues: " + "; ".join(issues))
+    return "\n\n".join(p for p in paragraphs if p)
+
+def _brief_report_update(path: str) -> Dict[str, Any]:
+    return {"underwriting_report": {"report_path": path, "status": "success", "report_type": "brief"}}
+
+def brief_report_node(state: AgentState):
+    print("--- Brief Report Node ---")
+    return _brief_report_update(render_report_pdf(state, _brief_report_text(state)))
+
+async def abrief_report_node(state: AgentState):
+    print("--- Brief Report Node ---")
+    path = await asyncio.to_thread(render_report_pdf, state, _brief_report_text(state))
+    return _brief_report_update(path)
 
 # --- Graph Construction ---
 
+# State key each component node writes its result to
+NODE_OUTPUTS = {
+    "kyc": "kyc_reconciliation",
+    "health": "health_underwriting",
+    "financial": "financial_eligibility",
+    "insurance_history": "insurance_history",
+    "occupation": "occupation_risk"
+}
+
+# Update keys that carry graph inputs rather than node results
+NODE_INPUT_KEYS = {"application"}
+
+def node_result(update: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """ JSON-safe result of one node update, for job progress and streamed events. """
+    result = {k: v for k, v in (update or {}).items() if k not in NODE_INPUT_KEYS}
+    return json.loads(json.dumps(result, default=str))
+
+def _reused_update(name: str, state: AgentState) -> Dict[str, Any]:
+    print(f"♻️  Reusing the {name} result of the previous run")
+    update = copy.deepcopy(state["reused_results"][name])
+    if name == "health":
+        # Exam reports may have arrived since; an exam the previous run queued is not queued again
+        return _health_update(state, update["health_underwriting"], update.get("medical_exam_workflow"))
+    return update
+
+async def _areused_update(name: str, state: AgentState) -> Dict[str, Any]:
+    if name == "health":
+        print(f"♻️  Reusing the {name} result of the previous run")
+        update = copy.deepcopy(state["reused_results"][name])
+        return await _ahealth_update(state, update["health_underwriting"], update.get("medical_exam_workflow"))
+    return _reused_update(name, state)
+
+def _skipped_update(name: str, state: AgentState) -> Dict[str, Any]:
+    rule = state["short_circuit"]["rule"]
+    print(f"⏭️  Skipping {name}: short-circuit ({rule})")
+    return {NODE_OUTPUTS[name]: {"status": "skipped", "reason": f"short_circuit:{rule}"}}
+
+def _check_short_circuit(name: str, update: Dict[str, Any]) -> Dict[str, Any]:
+    fired = after_component(name, update.get(NODE_OUTPUTS.get(name, "")))
+    if fired:
+        print(f"⏭️  Short-circuit after {name}: {fired['reason']}")
+        update["short_circuit"] = fired
+    return update
+
+def _set_node_attributes(current, name: str, update: Dict[str, Any]) -> None:
+    result = update.get(NODE_OUTPUTS.get(name, ""))
+    set_attributes(current, **{
+        "graph.node.error": has_error(update),
+        "graph.node.skipped": isinstance(result, dict) and result.get("status") == "skipped",
+        "graph.node.timed_out": any(isinstance(v, dict) and v.get("status") == "timed_out" for v in update.values())
+                                or (update.get("short_circuit") or {}).get("rule") == "deadline",
+        "underwriting.decision_path": result.get("decision_path") if isinstance(result, dict) else None,
+        "underwriting.short_circuit": (update.get("short_circuit") or {}).get("rule")
+    })
+
+def _timed_update(name: str, update: Dict[str, Any], elapsed: float) -> Dict[str, Any]:
+    record_node(name, elapsed, error=has_error(update))
+    update["node_timings"] = {name: round(elapsed, 3)}
+    return update
+
+# State keys a non-component node writes, marked timed out when it overruns its budget
+TIMED_OUT_OUTPUTS = {
+    "document_processing": ["document_processing"],
+    "fetch_mcp": ["insurance_history_mcp", "financial_eligibility_mcp"],
+    "report": ["underwriting_report"]
+}
+
+def _timed_out_update(name: str, reason: str) -> Dict[str, Any]:
+    print(f"⏱️  {name} timed out: {reason}")
+    record_node_timeout(name)
+    result = {"status": "timed_out", "reason": f"deadline: {reason}"}
+    if name == "ingest":
+        # Without the application nothing downstream can run; decide for manual review
+        return {"short_circuit": {"rule": "deadline", "node": name, "reason": result["reason"],
+                                  "decision": DEADLINE_CONFIG['ingest_timeout_decision']}}
+    if name in NODE_OUTPUTS:
+        return {NODE_OUTPUTS[name]: result}
+    # MCP consumers treat a top-level "error" as unusable data
+    return {key: {**result, "error": result["reason"]} if name == "fetch_mcp" else result
+            for key in TIMED_OUT_OUTPUTS.get(name, [])}
+
+def _node_deadline(name: str, state: AgentState, config: Optional[Dict[str, Any]] = None) -> Optional[float]:
+    """
+    The request deadline; ingest starts the default one when the caller set none.
+    A resumed run carries its new deadline in the config (the state holds the old one).
+    """
+    resumed = ((config or {}).get("configurable") or {}).get("deadline")
+    if resumed is not None:
+        return resumed
+    if state.get("deadline") is None and name == "ingest":
+        return request_deadline()
+    return state.get("deadline")
+
+def timed_node(name: str, fn, afn):
+    """
+    Wrap a node's sync and async implementations so its wall time is reported
+    through the `node_timings` channel and the node metrics. `invoke` runs `fn`, `ainvoke` runs `afn`.
+    Component nodes are skipped once a short-circuit has fired, and their results
+    are checked against the short-circuit rules.
+    Each node runs within its share of the request deadline and degrades to a
+    "timed_out" result when it overruns. In incremental mode a node whose inputs did
+    not change returns its result from the previous run instead of running.
+    """
+    def wrapper(state: AgentState, config: Dict[str, Any]):
+        start = time.perf_counter()
+        deadline = _node_deadline(name, state, config)
+        budget = node_budget(name, deadline, NODE_PATH_WEIGHTS)
+        with node_context(name), deadline_context(budget), \
+                span(f"node.{name}", **{"graph.node": name, "graph.node.budget_seconds": budget}) as current:
+            try:
+                if should_skip(name, state):
+                    update = _skipped_update(name, state)
+                elif name in (state.get("reused_results") or {}):
+                    update = _check_short_circuit(name, _reused_update(name, state))
+                    set_attributes(current, **{"graph.node.reused": True})
+                elif budget is not None and budget <= 0:
+                    update = _timed_out_update(name, "deadline passed before the node started")
+                else:
+                    try:
+                        update = _check_short_circuit(name, run_with_budget(fn, state, budget) or {})
+                    except NodeTimeout as e:
+                        update = _timed_out_update(name, str(e))
+                _set_node_attributes(current, name, update)
+            except Exception:
+                record_node(name, time.perf_counter() - start, error=True)
+                raise
+        if deadline is not None and state.get("deadline") is None:
+            update["deadline"] = deadline
+        return _timed_update(name, update, time.perf_counter() - start)
+
+    async def awrapper(state: AgentState, config: Dict[str, Any]):
+        start = time.perf_counter()
+        deadline = _node_deadline(name, state, config)
+        budget = node_budget(name, deadline, NODE_PATH_WEIGHTS)
+        with node_context(name), deadline_context(budget), \
+                span(f"node.{name}", **{"graph.node": name, "graph.node.budget_seconds": budget}) as current:
+            try:
+                if should_skip(name, state):
+                    update = _skipped_update(name, state)
+                elif name in (state.get("reused_results") or {}):
+                    update = _check_short_circuit(name, await _areused_update(name, state))
+                    set_attributes(current, **{"graph.node.reused": True})
+                elif budget is not None and budget <= 0:
+                    update = _timed_out_update(name, "deadline passed before the node started")
+                else:
+                    try:
+                        update = _check_short_circuit(name, await arun_with_budget(afn, state, budget) or {})
+                    except NodeTimeout as e:
+                        update = _timed_out_update(name, str(e))
+                _set_node_attributes(current, name, update)
+            except Exception:
+                record_node(name, time.perf_counter() - start, error=True)
+                raise
+        if deadline is not None and state.get("deadline") is None:
+            update["deadline"] = deadline
+        return _timed_update(name, update, time.perf_counter() - start)
+
+    return RunnableLambda(wrapper, afunc=awrapper, name=name)
+
+# Nodes that only need the normalized application run in parallel right after ingest.
+# financial and insurance_history only need the MCP data; kyc only needs the OCR results.
+# Everything joins before the decision node.
+PARALLEL_AFTER_INGEST = ["document_processing", "health", "fetch_mcp", "occupation"]
+DECISION_DEPENDENCIES = ["kyc", "health", "financial", "insurance_history", "occupation"]
+
+# Edges below, as used to split the request deadline (report is the longer decision branch)
+NODE_SUCCESSORS = {
+    "ingest": PARALLEL_AFTER_INGEST,
+    "document_processing": ["kyc"],
+    "fetch_mcp": ["financial", "insurance_history"],
+    **{name: ["decision"] for name in DECISION_DEPENDENCIES},
+    "decision": ["report"],
+    "report": [],
+    "brief_report": []
+}
+NODE_PATH_WEIGHTS = critical_path_weights(NODE_SUCCESSORS)
+
+# Application sections each node reads, for incremental re-underwriting (see agent/results.py).
+# A changed section re-runs its readers and everything downstream of them; decision and the
+# reports always run. A section not listed here re-runs every node.
+SECTION_DEPENDENCIES = {
+    "personal_details": ["kyc", "health", "fetch_mcp", "financial", "insurance_history"],
+    "nominee_details": ["kyc"],
+    "documents": ["document_processing"],
+    "health_info": ["health"],
+    "health_information": ["health"],
+    "coverage_selection": ["health", "financial"],
+    "policy_selection": ["financial"],
+    "financial_information": ["financial", "insurance_history"],
+    "occupation_details": ["occupation"],
+    "contact_info": [],
+    "payment": []
+}
+# Top-level fields that are bookkeeping rather than application data
+IGNORED_SECTIONS = {"_id", "created_at", "updated_at"}
+
+# State keys holding the result of each node that can be reused
+REUSABLE_OUTPUTS = {
+    "document_processing": ["document_processing"],
+    "fetch_mcp": ["insurance_history_mcp", "financial_eligibility_mcp"],
+    **{name: [key] for name, key in NODE_OUTPUTS.items()},
+    # The medical workflow tells a reused health result whether its exam is already queued
+    "health": ["health_underwriting", "medical_exam_workflow"]
+}
+
+def changed_sections(previous: Dict[str, Any], current: Dict[str, Any]) -> Set[str]:
+    return {section for section in set(previous) | set(current)
+            if section not in IGNORED_SECTIONS and previous.get(section) != current.get(section)}
+
+def affected_nodes(sections: Iterable[str]) -> Set[str]:
+    """ Nodes that must re-run when `sections` changed: their readers and everything downstream. """
+    dirty: Set[str] = set()
+    for section in sections:
+        dirty.update(SECTION_DEPENDENCIES.get(section, NODE_SUCCESSORS))
+    pending = list(dirty)
+    while pending:
+        for successor in NODE_SUCCESSORS.get(pending.pop(), []):
+            if successor not in dirty:
+                dirty.add(successor)
+                pending.append(successor)
+    return dirty
+
+def reusable_outputs(final_state: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """ Node results of a finished run that a later run may reuse (skipped or failed ones are left out). """
+    outputs = {}
+    for name, keys in REUSABLE_OUTPUTS.items():
+        update = {key: final_state.get(key) for key in keys}
+        if all(isinstance(v, dict) and v.get("status") not in ("skipped", "timed_out") for v in update.values()) \
+                and not has_error(update):
+            outputs[name] = update
+    return outputs
+
+def route_after_ingest(state: AgentState):
+    # Incomplete applications go straight to the decision
+    return "decision" if state.get("short_circuit") else PARALLEL_AFTER_INGEST
+
+def route_after_decision(state: AgentState) -> str:
+    if state.get("short_circuit") and SHORT_CIRCUIT_CONFIG['brief_report']:
+        return "brief_report"
+    return "report"
+
 workflow = StateGraph(AgentState)
 
-workflow.add_node("ingest", ingest_node)
-workflow.add_node("document_processing", document_processing_node)
-workflow.add_node("kyc", kyc_node)
-workflow.add_node("health", health_node)
-workflow.add_node("fetch_mcp", fetch_mcp_data_node)
-workflow.add_node("financial", financial_node)
-workflow.add_node("insurance_history", insurance_history_node)
-workflow.add_node("occupation", occupation_node)
-workflow.add_node("decision", decision_node)
-workflow.add_node("report", report_node)
+workflow.add_node("ingest", timed_node("ingest", ingest_node, aingest_node))
+workflow.add_node("document_processing", timed_node("document_processing", document_processing_node, adocument_processing_node))
+workflow.add_node("kyc", timed_node("kyc", kyc_node, akyc_node))
+workflow.add_node("health", timed_node("health", health_node, ahealth_node))
+workflow.add_node("fetch_mcp", timed_node("fetch_mcp", fetch_mcp_data_node, afetch_mcp_data_node))
+workflow.add_node("financial", timed_node("financial", financial_node, afinancial_node))
+workflow.add_node("insurance_history", timed_node("insurance_history", insurance_history_node, ainsurance_history_node))
+workflow.add_node("occupation", timed_node("occupation", occupation_node, aoccupation_node))
+workflow.add_node("decision", timed_node("decision", decision_node, adecision_node))
+workflow.add_node("report", timed_node("report", report_node, areport_node))
+workflow.add_node("brief_report", timed_node("brief_report", brief_report_node, abrief_report_node))
 
-workflow.set_entry_point("ingest")
+workflow.add_edge(START, "ingest")
 
-workflow.add_edge("ingest", "document_processing")
+workflow.add_conditional_edges("ingest", route_after_ingest, PARALLEL_AFTER_INGEST + ["decision"])
 workflow.add_edge("document_processing", "kyc")
-workflow.add_edge("kyc", "health")
-workflow.add_edge("health", "fetch_mcp")
 workflow.add_edge("fetch_mcp", "financial")
-workflow.add_edge("financial", "insurance_history")
-workflow.add_edge("insurance_history", "occupation")
-workflow.add_edge("occupation", "decision")
-workflow.add_edge("decision", "report")
+workflow.add_edge("fetch_mcp", "insurance_history")
+
+# Join: decision waits for every component branch (short-circuited nodes report "skipped")
+workflow.add_edge(DECISION_DEPENDENCIES, "decision")
+workflow.add_conditional_edges("decision", route_after_decision, ["report", "brief_report"])
 workflow.add_edge("report", END)
+workflow.add_edge("brief_report", END)
+
+insurance_graph = workflow.compile(checkpointer=checkpointer)
+
+
+def run_config(application_id: str, run_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Graph config for one underwriting run; checkpoints are kept per application and run ID.
+    Without a `run_id` the run gets a new one.
+    """
+    run_id = run_id or uuid.uuid4().hex
+    return {"configurable": {"thread_id": f"{application_id}:{run_id}", "application_id": application_id,
+                             "run_id": run_id}}
+
+def _resume(initial_state: Dict[str, Any], config: Dict[str, Any]) -> None:
+    configurable = config["configurable"]
+    # The checkpointed deadline belongs to the failed attempt
+    configurable["deadline"] = initial_state.get("deadline") or request_deadline()
+    print(f"♻️  Resuming run {configurable['run_id']} of application {configurable['application_id']}")
 
-insurance_graph = workflow.compile()
+def graph_input(initial_state: Dict[str, Any], config: Dict[str, Any], resume: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Input for `insurance_graph.invoke(..., config)`: `initial_state` for a new run, or None
+    to resume a checkpointed one from its last completed node (a finished run returns its result).
+    """
+    if resume and checkpointer is not None and checkpointer.get_tuple(config) is not None:
+        _resume(initial_state, config)
+        return None
+    return initial_state
+
+async def agraph_input(initial_state: Dict[str, Any], config: Dict[str, Any],
+                       resume: bool = True) -> Optional[Dict[str, Any]]:
+    if resume and checkpointer is not None and await checkpointer.aget_tuple(config) is not None:
+        _resume(initial_state, config)
+        return None
+    return initial_state
+
+
+if __name__ == "__main__":
+    # CLI: python -m app_server.agent.insurance_graph <application_id> [run_id to resume]
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage: python -m app_server.agent.insurance_graph <application_id> [run_id]")
+        sys.exit(1)
+
+    configure_tracing()
+    config = run_config(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    try:
+        with span("underwrite", **{"underwriting.application_id": sys.argv[1]}) as root:
+            initial_state = {"application_id": sys.argv[1]}
+            final_state = insurance_graph.invoke(graph_input(initial_state, config, resume=len(sys.argv) > 2), config)
+            set_attributes(root, **{"underwriting.decision": (final_state.get("policy_decision") or {}).get("final_decision")})
+    finally:
+        if checkpointer is not None:
+            checkpointer.close()
+            print(f"💾 Run ID {config['configurable']['run_id']} (pass it to resume)")
+    close_cassette()
+    shutdown_tracing()
+    print(json.dumps({
+        "run_id": config["configurable"]["run_id"],
+        "decision": final_state.get("policy_decision"),
+        "report": final_state.get("underwriting_report")
+    }, indent=2, default=str))
@@ -0,0 +1,326 @@
+"""
+Job mode for underwriting: a Mongo-backed queue with leases.
+
+`POST /underwrite` with `mode="async"` enqueues a job and returns its id at once;
+workers claim queued jobs (or jobs whose lease expired), run the graph, record each
+node's result on the job as it finishes and store the final decision. `GET /jobs/{id}`
+reads the job document.
+
+Workers run as tasks inside the API process (JOBS_CONFIG['workers']) or standalone:
+
+    python -m app_server.agent.jobs [workers]
+
+A worker renews its lease while the graph runs; if it dies, another worker reclaims
+the job after `lease_seconds` and runs it again, up to `max_attempts`. A worker that
+finds its lease taken over stops the run, so one job never runs on two workers.
+"""
+
+import json
+import time
+import logging
+import uuid
+import socket
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from .config import JOBS_CONFIG
+from .insurance_graph import db, insurance_graph, node_result, run_config, agraph_input
+from .metrics import UNDERWRITINGS_IN_FLIGHT, UNDERWRITING_DURATION
+from .tracing import span, set_attributes
+
+QUEUED, RUNNING, COMPLETED, FAILED = "queued", "running", "completed", "failed"
+
+def _jobs():
+    return db[JOBS_CONFIG['collection']]
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _mongo_safe(value: Any) -> Any:
+    # Node results may hold datetimes, ObjectIds or tuples; store their JSON form
+    return json.loads(json.dumps(value, default=str))
+
+
+def ensure_job_indexes() -> None:
+    jobs = _jobs()
+    jobs.create_index([("status", ASCENDING), ("created_at", ASCENDING)])
+    jobs.create_index("expires_at", expireAfterSeconds=0)
+    # At most one queued/running job per application and cache mode
+    jobs.create_index([("application_id", ASCENDING), ("bypass_cache", ASCENDING)], unique=True,
+                      partialFilterExpression={"active": True}, name="active_job_per_application")
+
+
+def enqueue_job(application_id: str, bypass_cache: bool = False) -> Dict[str, Any]:
+    """
+    Queue an underwriting and return the job. A retried request for an application that
+    already has a queued or running job gets that job instead of a duplicate.
+    """
+    now = _now()
+    job = {
+        "_id": uuid.uuid4().hex,
+        "status": QUEUED,
+        "attempts": 0,
+        "created_at": now,
+        "updated_at": now,
+        "node_results": {}
+    }
+    for _ in range(2):
+        try:
+            return _jobs().find_one_and_update(
+                {"application_id": application_id, "bypass_cache": bypass_cache, "active": True},
+                {"$setOnInsert": job},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Lost an insert race; the other request's job is now visible
+            continue
+    raise RuntimeError(f"Could not enqueue job for application {application_id}")
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    job = _jobs().find_one({"_id": job_id}, {"active": 0})
+    if job is None:
+        return None
+    job["job_id"] = job.pop("_id")
+    return _mongo_safe(job)
+
+
+def claim_job(worker_id: str) -> Optional[Dict[str, Any]]:
+    """ Lease the oldest queued job, or a running one whose worker stopped renewing. """
+    now = _now()
+    return _jobs().find_one_and_update(
+        {
+            "active": True,
+            "attempts": {"$lt": JOBS_CONFIG['max_attempts']},
+            "$or": [{"status": QUEUED}, {"status": RUNNING, "lease_until": {"$lt": now}}]
+        },
+        {
+            "$set": {"status": RUNNING, "worker_id": worker_id, "updated_at": now,
+                     "lease_until": now + timedelta(seconds=JOBS_CONFIG['lease_seconds'])},
+            "$inc": {"attempts": 1}
+        },
+        sort=[("created_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def fail_abandoned_jobs() -> int:
+    """ Give up on jobs whose lease expired after the last allowed attempt. """
+    now = _now()
+    result = _jobs().update_many(
+        {"active": True, "status": RUNNING, "lease_until": {"$lt": now},
+         "attempts": {"$gte": JOBS_CONFIG['max_attempts']}},
+        {"$set": {"status": FAILED, "error": "lease expired on the last attempt", "updated_at": now,
+                  "expires_at": now + timedelta(seconds=JOBS_CONFIG['result_ttl'])},
+         "$unset": {"active": "", "lease_until": ""}}
+    )
+    return result.modified_count
+
+
+def _update_owned(job: Dict[str, Any], update: Dict[str, Any]) -> bool:
+    """ Update a job only while this worker still holds it (its lease was not taken over). """
+    result = _jobs().update_one({"_id": job["_id"], "worker_id": job["worker_id"], "attempts": job["attempts"]},
+                                update)
+    return result.matched_count == 1
+
+
+def renew_lease(job: Dict[str, Any]) -> bool:
+    now = _now()
+    return _update_owned(job, {"$set": {"updated_at": now,
+                                        "lease_until": now + timedelta(seconds=JOBS_CONFIG['lease_seconds'])}})
+
+
+def record_node_result(job: Dict[str, Any], node: str, update: Optional[Dict[str, Any]]) -> bool:
+    return _update_owned(job, {"$set": {f"node_results.{node}": node_result(update), "updated_at": _now()}})
+
+
+def complete_job(job: Dict[str, Any], final_state: Dict[str, Any]) -> bool:
+    now = _now()
+    return _update_owned(job, {
+        "$set": {"status": COMPLETED, "updated_at": now, "finished_at": now,
+                 "decision": _mongo_safe(final_state.get("policy_decision")),
+                 "report": _mongo_safe(final_state.get("underwriting_report")),
+                 "expires_at": now + timedelta(seconds=JOBS_CONFIG['result_ttl'])},
+        "$unset": {"active": "", "lease_until": "", "error": ""}
+    })
+
+
+def fail_job(job: Dict[str, Any], error: str) -> bool:
+    """ Requeue the job for another attempt, or mark it failed after the last one. """
+    now = _now()
+    if job["attempts"] < JOBS_CONFIG['max_attempts']:
+        return _update_owned(job, {"$set": {"status": QUEUED, "error": error, "updated_at": now},
+                                   "$unset": {"lease_until": ""}})
+    return _update_owned(job, {
+        "$set": {"status": FAILED, "error": error, "updated_at": now, "finished_at": now,
+                 "expires_at": now + timedelta(seconds=JOBS_CONFIG['result_ttl'])},
+        "$unset": {"active": "", "lease_until": ""}
+    })
+
+
+class LeaseLost(Exception):
+    """ Another worker took the job over; this worker must stop running it. """
+
+
+async def _heartbeat(job: Dict[str, Any], run: asyncio.Task) -> None:
+    """ Renew the job's lease while `run` executes; cancel `run` once the lease is lost. """
+    while True:
+        await asyncio.sleep(JOBS_CONFIG['heartbeat_interval'])
+        try:
+            renewed = await asyncio.to_thread(renew_lease, job)
+        except Exception:
+            # e.g. a Mongo failover: the lease outlasts several heartbeats, so try again at the next one
+            logging.exception(f"Could not renew the lease on job {job['_id']}")
+            continue
+        if not renewed:
+            print(f"⚠️  Lost the lease on job {job['_id']}, stopping it")
+            run.cancel()
+            return
+
+
+async def _run_graph(job: Dict[str, Any], config: Dict[str, Any]) -> Dict[str, Any]:
+    application_id = job["application_id"]
+    initial_state = {"application_id": application_id, "llm_cache_bypass": job.get("bypass_cache", False)}
+    start = time.perf_counter()
+    final_state: Dict[str, Any] = {}
+    with UNDERWRITINGS_IN_FLIGHT.track_inprogress(), \
+            span("underwrite", **{"underwriting.application_id": application_id,
+                                  "underwriting.job_id": job["_id"]}) as root:
+        graph_input = await agraph_input(initial_state, config, resume=job["attempts"] > 1)
+        async for mode, chunk in insurance_graph.astream(graph_input, config, stream_mode=["updates", "values"]):
+            if mode == "values":
+                final_state = chunk
+                continue
+            for node, update in chunk.items():
+                if not await asyncio.to_thread(record_node_result, job, node, update):
+                    raise LeaseLost(job["_id"])
+        decision = (final_state.get("policy_decision") or {}).get("final_decision", "none")
+        set_attributes(root, **{"underwriting.decision": decision})
+    UNDERWRITING_DURATION.labels(decision).observe(time.perf_counter() - start)
+    return final_state
+
+
+async def run_job(job: Dict[str, Any]) -> None:
+    print(f"🛠️  Job {job['_id']}: underwriting {job['application_id']} (attempt {job['attempts']})")
+    # One checkpointed run per job: a retried job resumes after the nodes its last attempt finished
+    config = run_config(job["application_id"], job["_id"])
+    run = asyncio.create_task(_run_graph(job, config))
+    heartbeat = asyncio.create_task(_heartbeat(job, run))
+    try:
+        final_state = await run
+        if not await asyncio.to_thread(complete_job, job, final_state):
+            raise LeaseLost(job["_id"])
+    except asyncio.CancelledError:
+        # The heartbeat only finishes by cancelling the run on a lost lease; otherwise we are shutting down
+        if not heartbeat.done() or heartbeat.cancelled():
+            raise
+        print(f"⚠️  Job {job['_id']} was taken over by another worker; dropped this attempt")
+    except LeaseLost:
+        print(f"⚠️  Job {job['_id']} was taken over by another worker; dropped this attempt")
+    except Exception as e:
+        print(f"❌ Job {job['_id']} failed: {e}")
+        if not await asyncio.to_thread(fail_job, job, str(e)):
+            print(f"⚠️  Job {job['_id']} was taken over by another worker; not recording the failure")
+    finally:
+        heartbeat.cancel()
+
+
+async def worker_loop(worker_id: str, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        try:
+            job = await asyncio.to_thread(claim_job, worker_id)
+            if job is not None:
+                await run_job(job)
+                continue
+        except Exception:
+            # e.g. Mongo unavailable while claiming or failing a job: the worker keeps going and
+            # a job it could not finish is reclaimed once its lease expires
+            logging.exception(f"Job worker {worker_id} iteration failed")
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=JOBS_CONFIG['poll_interval'])
+        except asyncio.TimeoutError:
+            pass
+
+
+async def _sweep_abandoned(stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        try:
+            await asyncio.to_thread(fail_abandoned_jobs)
+        except Exception as e:
+            print(f"⚠️  Abandoned job sweep failed: {e}")
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=JOBS_CONFIG['lease_seconds'])
+        except asyncio.TimeoutError:
+            pass
+
+
+class JobWorkerPool:
+    """ `workers` worker loops on the current event loop, each running one job at a time. """
+
+    def __init__(self, workers: int = JOBS_CONFIG['workers']):
+        self.workers = workers
+        self._stop = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._prefix = f"{socket.gethostname()}-{uuid.uuid4().hex[:6]}"
+
+    async def start(self) -> "JobWorkerPool":
+        # Startup does not wait for Mongo; the workers start once the job indexes exist
+        self._tasks = [asyncio.create_task(self._start_workers())]
+        return self
+
+    async def _start_workers(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(ensure_job_indexes)
+                break
+            except Exception as e:
+                print(f"⚠️  Job index creation failed, retrying: {e}")
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=JOBS_CONFIG['poll_interval'])
+                return
+            except asyncio.TimeoutError:
+                pass
+        if self._stop.is_set():
+            return
+        self._tasks += [asyncio.create_task(worker_loop(f"{self._prefix}-{i}", self._stop))
+                        for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(_sweep_abandoned(self._stop)))
+        print(f"🧵 Started {self.workers} job workers")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """ Let running jobs finish for up to `timeout` seconds; unfinished ones are reclaimed later. """
+        self._stop.set()
+        if not self._tasks:
+            return
+        _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        self._tasks = []
+
+
+if __name__ == "__main__":
+    # Standalone workers: python -m app_server.agent.jobs [workers]
+    import sys
+    from .tracing import configure_tracing, shutdown_tracing
+
+    async def main(workers: int) -> None:
+        pool = await JobWorkerPool(workers).start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await pool.stop()
+
+    configure_tracing()
+    try:
+        asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else max(1, JOBS_CONFIG['workers'])))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shutdown_tracing()
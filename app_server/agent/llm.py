@@ -0,0 +1,279 @@
+"""
+Shared Azure OpenAI clients for the underwriting graph.
+
+The sync client serves the CLI / thread-pool path, the async client serves
+`insurance_graph.ainvoke` so LLM calls never block the event loop. Both are
+created lazily and reuse one pooled httpx transport per process.
+"""
+
+import os
+import time
+import asyncio
+import threading
+from typing import Any, Dict, Optional
+
+import httpx
+from openai import AzureOpenAI, AsyncAzureOpenAI
+from openai.types.chat import ChatCompletion
+
+from .config import UNDERWRITING_CONFIG, AZURE_CONFIG, LLM_CACHE_CONFIG
+from .cache import llm_response_cache, llm_cache_key
+from .cassette import ReplayedError, get_cassette, llm_request_key
+from .rate_limit import is_retryable, llm_rate_limiter, retry_delay
+from .deadline import call_timeout, time_left
+from .metrics import record_llm_call, record_llm_cache_hit
+from .tracing import span, set_attributes, set_usage_attributes
+
+AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
+AZURE_OPENAI_KEY = os.getenv("AZURE_OPENAI_KEY")
+AZURE_DEPLOYMENT_NAME = os.getenv("AZURE_DEPLOYMENT_NAME", "gpt-4o")
+
+_lock = threading.Lock()
+_client = None
+_async_client = None
+_async_client_loop = None
+
+
+def _pool_limits() -> httpx.Limits:
+    pool = UNDERWRITING_CONFIG['connection_pool']
+    return httpx.Limits(
+        max_connections=pool['max_connections'],
+        max_keepalive_connections=pool['max_keepalive_connections'],
+        keepalive_expiry=pool['keepalive_expiry']
+    )
+
+
+def get_client() -> AzureOpenAI:
+    """ Return the process-wide sync Azure OpenAI client. """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = AzureOpenAI(
+                    azure_endpoint=AZURE_OPENAI_ENDPOINT,
+                    api_key=AZURE_OPENAI_KEY,
+                    api_version=AZURE_CONFIG['api_version'],
+                    timeout=UNDERWRITING_CONFIG['timeouts']['llm_api'],
+                    max_retries=0,  # retried in _create, through the rate limiter
+                    http_client=httpx.Client(limits=_pool_limits())
+                )
+    return _client
+
+
+def get_async_client() -> AsyncAzureOpenAI:
+    """
+    Return the async Azure OpenAI client for the running event loop.
+
+    httpx connection pools are bound to the loop that created them, so the
+    client is rebuilt if it is requested from a different loop (e.g. a CLI
+    calling `asyncio.run` more than once).
+    """
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client_loop is not loop:
+        _async_client = AsyncAzureOpenAI(
+            azure_endpoint=AZURE_OPENAI_ENDPOINT,
+            api_key=AZURE_OPENAI_KEY,
+            api_version=AZURE_CONFIG['api_version'],
+            timeout=UNDERWRITING_CONFIG['timeouts']['llm_api'],
+            max_retries=0,
+            http_client=httpx.AsyncClient(limits=_pool_limits())
+        )
+        _async_client_loop = loop
+    return _async_client
+
+
+def _cache_lookup(kwargs: Dict[str, Any]):
+    key = llm_cache_key(kwargs, AZURE_DEPLOYMENT_NAME)
+    hit = llm_response_cache.get(key)
+    return key, (ChatCompletion.model_validate(hit) if hit is not None else None)
+
+
+def _cache_store(key: str, resp) -> None:
+    # Truncated ('length') or filtered answers would be served again to every retry
+    choices = getattr(resp, "choices", None)
+    if hasattr(resp, "model_dump") and choices and all(c.finish_reason == "stop" for c in choices):
+        llm_response_cache.set(key, resp.model_dump(mode="json"))
+
+
+def _llm_span(kwargs: Dict[str, Any]):
+    return span(
+        "chat.completions.create",
+        **{
+            "gen_ai.system": "az.ai.openai",
+            "gen_ai.operation.name": "chat",
+            "gen_ai.request.model": kwargs.get("model"),
+            "gen_ai.request.max_tokens": kwargs.get("max_tokens"),
+            "gen_ai.request.temperature": kwargs.get("temperature")
+        }
+    )
+
+
+def _replayed(entry: Dict[str, Any], current):
+    if entry["error"]:
+        record_llm_call(entry["latency"], error=True)
+        raise ReplayedError(entry["error"])
+    resp = ChatCompletion.model_validate(entry["response"])
+    record_llm_call(entry["latency"], resp)
+    set_usage_attributes(current, resp)
+    return resp
+
+
+def _record(kwargs: Dict[str, Any], current, cassette, elapsed: float, resp=None, error: Exception = None):
+    if cassette is not None and cassette.recording:
+        cassette.record("llm", llm_request_key(kwargs), kwargs,
+                        resp.model_dump(mode="json") if resp is not None else None, elapsed,
+                        error=repr(error) if error is not None else None)
+    if resp is not None:
+        set_usage_attributes(current, resp)
+
+
+def _retry_delay(error: Exception, attempt: int, current) -> Optional[float]:
+    """ Seconds to wait before retrying, or None when the call should not be retried. """
+    if not is_retryable(error) or attempt + 1 >= UNDERWRITING_CONFIG['retry']['max_attempts']:
+        return None
+    delay = retry_delay(error, attempt)
+    left = time_left()
+    if left is not None and left <= delay:
+        # The retry could not finish within the node's budget
+        return None
+    set_attributes(current, **{"llm.retries": attempt + 1})
+    print(f"🔁 LLM call failed ({type(error).__name__}), retry {attempt + 1}")
+    return delay
+
+
+def _llm_timeout() -> float:
+    return call_timeout(UNDERWRITING_CONFIG['timeouts']['llm_api'])
+
+
+def _create_with_retries(kwargs: Dict[str, Any], current):
+    """ One API call per attempt, each admitted by the shared rate limiter. """
+    for attempt in range(UNDERWRITING_CONFIG['retry']['max_attempts']):
+        permit = llm_rate_limiter.acquire(kwargs)
+        start = time.perf_counter()
+        try:
+            resp = get_client().chat.completions.create(**kwargs, timeout=_llm_timeout())
+        except Exception as e:
+            record_llm_call(time.perf_counter() - start, error=True)
+            llm_rate_limiter.release(permit, e)
+            delay = _retry_delay(e, attempt, current)
+            if delay is None:
+                raise
+            time.sleep(delay)
+            continue
+        record_llm_call(time.perf_counter() - start, resp)
+        llm_rate_limiter.release(permit)
+        return resp
+
+
+async def _acreate_with_retries(kwargs: Dict[str, Any], current):
+    for attempt in range(UNDERWRITING_CONFIG['retry']['max_attempts']):
+        permit = await llm_rate_limiter.aacquire(kwargs)
+        start = time.perf_counter()
+        try:
+            resp = await get_async_client().chat.completions.create(**kwargs, timeout=_llm_timeout())
+        except asyncio.CancelledError:
+            llm_rate_limiter.cancel(permit)
+            raise
+        except Exception as e:
+            record_llm_call(time.perf_counter() - start, error=True)
+            llm_rate_limiter.release(permit, e)
+            delay = _retry_delay(e, attempt, current)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            continue
+        record_llm_call(time.perf_counter() - start, resp)
+        llm_rate_limiter.release(permit)
+        return resp
+
+
+def _create(kwargs: Dict[str, Any], current):
+    cassette = get_cassette()
+    if cassette is not None and cassette.replaying:
+        entry = cassette.replay("llm", llm_request_key(kwargs))
+        if entry is not None:
+            return _replayed(entry, current)
+
+    start = time.perf_counter()
+    try:
+        resp = _create_with_retries(kwargs, current)
+    except Exception as e:
+        _record(kwargs, current, cassette, time.perf_counter() - start, error=e)
+        raise
+    _record(kwargs, current, cassette, time.perf_counter() - start, resp)
+    return resp
+
+
+async def _acreate(kwargs: Dict[str, Any], current):
+    cassette = get_cassette()
+    if cassette is not None and cassette.replaying:
+        entry = await cassette.areplay("llm", llm_request_key(kwargs))
+        if entry is not None:
+            return _replayed(entry, current)
+
+    start = time.perf_counter()
+    try:
+        resp = await _acreate_with_retries(kwargs, current)
+    except Exception as e:
+        _record(kwargs, current, cassette, time.perf_counter() - start, error=e)
+        raise
+    _record(kwargs, current, cassette, time.perf_counter() - start, resp)
+    return resp
+
+
+def chat_completion(cache: bool = True, **kwargs: Any):
+    """
+    Blocking `chat.completions.create` on the shared client.
+
+    Responses are served from the LLM response cache unless `cache` is False
+    or caching is disabled in LLM_CACHE_CONFIG.
+    """
+    kwargs.setdefault("model", AZURE_DEPLOYMENT_NAME)
+    with _llm_span(kwargs) as current:
+        if not (cache and LLM_CACHE_CONFIG['enabled']):
+            set_attributes(current, **{"llm.response_cache": "bypass"})
+            return _create(kwargs, current)
+
+        key, hit = _cache_lookup(kwargs)
+        set_attributes(current, **{"llm.response_cache": "hit" if hit is not None else "miss"})
+        if hit is not None:
+            record_llm_cache_hit()
+            return hit
+        resp = _create(kwargs, current)
+        _cache_store(key, resp)
+        return resp
+
+
+async def achat_completion(cache: bool = True, **kwargs: Any):
+    """ Non-blocking `chat.completions.create` on the shared async client. """
+    kwargs.setdefault("model", AZURE_DEPLOYMENT_NAME)
+    with _llm_span(kwargs) as current:
+        if not (cache and LLM_CACHE_CONFIG['enabled']):
+            set_attributes(current, **{"llm.response_cache": "bypass"})
+            return await _acreate(kwargs, current)
+
+        # The persistent tier does blocking I/O; only leave the loop when one is configured
+        if llm_response_cache.store is None:
+            key, hit = _cache_lookup(kwargs)
+        else:
+            key, hit = await asyncio.to_thread(_cache_lookup, kwargs)
+        set_attributes(current, **{"llm.response_cache": "hit" if hit is not None else "miss"})
+        if hit is not None:
+            record_llm_cache_hit()
+            return hit
+        resp = await _acreate(kwargs, current)
+        if llm_response_cache.store is None:
+            _cache_store(key, resp)
+        else:
+            await asyncio.to_thread(_cache_store, key, resp)
+        return resp
+
+
+async def aclose_clients() -> None:
+    """ Close the pooled async client (called on application shutdown). """
+    global _async_client, _async_client_loop
+    if _async_client is not None:
+        await _async_client.close()
+    _async_client = None
+    _async_client_loop = None
@@ -0,0 +1,219 @@
+"""
+Insurance API (MCP) tool calls used by the underwriting graph.
+
+All calls go through one keep-alive, connection-pooled httpx client per process
+(sync for the CLI / thread-pool path, async for `ainvoke`), so the TLS handshake
+is paid once per connection instead of once per call.
+"""
+
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import httpx
+
+from .config import UNDERWRITING_CONFIG
+from .cassette import ReplayedError, get_cassette, mcp_request_key
+from .deadline import call_timeout
+from .metrics import bind_node, record_mcp_call
+from .tracing import span, set_attributes
+
+TOOL_MAP = {
+    "insurance_history": "insurance_history_tool",
+    "financial_eligibility": "financial_eligibility",
+}
+
+_lock = threading.Lock()
+_http_client = None
+_async_http_client = None
+_async_http_client_loop = None
+
+
+def _tool_url(tool_name: str, pan_number: str) -> str:
+    api_base = os.getenv("INSURANCE_API_BASE", "http://localhost:8000")
+    endpoint_map = {
+        "insurance_history": f"{api_base}/insurance-history/{pan_number}",
+        "financial_eligibility": f"{api_base}/financial-eligibility/{pan_number}",
+    }
+    return endpoint_map.get(tool_name)
+
+
+def endpoint_timeout(tool_name: str) -> float:
+    """
+    Timeout for one MCP endpoint from UNDERWRITING_CONFIG['timeouts']['mcp_api'],
+    which is either a number for all endpoints or a per-tool mapping with a 'default',
+    capped to the remaining node budget.
+    """
+    timeouts = UNDERWRITING_CONFIG['timeouts']['mcp_api']
+    if isinstance(timeouts, dict):
+        timeout = timeouts.get(tool_name, timeouts.get('default', 10))
+    else:
+        timeout = timeouts
+    # Never past the calling node's share of the request deadline
+    return call_timeout(timeout)
+
+
+def _http2_enabled() -> bool:
+    if not UNDERWRITING_CONFIG['connection_pool'].get('http2'):
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        print("⚠️  HTTP/2 requested for MCP client but the 'h2' package is not installed - using HTTP/1.1")
+        return False
+
+
+def _client_kwargs() -> Dict:
+    pool = UNDERWRITING_CONFIG['connection_pool']
+    return dict(
+        http2=_http2_enabled(),
+        limits=httpx.Limits(
+            max_connections=pool['max_connections'],
+            max_keepalive_connections=pool['max_keepalive_connections'],
+            keepalive_expiry=pool['keepalive_expiry']
+        )
+    )
+
+
+def get_http_client() -> httpx.Client:
+    """ Return the process-wide pooled sync HTTP client. """
+    global _http_client
+    if _http_client is None:
+        with _lock:
+            if _http_client is None:
+                _http_client = httpx.Client(**_client_kwargs())
+    return _http_client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """ Return the pooled async HTTP client for the running event loop. """
+    global _async_http_client, _async_http_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_http_client is None or _async_http_client_loop is not loop:
+        _async_http_client = httpx.AsyncClient(**_client_kwargs())
+        _async_http_client_loop = loop
+    return _async_http_client
+
+
+def _set_response_attributes(current, resp: httpx.Response) -> None:
+    set_attributes(current, **{
+        "http.response.status_code": resp.status_code,
+        "http.response.body.size": len(resp.content),
+        "network.protocol.version": resp.http_version
+    })
+
+
+def _replayed(tool_name: str, entry: Dict) -> dict:
+    record_mcp_call(tool_name, entry["latency"], error=bool(entry["error"]))
+    if entry["error"]:
+        raise ReplayedError(entry["error"])
+    return entry["response"]
+
+
+def _record(cassette, tool_name: str, pan_number: str, url: str, elapsed: float,
+            result: dict = None, error: Exception = None) -> None:
+    record_mcp_call(tool_name, elapsed, error=error is not None)
+    if cassette is not None and cassette.recording:
+        cassette.record("mcp", mcp_request_key(tool_name, pan_number),
+                        {"tool": tool_name, "pan": pan_number, "url": url}, result, elapsed,
+                        error=str(error) if error is not None else None)
+
+
+def call_mcp_tool(tool_name: str, pan_number: str, mcp_base_url: str = "http://localhost:9000") -> dict:
+    try:
+        mcp_tool_name = TOOL_MAP.get(tool_name)
+        if not mcp_tool_name:
+            return {"error": f"Unknown tool: {tool_name}"}
+
+        url = _tool_url(tool_name, pan_number)
+        if not url:
+            return {"error": f"No endpoint found for tool: {tool_name}"}
+
+        with span(f"mcp.{tool_name}", **{"mcp.tool": tool_name, "http.request.method": "GET"}) as current:
+            cassette = get_cassette()
+            if cassette is not None and cassette.replaying:
+                entry = cassette.replay("mcp", mcp_request_key(tool_name, pan_number))
+                if entry is not None:
+                    return _replayed(tool_name, entry)
+
+            start = time.perf_counter()
+            try:
+                resp = get_http_client().get(url, timeout=endpoint_timeout(tool_name))
+                resp.raise_for_status()
+                result = resp.json()
+            except Exception as e:
+                _record(cassette, tool_name, pan_number, url, time.perf_counter() - start, error=e)
+                raise
+            _record(cassette, tool_name, pan_number, url, time.perf_counter() - start, result)
+            _set_response_attributes(current, resp)
+            return result
+
+    except Exception as e:
+        return {"error": str(e), "status": "failed"}
+
+
+async def acall_mcp_tool(tool_name: str, pan_number: str) -> dict:
+    """ Async variant of `call_mcp_tool` on the shared pooled client. """
+    try:
+        if not TOOL_MAP.get(tool_name):
+            return {"error": f"Unknown tool: {tool_name}"}
+
+        url = _tool_url(tool_name, pan_number)
+        if not url:
+            return {"error": f"No endpoint found for tool: {tool_name}"}
+
+        with span(f"mcp.{tool_name}", **{"mcp.tool": tool_name, "http.request.method": "GET"}) as current:
+            cassette = get_cassette()
+            if cassette is not None and cassette.replaying:
+                entry = await cassette.areplay("mcp", mcp_request_key(tool_name, pan_number))
+                if entry is not None:
+                    return _replayed(tool_name, entry)
+
+            start = time.perf_counter()
+            try:
+                resp = await get_async_http_client().get(url, timeout=endpoint_timeout(tool_name))
+                resp.raise_for_status()
+                result = resp.json()
+            except Exception as e:
+                _record(cassette, tool_name, pan_number, url, time.perf_counter() - start, error=e)
+                raise
+            _record(cassette, tool_name, pan_number, url, time.perf_counter() - start, result)
+            _set_response_attributes(current, resp)
+            return result
+
+    except Exception as e:
+        return {"error": str(e), "status": "failed"}
+
+
+def fetch_mcp_tools(tool_names: List[str], pan_number: str) -> Dict[str, dict]:
+    """ Fetch several MCP endpoints concurrently over the shared sync client. """
+    with ThreadPoolExecutor(max_workers=max(1, len(tool_names)), thread_name_prefix="mcp") as pool:
+        results = pool.map(bind_node(lambda name: call_mcp_tool(name, pan_number)), tool_names)
+        return dict(zip(tool_names, results))
+
+
+async def afetch_mcp_tools(tool_names: List[str], pan_number: str) -> Dict[str, dict]:
+    """ Fetch several MCP endpoints concurrently over the shared async client. """
+    results = await asyncio.gather(*[acall_mcp_tool(name, pan_number) for name in tool_names])
+    return dict(zip(tool_names, results))
+
+
+def close_http_client() -> None:
+    global _http_client
+    if _http_client is not None:
+        _http_client.close()
+    _http_client = None
+
+
+async def aclose_http_client() -> None:
+    """ Close the pooled HTTP clients (called on application shutdown). """
+    global _async_http_client, _async_http_client_loop
+    if _async_http_client is not None:
+        await _async_http_client.aclose()
+    _async_http_client = None
+    _async_http_client_loop = None
+    close_http_client()
@@ -2,23 +2,18 @@
 Medical exam workflow handler for insurance underwriting
 """
 
-from typing import Dict, Any
+import asyncio
+from typing import Dict, Any, Optional, Tuple
 from datetime import datetime
 
+from pymongo import ReturnDocument
 
-def check_medical_exam_status(state: Dict[str, Any], db) -> Dict[str, Any]:
-    """
-    Check if medical exam is required and handle the workflow.
-    
-    Workflow:
-    1. If medical exam not required -> Continue
-    2. If medical exam required:
-       a. Check if medical report already exists in DB
-       b. If exists -> Extract and continue
-       c. If not exists -> Queue for pending medicals
-    
-    Returns updated state with medical_exam_workflow section.
-    """
+from .config import MONGO_CONFIG
+from .mongo import acollection, collection
+
+
+def _start_workflow(state: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[str]]:
+    """ (medical_exam_workflow, PAN to look up); no PAN when there is nothing to look up. """
     health = state.get('health_underwriting', {})
     medical_required = health.get('medical_exam_required', False)
     
@@ -30,80 +25,151 @@ def check_medical_exam_status(state: Dict[str, Any], db) -> Dict[str, Any]:
     
     if not medical_required:
         medical_workflow['status'] = 'not_required'
-        state['medical_exam_workflow'] = medical_workflow
         print("ℹ️  Medical exam not required - proceeding with underwriting")
-        return state
+        return medical_workflow, None
     
     # Medical exam is required - check if report exists
-    app = state.get('application', {})
-    personal = app.get('personal_details', {})
-    pan_number = personal.get('panNumber')
+    pan_number = state.get('application', {}).get('personal_details', {}).get('panNumber')
     
     if not pan_number:
         medical_workflow['status'] = 'error'
         medical_workflow['error'] = 'PAN number not found'
-        state['medical_exam_workflow'] = medical_workflow
-        return state
+    return medical_workflow, pan_number
+
+
+def _report_found(state: Dict[str, Any], medical_workflow: Dict[str, Any], existing_report: Dict[str, Any]) -> None:
+    # Medical report found - extract and proceed
+    medical_workflow['status'] = 'completed'
+    medical_workflow['report_found'] = True
+    medical_workflow['report_date'] = existing_report.get('report_date')
+    medical_workflow['medical_data'] = {
+        'blood_pressure': existing_report.get('blood_pressure'),
+        'cholesterol': existing_report.get('cholesterol'),
+        'blood_sugar': existing_report.get('blood_sugar'),
+        'ecg_result': existing_report.get('ecg_result'),
+        'urine_test': existing_report.get('urine_test'),
+        'overall_health_status': existing_report.get('overall_health_status')
+    }
+    medical_workflow['exam_type'] = state.get('health_underwriting', {}).get('exam_type', 'Unknown')
     
-    # Check MongoDB for existing medical report
-    try:
-        medical_collection = db.medical_reports
-        existing_report = medical_collection.find_one({'pan_number': pan_number})
-        
-        if existing_report:
-            # Medical report found - extract and proceed
-            medical_workflow['status'] = 'completed'
-            medical_workflow['report_found'] = True
-            medical_workflow['report_date'] = existing_report.get('report_date')
-            medical_workflow['medical_data'] = {
-                'blood_pressure': existing_report.get('blood_pressure'),
-                'cholesterol': existing_report.get('cholesterol'),
-                'blood_sugar': existing_report.get('blood_sugar'),
-                'ecg_result': existing_report.get('ecg_result'),
-                'urine_test': existing_report.get('urine_test'),
-                'overall_health_status': existing_report.get('overall_health_status')
-            }
-            medical_workflow['exam_type'] = health.get('exam_type', 'Unknown')
-            
-            print(f"✅ Medical report found (Date: {existing_report.get('report_date')})")
-            print(f"   Health Status: {existing_report.get('overall_health_status', 'N/A')}")
-            
-        else:
-            # Medical report not found - queue for pending medicals
-            medical_workflow['status'] = 'pending'
-            medical_workflow['report_found'] = False
-            medical_workflow['exam_type'] = health.get('exam_type', 'ML3')
-            medical_workflow['exam_reasons'] = health.get('exam_reasons', [])
-            
-            # Add to pending medicals queue
-            pending_queue = db.pending_medical_exams
-            queue_entry = {
-                'application_id': str(app.get('_id', 'unknown')),
-                'pan_number': pan_number,
-                'applicant_name': personal.get('fullName', 'Unknown'),
-                'exam_type': medical_workflow['exam_type'],
-                'exam_reasons': medical_workflow['exam_reasons'],
-                'priority': compute_medical_priority(state),
-                'queued_at': datetime.now(),
-                'status': 'pending_medical',
-                'expected_completion': None  # To be updated when exam is scheduled
-            }
-            
-            try:
-                pending_queue.insert_one(queue_entry)
-                medical_workflow['queue_id'] = str(queue_entry.get('_id'))
-                print(f"⚠️  Medical exam required: {medical_workflow['exam_type']}")
-                print(f"   Reasons: {', '.join(medical_workflow['exam_reasons'][:3])}")
-                print(f"   Added to pending medical queue (Priority: {queue_entry['priority']})")
-            except Exception as e:
-                medical_workflow['queue_error'] = str(e)
-                print(f"⚠️  Could not add to pending queue: {e}")
+    print(f"✅ Medical report found (Date: {existing_report.get('report_date')})")
+    print(f"   Health Status: {existing_report.get('overall_health_status', 'N/A')}")
+
+
+def _queue_entry(state: Dict[str, Any], medical_workflow: Dict[str, Any], pan_number: str) -> Dict[str, Any]:
+    # Medical report not found - queue for pending medicals
+    health = state.get('health_underwriting', {})
+    app = state.get('application', {})
+    medical_workflow['status'] = 'pending'
+    medical_workflow['report_found'] = False
+    medical_workflow['exam_type'] = health.get('exam_type', 'ML3')
+    medical_workflow['exam_reasons'] = health.get('exam_reasons', [])
+    return {
+        'application_id': str(app.get('_id', 'unknown')),
+        'pan_number': pan_number,
+        'applicant_name': app.get('personal_details', {}).get('fullName', 'Unknown'),
+        'exam_type': medical_workflow['exam_type'],
+        'exam_reasons': medical_workflow['exam_reasons'],
+        'priority': compute_medical_priority(state),
+        'queued_at': datetime.now(),
+        'status': 'pending_medical',
+        'expected_completion': None  # To be updated when exam is scheduled
+    }
+
+
+def _queue_upsert(queue_entry: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    # One queue entry per applicant and application, however often the check re-runs
+    key = {'pan_number': queue_entry['pan_number'], 'application_id': queue_entry['application_id']}
+    on_insert = ('status', 'queued_at', 'expected_completion')
+    return key, {
+        '$set': {k: v for k, v in queue_entry.items() if k not in key and k not in on_insert},
+        '$setOnInsert': {k: queue_entry[k] for k in on_insert}
+    }
+
+
+def _already_queued(previous: Optional[Dict[str, Any]]) -> bool:
+    return bool(previous) and previous.get('status') == 'pending' and bool(previous.get('queue_id'))
+
+
+def _queued(medical_workflow: Dict[str, Any], queue_entry: Dict[str, Any], queue_id: Any) -> None:
+    medical_workflow['queue_id'] = str(queue_id)
+    print(f"⚠️  Medical exam required: {medical_workflow['exam_type']}")
+    print(f"   Reasons: {', '.join(medical_workflow['exam_reasons'][:3])}")
+    print(f"   Added to pending medical queue (Priority: {queue_entry['priority']})")
+
+
+def _lookup_failed(medical_workflow: Dict[str, Any], error: Exception) -> None:
+    medical_workflow['status'] = 'error'
+    medical_workflow['error'] = str(error)
+    print(f"❌ Error checking medical reports: {error}")
+
+
+def check_medical_exam_status(state: Dict[str, Any], previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Check if medical exam is required and handle the workflow.
     
-    except Exception as e:
-        medical_workflow['status'] = 'error'
-        medical_workflow['error'] = str(e)
-        print(f"❌ Error checking medical reports: {e}")
+    Workflow:
+    1. If medical exam not required -> Continue
+    2. If medical exam required:
+       a. Check if medical report already exists in DB
+       b. If exists -> Extract and continue
+       c. If not exists -> Queue for pending medicals (unless `previous`, the
+          workflow of a reused health result, already queued it)
     
+    Returns updated state with medical_exam_workflow section.
+    """
+    medical_workflow, pan_number = _start_workflow(state)
+    if pan_number:
+        # Check MongoDB for existing medical report
+        try:
+            existing_report = collection('medical_reports').find_one({'pan_number': pan_number})
+            if existing_report:
+                _report_found(state, medical_workflow, existing_report)
+            elif _already_queued(previous):
+                medical_workflow = dict(previous)
+            else:
+                queue_entry = _queue_entry(state, medical_workflow, pan_number)
+                try:
+                    queued = collection('pending_medical_exams').find_one_and_update(
+                        *_queue_upsert(queue_entry), upsert=True, projection={'_id': 1},
+                        return_document=ReturnDocument.AFTER)
+                    _queued(medical_workflow, queue_entry, queued['_id'])
+                except Exception as e:
+                    medical_workflow['queue_error'] = str(e)
+                    print(f"⚠️  Could not add to pending queue: {e}")
+        except Exception as e:
+            _lookup_failed(medical_workflow, e)
+    
+    state['medical_exam_workflow'] = medical_workflow
+    return state
+
+
+async def acheck_medical_exam_status(state: Dict[str, Any],
+                                     previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """ `check_medical_exam_status` on the async Mongo client. """
+    if not MONGO_CONFIG['async_driver']:
+        return await asyncio.to_thread(check_medical_exam_status, state, previous)
+    medical_workflow, pan_number = _start_workflow(state)
+    if pan_number:
+        try:
+            existing_report = await acollection('medical_reports').find_one({'pan_number': pan_number})
+            if existing_report:
+                _report_found(state, medical_workflow, existing_report)
+            elif _already_queued(previous):
+                medical_workflow = dict(previous)
+            else:
+                queue_entry = _queue_entry(state, medical_workflow, pan_number)
+                try:
+                    queued = await acollection('pending_medical_exams').find_one_and_update(
+                        *_queue_upsert(queue_entry), upsert=True, projection={'_id': 1},
+                        return_document=ReturnDocument.AFTER)
+                    _queued(medical_workflow, queue_entry, queued['_id'])
+                except Exception as e:
+                    medical_workflow['queue_error'] = str(e)
+                    print(f"⚠️  Could not add to pending queue: {e}")
+        except Exception as e:
+            _lookup_failed(medical_workflow, e)
+
     state['medical_exam_workflow'] = medical_workflow
     return state
 
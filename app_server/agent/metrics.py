@@ -0,0 +1,193 @@
+"""
+Prometheus metrics for the underwriting service, exposed at `/metrics`.
+
+Covers per-node wall time and errors, per-LLM-call latency and token usage,
+MCP and Mongo call latency and in-flight underwritings. Cache and fast-path
+counters are collected from their existing stats at scrape time.
+
+Under several worker processes, set PROMETHEUS_MULTIPROC_DIR so every worker
+writes to a shared directory and `/metrics` aggregates them.
+"""
+
+import os
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from pymongo import monitoring
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,
+                               Histogram, generate_latest)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+_TOKEN_BUCKETS = (10, 50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+NODE_DURATION = Histogram(
+    "underwriting_node_duration_seconds", "Wall time of one graph node run", ["node"], buckets=_LATENCY_BUCKETS
+)
+NODE_ERRORS = Counter(
+    "underwriting_node_errors_total", "Node runs that raised or returned an error result", ["node"]
+)
+NODE_TIMEOUTS = Counter(
+    "underwriting_node_timeouts_total", "Node runs cut off by their share of the request deadline", ["node"]
+)
+LLM_DURATION = Histogram(
+    "underwriting_llm_request_duration_seconds", "Latency of one chat completion API call", ["node", "outcome"],
+    buckets=_LATENCY_BUCKETS
+)
+LLM_CACHE_HITS = Counter(
+    "underwriting_llm_cache_hits_total", "Chat completions served from the LLM response cache", ["node"]
+)
+LLM_TOKENS = Histogram(
+    "underwriting_llm_tokens", "Tokens per chat completion from resp.usage (kind: prompt, completion, cached)",
+    ["node", "kind"], buckets=_TOKEN_BUCKETS
+)
+LLM_RATE_LIMIT_WAIT = Histogram(
+    "underwriting_llm_rate_limit_wait_seconds", "Time a chat completion waited for the RPM/TPM/concurrency limiter",
+    buckets=_LATENCY_BUCKETS
+)
+LLM_THROTTLED = Counter(
+    "underwriting_llm_throttled_total", "Chat completions rejected by Azure OpenAI with 429"
+)
+LLM_CONCURRENCY_LIMIT = Gauge(
+    "underwriting_llm_concurrency_limit", "Current adaptive (AIMD) limit on in-flight chat completions",
+    multiprocess_mode="max"
+)
+MCP_DURATION = Histogram(
+    "underwriting_mcp_request_duration_seconds", "Latency of one MCP endpoint call", ["tool", "outcome"],
+    buckets=_LATENCY_BUCKETS
+)
+MONGO_DURATION = Histogram(
+    "underwriting_mongo_command_duration_seconds", "Latency of one MongoDB command", ["command", "outcome"],
+    buckets=_LATENCY_BUCKETS
+)
+UNDERWRITING_RESULTS = Counter(
+    "underwriting_results_total", "/underwrite answers by source: stored result, shared run or own run", ["source"]
+)
+UNDERWRITINGS_IN_FLIGHT = Gauge(
+    "underwriting_in_flight", "Underwriting workflows currently running", multiprocess_mode="livesum"
+)
+UNDERWRITING_DURATION = Histogram(
+    "underwriting_duration_seconds", "End-to-end wall time of one underwriting workflow", ["decision"],
+    buckets=_LATENCY_BUCKETS
+)
+
+# Graph node the current LLM/MCP call is made for (set by insurance_graph.timed_node)
+current_node: contextvars.ContextVar = contextvars.ContextVar("underwriting_node", default="none")
+
+
+@contextmanager
+def node_context(name: str) -> Iterator[None]:
+    token = current_node.set(name)
+    try:
+        yield
+    finally:
+        current_node.reset(token)
+
+
+def bind_node(fn):
+    """
+    Carry the caller's context (node label, active trace span) into worker threads;
+    ThreadPoolExecutor does not copy contextvars.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return run
+
+
+def record_node(name: str, elapsed: float, error: bool = False) -> None:
+    NODE_DURATION.labels(name).observe(elapsed)
+    if error:
+        NODE_ERRORS.labels(name).inc()
+
+
+def record_node_timeout(name: str) -> None:
+    NODE_TIMEOUTS.labels(name).inc()
+
+
+def has_error(update: Dict[str, Any]) -> bool:
+    """ True when any component result in a node update reports an error. """
+    return any(isinstance(v, dict) and ("error" in v or v.get("status") == "error") for v in update.values())
+
+
+def _usage_tokens(resp: Any) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+    usage = getattr(resp, "usage", None)
+    if usage is None:
+        return None, None, None
+    details = getattr(usage, "prompt_tokens_details", None)
+    return usage.prompt_tokens, usage.completion_tokens, getattr(details, "cached_tokens", None)
+
+
+def record_llm_call(elapsed: float, resp: Any = None, error: bool = False) -> None:
+    node = current_node.get()
+    LLM_DURATION.labels(node, "error" if error else "ok").observe(elapsed)
+    if error:
+        return
+    prompt, completion, cached = _usage_tokens(resp)
+    for kind, count in (("prompt", prompt), ("completion", completion), ("cached", cached)):
+        if count is not None:
+            LLM_TOKENS.labels(node, kind).observe(count)
+
+
+def record_llm_cache_hit() -> None:
+    LLM_CACHE_HITS.labels(current_node.get()).inc()
+
+
+def record_mcp_call(tool: str, elapsed: float, error: bool = False) -> None:
+    MCP_DURATION.labels(tool, "error" if error else "ok").observe(elapsed)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """ pymongo command listener recording the latency of every command on the client. """
+
+    def started(self, event) -> None:
+        pass
+
+    def succeeded(self, event) -> None:
+        MONGO_DURATION.labels(event.command_name, "ok").observe(event.duration_micros / 1e6)
+
+    def failed(self, event) -> None:
+        MONGO_DURATION.labels(event.command_name, "error").observe(event.duration_micros / 1e6)
+
+
+class StatsCollector:
+    """
+    Exposes the in-process cache and fast-path counters (see cache.TieredCache.stats
+    and rules.fast_path_stats) at scrape time.
+    """
+
+    def collect(self):
+        from .cache import llm_response_cache, ocr_cache
+        from .rules import fast_path_stats
+
+        lookups = CounterMetricFamily("underwriting_cache_lookups", "Cache lookups by tier outcome",
+                                      labels=["cache", "outcome"])
+        entries = GaugeMetricFamily("underwriting_cache_memory_entries", "Entries in the memory tier", labels=["cache"])
+        for cache in (llm_response_cache, ocr_cache):
+            stats = cache.stats()
+            for outcome in ("memory_hits", "store_hits", "misses", "errors"):
+                lookups.add_metric([cache.name, outcome], stats[outcome])
+            entries.add_metric([cache.name], stats["memory_entries"])
+
+        paths = CounterMetricFamily("underwriting_fast_path_decisions", "Component results by decision path",
+                                    labels=["node", "path"])
+        for node, counts in fast_path_stats().items():
+            for path in ("rules", "llm"):
+                paths.add_metric([node, path], counts.get(path, 0))
+        return [lookups, entries, paths]
+
+
+if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    REGISTRY.register(StatsCollector())
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """ Return (payload, content type) for the `/metrics` endpoint. """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
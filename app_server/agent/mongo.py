@@ -0,0 +1,130 @@
+"""
+Mongo clients for the agent.
+
+- Both clients are created on first use, so importing the agent does not connect,
+  resolve a `mongodb+srv` URI or create indexes; a slow or unreachable Mongo shows up
+  as failed requests (after MONGO_CONFIG['server_selection_timeout_ms']), not as a
+  startup that hangs or crashes.
+- Threads (sync nodes, caches, checkpointer, jobs) use the sync `MongoClient`; async
+  nodes and the API use PyMongo's `AsyncMongoClient` (one per event loop), so Mongo
+  latency no longer blocks the event loop.
+- Pools are sized by MONGO_CONFIG. The read-heavy collections in
+  MONGO_CONFIG['read_collections'] use MONGO_CONFIG['read_preference'], so they can
+  be served by secondaries.
+"""
+
+import asyncio
+import threading
+from typing import Any, Dict, Optional
+
+from pymongo import AsyncMongoClient, MongoClient
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+
+from .config import MONGO_CONFIG
+from .metrics import MongoCommandMetrics
+from .tracing import MongoCommandTracing
+
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primary_preferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondary_preferred": SecondaryPreferred,
+    "nearest": Nearest
+}
+
+_client: Optional[MongoClient] = None
+_async_client: Optional[AsyncMongoClient] = None
+_async_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_lock = threading.Lock()
+
+
+def _client_kwargs() -> Dict[str, Any]:
+    return dict(
+        maxPoolSize=MONGO_CONFIG['max_pool_size'],
+        minPoolSize=MONGO_CONFIG['min_pool_size'],
+        maxIdleTimeMS=MONGO_CONFIG['max_idle_time_ms'],
+        waitQueueTimeoutMS=MONGO_CONFIG['wait_queue_timeout_ms'],
+        serverSelectionTimeoutMS=MONGO_CONFIG['server_selection_timeout_ms'],
+        connectTimeoutMS=MONGO_CONFIG['connect_timeout_ms'],
+        event_listeners=[MongoCommandMetrics(), MongoCommandTracing()]
+    )
+
+
+def read_preference():
+    mode = READ_PREFERENCES[MONGO_CONFIG['read_preference']]
+    if mode is Primary:
+        return Primary()
+    return mode(max_staleness=MONGO_CONFIG['max_staleness_seconds'])
+
+
+def get_client() -> MongoClient:
+    """ Return the process-wide sync client. """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = MongoClient(MONGO_CONFIG['uri'], **_client_kwargs())
+    return _client
+
+
+def get_async_client() -> AsyncMongoClient:
+    """ Return the async client for the running event loop. """
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client_loop is not loop:
+        _async_client = AsyncMongoClient(MONGO_CONFIG['uri'], **_client_kwargs())
+        _async_client_loop = loop
+    return _async_client
+
+
+def _with_read_preference(collection):
+    if collection.name in MONGO_CONFIG['read_collections'] and MONGO_CONFIG['read_preference'] != "primary":
+        return collection.with_options(read_preference=read_preference())
+    return collection
+
+
+def collection(name: str):
+    return _with_read_preference(get_client()[MONGO_CONFIG['database']][name])
+
+
+def acollection(name: str):
+    """ `name` on the async client; only for callers that checked MONGO_CONFIG['async_driver']. """
+    return _with_read_preference(get_async_client()[MONGO_CONFIG['database']][name])
+
+
+class LazyCollection:
+    """ Stands for a sync collection; the client is created when it is first used. """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(collection(self.name), attr)
+
+
+class LazyDatabase:
+    def __getitem__(self, name: str) -> LazyCollection:
+        return LazyCollection(name)
+
+    def __getattr__(self, name: str) -> LazyCollection:
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return LazyCollection(name)
+
+
+# The service database, for callers written against `db[...]`
+db = LazyDatabase()
+
+
+def close_mongo_client() -> None:
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
+async def aclose_mongo_client() -> None:
+    global _async_client, _async_client_loop
+    if _async_client is not None and _async_client_loop is asyncio.get_running_loop():
+        await _async_client.close()
+    _async_client, _async_client_loop = None, None
@@ -0,0 +1,232 @@
+"""
+Local normalization pass for incoming applications.
+
+Applies the ingest rules (phones to +91XXXXXXXXXX, dates to ISO YYYY-MM-DD,
+addresses/states to Title Case, lower-cased validated emails, numeric fields to
+numbers) directly on the application dict. Values that cannot be resolved
+locally are returned as a short list so `ingest_node` can ask the LLM for a
+small patch instead of round-tripping the whole document.
+"""
+
+import re
+import copy
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import NORMALIZATION_CONFIG
+
+_EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[a-z]{2,}$")
+_ISO_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_ISO_DATETIME_RE = re.compile(r"^\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}")
+_AMOUNT_UNITS = {
+    "k": 1e3, "thousand": 1e3,
+    "l": 1e5, "lac": 1e5, "lacs": 1e5, "lakh": 1e5, "lakhs": 1e5,
+    "cr": 1e7, "crore": 1e7, "crores": 1e7,
+    "mn": 1e6, "million": 1e6
+}
+_MEASURE_UNITS = ("kg", "kgs", "cm", "cms", "years", "yrs", "year", "yr")
+
+# Field names (case/underscore-insensitive) that hold numbers
+NUMERIC_FIELDS = {
+    "annualincome", "income", "coverageamount", "sumassured", "term", "premium", "premiumamount",
+    "weight", "weightkg", "height", "heightcm", "age", "existingcover", "totalliabilities"
+}
+TITLE_CASE_FIELDS = {"state", "city", "district", "country", "address", "addressline1", "addressline2", "nationality"}
+# Subtrees that are left untouched (document URLs, ids)
+SKIP_FIELDS = {"documents", "_id", "id"}
+
+# Trailing words that qualify a field name without changing its kind (phoneNumber, emailId)
+_QUALIFIER_WORDS = {"number", "no", "num", "id", "address"}
+
+KIND_DESCRIPTIONS = {
+    "phone": "Indian mobile number formatted as +91XXXXXXXXXX",
+    "date": "calendar date formatted as YYYY-MM-DD",
+    "email": "valid lower-case email address",
+    "number": "plain number (no units, separators or words)"
+}
+
+
+def _key(name: Any) -> str:
+    return str(name).replace("_", "").replace("-", "").lower()
+
+
+def _words(name: Any) -> List[str]:
+    # "alternatePhoneNo" / "alternate_phone_no" -> ["alternate", "phone", "no"]
+    return [w.lower() for w in re.findall(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+", str(name))]
+
+
+def field_kind(name: Any) -> Optional[str]:
+    # Matched on the last word, so flags such as phoneVerified or names such as candidate are not contact fields
+    key, words = _key(name), _words(name)
+    while len(words) > 1 and words[-1] in _QUALIFIER_WORDS:
+        words.pop()
+    last = words[-1] if words else ""
+    if last in ("phone", "mobile"):
+        return "phone"
+    if last == "email":
+        return "email"
+    if key in ("dob", "dateofbirth", "birthdate") or last == "date":
+        return "date"
+    if key in NUMERIC_FIELDS:
+        return "number"
+    if key in TITLE_CASE_FIELDS or key.startswith("address"):
+        return "title"
+    return None
+
+
+# --- Per-kind normalizers: return the normalized value, or None when unresolved ---
+
+def normalize_phone(value: Any) -> Optional[str]:
+    if isinstance(value, bool) or value is None:
+        return None
+    digits = re.sub(r"\D", "", str(value))
+    code = NORMALIZATION_CONFIG['default_country_code'].lstrip("+")
+    if len(digits) == 11 and digits.startswith("0"):
+        digits = digits[1:]
+    elif len(digits) == 10 + len(code) and digits.startswith(code):
+        digits = digits[len(code):]
+    if len(digits) == 10 and digits[0] in "6789":
+        return f"+{code}{digits}"
+    return None
+
+
+def normalize_date(value: Any) -> Optional[str]:
+    if isinstance(value, datetime):
+        return value.date().isoformat() if value.time() == datetime.min.time() else value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if not isinstance(value, str):
+        return None
+    text = value.strip()
+    if _ISO_DATE_RE.match(text) or _ISO_DATETIME_RE.match(text):
+        # Already ISO; datetimes keep their time component
+        return text if _ISO_DATETIME_RE.match(text) else _valid_iso(text)
+    text = re.sub(r"(\d)(st|nd|rd|th)\b", r"\1", text, flags=re.IGNORECASE).replace(",", " ")
+    text = re.sub(r"\s+", " ", text)
+    for fmt in NORMALIZATION_CONFIG['date_formats']:
+        try:
+            return datetime.strptime(text, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def _valid_iso(text: str) -> Optional[str]:
+    try:
+        return datetime.strptime(text, "%Y-%m-%d").date().isoformat()
+    except ValueError:
+        return None
+
+
+def normalize_email(value: Any) -> Optional[str]:
+    if not isinstance(value, str):
+        return None
+    email = value.strip().lower()
+    return email if _EMAIL_RE.match(email) else None
+
+
+def normalize_number(value: Any) -> Optional[float]:
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    text = str(value).strip().lower().replace(",", "").replace("₹", "").replace("rs.", "").replace("inr", "").strip()
+    multiplier = 1
+    match = re.match(r"^([-+]?\d+(?:\.\d+)?)\s*([a-z.]+)?$", text)
+    if not match:
+        return None
+    number, unit = match.group(1), (match.group(2) or "").rstrip(".")
+    if unit:
+        if unit in _AMOUNT_UNITS:
+            multiplier = _AMOUNT_UNITS[unit]
+        elif unit not in _MEASURE_UNITS:
+            return None
+    result = float(number) * multiplier
+    return int(result) if result.is_integer() else result
+
+
+def normalize_title(value: Any) -> Any:
+    if not isinstance(value, str):
+        return value
+    # Capitalize words; keep tokens with digits (house numbers, pincodes) as they are
+    words = re.split(r"(\s+)", value.strip())
+    return "".join(w if (w.isspace() or any(c.isdigit() for c in w)) else w[:1].upper() + w[1:].lower() for w in words)
+
+
+NORMALIZERS = {
+    "phone": normalize_phone,
+    "date": normalize_date,
+    "email": normalize_email,
+    "number": normalize_number,
+    "title": normalize_title
+}
+
+
+def _walk(node: Any, path: Tuple, changes: List[str], unresolved: List[Dict[str, Any]],
+          inherited: Optional[str] = None) -> None:
+    # `inherited` is the kind of the enclosing field, e.g. every line of an address dict
+    items = node.items() if isinstance(node, dict) else enumerate(node) if isinstance(node, list) else ()
+    for name, value in list(items):
+        if isinstance(name, str) and _key(name) in SKIP_FIELDS:
+            continue
+        field_path = path + (name,)
+        kind = (field_kind(name) if isinstance(name, str) else None) or inherited
+        if isinstance(value, (dict, list)):
+            _walk(value, field_path, changes, unresolved, kind)
+            continue
+        if kind is None or value in (None, "") or isinstance(value, bool):
+            continue
+        normalized = NORMALIZERS[kind](value)
+        if normalized is None:
+            unresolved.append({"field": ".".join(map(str, field_path)), "kind": kind, "value": value})
+        elif normalized != value:
+            node[name] = normalized
+            changes.append(".".join(map(str, field_path)))
+
+
+def normalize_application(app: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str], List[Dict[str, Any]]]:
+    """
+    Return (normalized copy, changed field paths, unresolved fields). Each unresolved
+    entry is {"field": "a.b", "kind": ..., "value": original}.
+    """
+    normalized = copy.deepcopy(app)
+    changes, unresolved = [], []
+    _walk(normalized, (), changes, unresolved)
+    return normalized, changes, unresolved
+
+
+def _set_path(app: Dict[str, Any], field: str, value: Any) -> bool:
+    node = app
+    parts = field.split(".")
+    for part in parts[:-1]:
+        node = node[int(part)] if isinstance(node, list) else node.get(part)
+        if node is None:
+            return False
+    last = parts[-1]
+    if isinstance(node, list):
+        node[int(last)] = value
+    else:
+        node[last] = value
+    return True
+
+
+def apply_patch(app: Dict[str, Any], patch: Dict[str, Any], unresolved: List[Dict[str, Any]]) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """
+    Apply LLM-proposed values for unresolved fields. Every proposal is re-checked by
+    the local normalizer, so only well-formed values land in the application.
+    Returns (patched field paths, still unresolved fields).
+    """
+    patched, remaining = [], []
+    for entry in unresolved:
+        proposal = patch.get(entry["field"]) if isinstance(patch, dict) else None
+        value = NORMALIZERS[entry["kind"]](proposal) if proposal not in (None, "") else None
+        if value is not None and _set_path(app, entry["field"], value):
+            patched.append(entry["field"])
+        else:
+            remaining.append(entry)
+    return patched, remaining
+
+
+def unresolved_issues(unresolved: List[Dict[str, Any]]) -> List[str]:
+    return [f"Could not normalize {e['field']} ({KIND_DESCRIPTIONS.get(e['kind'], e['kind'])}): {e['value']!r}"
+            for e in unresolved]
@@ -0,0 +1,239 @@
+"""
+Process-wide limiter for Azure OpenAI calls.
+
+Every chat completion (sync threads and async tasks alike) passes through one
+`LLMRateLimiter`:
+- two token buckets budget requests/min and tokens/min; a request's token cost is
+  estimated the way Azure counts it, prompt tokens plus `max_tokens`;
+- an AIMD concurrency limit grows by one per `limit` successful calls and halves
+  on a 429 (once per window, not once per throttled in-flight call);
+- a 429 pauses every caller until its `Retry-After` has passed.
+
+Retries themselves live in llm.py and follow UNDERWRITING_CONFIG['retry'].
+"""
+
+import time
+import asyncio
+import threading
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from openai import APIConnectionError, APIStatusError, APITimeoutError, RateLimitError
+
+from .config import RATE_LIMIT_CONFIG, UNDERWRITING_CONFIG
+from .metrics import LLM_CONCURRENCY_LIMIT, LLM_RATE_LIMIT_WAIT, LLM_THROTTLED
+
+
+def estimate_tokens(kwargs: Dict[str, Any]) -> int:
+    """ Prompt tokens (~4 characters each, fixed cost per image) plus the completion budget. """
+    chars, images = 0, 0
+    for message in kwargs.get("messages") or []:
+        content = message.get("content")
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            for part in content:
+                if part.get("type") == "text":
+                    chars += len(part.get("text", ""))
+                elif part.get("type") == "image_url":
+                    images += 1
+    completion = kwargs.get("max_tokens") or RATE_LIMIT_CONFIG['default_max_tokens']
+    return chars // 4 + images * RATE_LIMIT_CONFIG['image_tokens'] + completion
+
+
+class TokenBucket:
+    """
+    Refills `per_minute` units evenly, holding at most `burst_seconds` worth. `reserve`
+    debits immediately (the balance may go negative) and returns how long the caller must
+    wait, so sync and async callers share one bucket without holding a lock while they sleep.
+    A non-positive `per_minute` means no quota: `reserve` never waits.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = 60):
+        self.rate = per_minute / 60.0
+        self.capacity = self.rate * burst_seconds
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, cost: float) -> float:
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= min(cost, self.capacity)
+            return max(0.0, -self.tokens / self.rate)
+
+
+class AdaptiveConcurrency:
+    """ AIMD limit on in-flight calls, waited on by threads (Condition) and tasks (futures). """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, decrease_factor: float):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self.last_decrease = 0.0
+        self._cond = threading.Condition()
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+        LLM_CONCURRENCY_LIMIT.set(self.limit)
+
+    def _try_enter(self) -> bool:
+        if self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return True
+        return False
+
+    def _wake(self) -> None:
+        # Called with the condition held; woken waiters re-check the limit
+        self._cond.notify_all()
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(lambda f=future: f.done() or f.set_result(None))
+            except RuntimeError:
+                pass  # the waiter's loop is closed
+
+    def acquire(self) -> float:
+        with self._cond:
+            while not self._try_enter():
+                self._cond.wait()
+        return time.monotonic()
+
+    async def aacquire(self) -> float:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                if self._try_enter():
+                    return time.monotonic()
+                future = loop.create_future()
+                self._async_waiters.append((loop, future))
+            await future
+
+    def release(self, started: float, throttled: bool = False, success: bool = False) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                # Calls already in flight when the limit dropped report the same overload
+                if started > self.last_decrease:
+                    self.limit = max(self.minimum, self.limit * self.decrease_factor)
+                    self.last_decrease = time.monotonic()
+            elif success:
+                self.limit = min(self.maximum, self.limit + 1.0 / max(self.limit, 1.0))
+            LLM_CONCURRENCY_LIMIT.set(self.limit)
+            self._wake()
+
+
+class LLMRateLimiter:
+    def __init__(self, config: Dict[str, Any] = RATE_LIMIT_CONFIG):
+        self.enabled = config['enabled']
+        self.requests = TokenBucket(config['requests_per_minute'], config['burst_seconds'])
+        self.tokens = TokenBucket(config['tokens_per_minute'], config['burst_seconds'])
+        self.concurrency = AdaptiveConcurrency(config['initial_concurrency'], config['min_concurrency'],
+                                               config['max_concurrency'], config['decrease_factor'])
+        self.max_retry_after = config['max_retry_after']
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _budget_delay(self, kwargs: Dict[str, Any]) -> float:
+        pause = max(0.0, self.paused_until - time.monotonic())
+        return max(pause, self.requests.reserve(1), self.tokens.reserve(estimate_tokens(kwargs)))
+
+    def acquire(self, kwargs: Dict[str, Any]) -> Optional[float]:
+        """ Block until the call fits the quota; returns a permit for `release` (None when disabled). """
+        if not self.enabled:
+            return None
+        start = time.monotonic()
+        delay = self._budget_delay(kwargs)
+        if delay > 0:
+            time.sleep(delay)
+        permit = self.concurrency.acquire()
+        # A 429 may have paused everyone while this call waited for a slot
+        pause = self.paused_until - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+        LLM_RATE_LIMIT_WAIT.observe(time.monotonic() - start)
+        return permit
+
+    async def aacquire(self, kwargs: Dict[str, Any]) -> Optional[float]:
+        if not self.enabled:
+            return None
+        start = time.monotonic()
+        delay = self._budget_delay(kwargs)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        permit = await self.concurrency.aacquire()
+        pause = self.paused_until - time.monotonic()
+        if pause > 0:
+            try:
+                await asyncio.sleep(pause)
+            except asyncio.CancelledError:
+                self.cancel(permit)
+                raise
+        LLM_RATE_LIMIT_WAIT.observe(time.monotonic() - start)
+        return permit
+
+    def cancel(self, permit: Optional[float]) -> None:
+        """ Free the slot of a call cancelled before it had an outcome. """
+        if permit is not None:
+            self.concurrency.release(permit)
+
+    def release(self, permit: Optional[float], error: Optional[BaseException] = None) -> None:
+        if permit is None:
+            return
+        throttled = is_throttled(error)
+        if throttled:
+            LLM_THROTTLED.inc()
+            retry_after = retry_after_seconds(error)
+            if retry_after:
+                with self._lock:
+                    self.paused_until = max(self.paused_until,
+                                            time.monotonic() + min(retry_after, self.max_retry_after))
+        self.concurrency.release(permit, throttled=throttled, success=error is None)
+
+
+def is_throttled(error: Optional[BaseException]) -> bool:
+    return isinstance(error, RateLimitError) or (isinstance(error, APIStatusError) and error.status_code == 429)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """ 429s, timeouts, connection errors and 5xx are retried; other 4xx are not. """
+    if isinstance(error, (APITimeoutError, APIConnectionError)):
+        return True
+    return isinstance(error, APIStatusError) and (error.status_code == 429 or error.status_code >= 500)
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """ Server-requested wait from `retry-after-ms` / `Retry-After` (seconds or an HTTP date). """
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_delay(error: BaseException, attempt: int) -> float:
+    """ Wait before retry number `attempt` (0-based): Retry-After when given, else the configured backoff. """
+    retry_after = retry_after_seconds(error)
+    if retry_after is not None:
+        return min(retry_after, RATE_LIMIT_CONFIG['max_retry_after'])
+    delays = UNDERWRITING_CONFIG['retry']['backoff_delays']
+    return delays[min(attempt, len(delays) - 1)]
+
+
+llm_rate_limiter = LLMRateLimiter()
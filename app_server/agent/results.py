@@ -0,0 +1,120 @@
+"""
+Reuse of underwriting results.
+
+- Single flight: concurrent `/underwrite` calls for the same application (client
+  retries, double clicks) share one graph run instead of each running the graph
+  and writing its own PDF.
+- Result store: the last decision and report per application are kept in Mongo
+  with a content hash of the application document. While the document is
+  unchanged, `/underwrite` answers from the store without running the graph;
+  `force=true` runs it again. The hash also covers RESULTS_CONFIG['version'], so
+  bumping it after prompt, guideline or scoring changes retires every stored result.
+- Incremental re-underwriting: the stored record also keeps the application and the
+  per-node results. When an amended application comes in, only the nodes fed by the
+  changed sections (SECTION_DEPENDENCIES) run again; the others return their previous
+  result, so correcting the weight re-runs health, decision and report only.
+
+Degraded results (a component that errored or timed out) are not stored.
+"""
+
+import json
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from .cache import content_hash
+from .config import RESULTS_CONFIG
+from .insurance_graph import (db, affected_nodes, changed_sections, fetch_applications_from_mongodb,
+                              reusable_outputs)
+from .metrics import UNDERWRITING_RESULTS
+
+DEGRADED_STATUSES = ("error", "timed_out")
+
+
+def _results():
+    return db[RESULTS_CONFIG['collection']]
+
+
+def ensure_result_indexes() -> None:
+    try:
+        _results().create_index("created_at", expireAfterSeconds=RESULTS_CONFIG['ttl'])
+    except Exception as e:
+        print(f"⚠️  Could not create TTL index on {RESULTS_CONFIG['collection']}: {e}")
+
+
+def application_fingerprint(application: Dict[str, Any]) -> str:
+    return content_hash({"version": RESULTS_CONFIG['version'], "application": application})
+
+
+def lookup(application_id: str) -> Tuple[Optional[Dict[str, Any]], Optional[str], Optional[Dict[str, Any]]]:
+    """
+    (application, fingerprint, previous result) for an application; the previous result
+    matches the document when its `content_hash` equals the fingerprint. (None, None, None)
+    when there is no such application.
+    """
+    application = fetch_applications_from_mongodb([application_id]).get(application_id)
+    if application is None:
+        return None, None, None
+    return application, application_fingerprint(application), _results().find_one({"_id": application_id})
+
+
+def incremental_reuse(previous: Optional[Dict[str, Any]],
+                      application: Dict[str, Any]) -> Tuple[List[str], Dict[str, Dict[str, Any]]]:
+    """ (changed sections, reusable node results) of the previous run for an amended application. """
+    if not previous or previous.get("version") != RESULTS_CONFIG['version'] or not previous.get("application"):
+        return [], {}
+    changed = changed_sections(previous["application"], application)
+    dirty = affected_nodes(changed)
+    return sorted(changed), {name: update for name, update in (previous.get("node_outputs") or {}).items()
+                             if name not in dirty}
+
+
+def is_degraded(final_state: Dict[str, Any]) -> bool:
+    decision = final_state.get("policy_decision") or {}
+    if (decision.get("short_circuit") or {}).get("rule") == "deadline":
+        return True
+    if any(problem in DEGRADED_STATUSES for problem in (decision.get("missing_components") or {}).values()):
+        return True
+    return (final_state.get("underwriting_report") or {}).get("status") in DEGRADED_STATUSES
+
+
+def _mongo_safe(value: Any) -> Any:
+    # Node outputs may hold datetimes or tuples; store their JSON form
+    return json.loads(json.dumps(value, default=str))
+
+
+def save_result(application_id: str, application: Dict[str, Any], fingerprint: str, final_state: Dict[str, Any],
+                run_id: str) -> bool:
+    if not final_state.get("policy_decision") or is_degraded(final_state):
+        return False
+    _results().replace_one({"_id": application_id}, {
+        "content_hash": fingerprint,
+        "version": RESULTS_CONFIG['version'],
+        "run_id": run_id,
+        "decision": _mongo_safe(final_state.get("policy_decision")),
+        "report": _mongo_safe(final_state.get("underwriting_report")),
+        # For incremental re-underwriting of the next amendment
+        "application": application,
+        "node_outputs": _mongo_safe(reusable_outputs(final_state)),
+        "created_at": datetime.now(timezone.utc)
+    }, upsert=True)
+    return True
+
+
+class SingleFlight:
+    """ Concurrent calls with the same key share one in-flight run of `fn`. """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """ (result, shared): `shared` is True when this call joined a run started by another. """
+        task = self._calls.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._calls.pop(key, None) if self._calls.get(key) is t else None)
+        UNDERWRITING_RESULTS.labels("shared" if shared else "computed").inc()
+        # A caller that goes away does not cancel the run the others are waiting for
+        return await asyncio.shield(task), shared
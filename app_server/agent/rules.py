@@ -0,0 +1,232 @@
+"""
+Rule-based fast path for clear-cut underwriting components.
+
+Each pre-scorer applies the same rules the node's prompt spells out (BMI bands,
+high-risk industry list, age-based income/coverage ratios) and
+returns a complete component result only when the case is confidently inside
+those rules. Anything else returns None and the node falls through to the LLM.
+"""
+
+import re
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .config import UNDERWRITING_CONFIG, FAST_PATH_CONFIG
+from .scoring import decide
+
+_NEGATIVE = ("no", "n", "false", "none", "never", "nil", "na", "n/a", "")
+_POSITIVE = ("yes", "y", "true")
+_BODY_FIELDS = ("weight", "height", "weight_kg", "height_cm")
+
+
+def applicant_age(personal: Dict[str, Any]) -> Optional[int]:
+    try:
+        birth_date = datetime.strptime(personal["dob"], "%Y-%m-%d")
+        return (datetime.now() - birth_date).days // 365
+    except Exception:
+        return None
+
+
+def _is_yes(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return value > 0
+    if isinstance(value, str):
+        return value.strip().lower() not in _NEGATIVE
+    return bool(value)
+
+
+def _disclosures(name: str, value: Any) -> List[str]:
+    if value is None:
+        return []
+    if value is True or (isinstance(value, str) and value.strip().lower() in _POSITIVE):
+        return [name]
+    if value is False or (isinstance(value, str) and value.strip().lower() in _NEGATIVE):
+        return []
+    if isinstance(value, (int, float)):
+        return [f"{name} {value}"] if value else []
+    if isinstance(value, dict):
+        return [c for key, v in value.items() for c in _disclosures(str(key).replace("_", " "), v)]
+    if isinstance(value, list):
+        return [c for v in value for c in (_disclosures(name, v) if isinstance(v, (dict, list)) else
+                                           [str(v)] if v else [])]
+    # Free text, or anything else we can't classify: report it so it reaches the LLM
+    return [f"{name} {value}"]
+
+
+def disclosed_conditions(health: Dict[str, Any], exclude: tuple = ()) -> List[str]:
+    """
+    Conditions disclosed in the health section: free text, list items, the names of
+    flags answered yes or with a non-zero number (e.g. "diabetes": true,
+    "alcohol_units_per_week": 21), including flags nested in dicts.
+    """
+    conditions = []
+    for key, value in health.items():
+        if key in _BODY_FIELDS or key in exclude:
+            continue
+        conditions += _disclosures(key.replace("_", " "), value)
+    return conditions
+
+
+def _field(data: Dict[str, Any], *names: str) -> Any:
+    """ Case/underscore-insensitive lookup of the first present field. """
+    normalized = {str(k).replace("_", "").lower(): v for k, v in data.items()}
+    for name in names:
+        value = normalized.get(name.replace("_", "").lower())
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def _number(value: Any) -> Optional[float]:
+    try:
+        return float(str(value).replace(",", ""))
+    except (TypeError, ValueError):
+        return None
+
+
+def _result(score: float, explanation: str, **extra: Any) -> Dict[str, Any]:
+    score = round(min(1.0, score), 4)
+    return {
+        "risk_score": score,
+        "recommendation": decide(score),
+        **extra,
+        "llm_explanation": explanation,
+        "decision_path": "rules"
+    }
+
+
+# --- Health ---
+
+def prescore_health(health: Dict[str, Any], bmi: Optional[float], age: Optional[int],
+                    sum_assured: Optional[float]) -> Optional[Dict[str, Any]]:
+    cfg = FAST_PATH_CONFIG['health']
+    if bmi is None or age is None or sum_assured is None:
+        return None
+    if not (cfg['min_bmi'] <= bmi < UNDERWRITING_CONFIG['bmi_thresholds']['medium_risk']):
+        return None
+    if age > cfg['max_age'] or sum_assured > cfg['max_non_medical_sum_assured']:
+        return None
+
+    # Tobacco changes the exam requirements in the guidelines, and any other disclosure
+    # (alcohol, narcotics, medical history, surgery...) needs judgment
+    if _is_yes(health.get("tobacco_consumption", False)) or disclosed_conditions(health):
+        return None
+
+    score, risk_factors = cfg['base_score'], []
+    if bmi >= UNDERWRITING_CONFIG['bmi_thresholds']['low_risk']:
+        score += 0.1
+        risk_factors.append(f"BMI {bmi} (25-30)")
+
+    return _result(
+        score,
+        "Rule-based: no disclosed conditions, BMI and sum assured within non-medical limits.",
+        bmi=bmi,
+        risk_factors=risk_factors,
+        medical_exam_required=False,
+        exam_type=None,
+        exam_reasons=[]
+    )
+
+
+# --- Occupation ---
+
+def prescore_occupation(occ: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    cfg = FAST_PATH_CONFIG['occupation']
+    if not occ:
+        return None
+    industry = str(_field(occ, "industry", "industryType", "sector") or "").lower()
+    employment = str(_field(occ, "employmentType", "employment_type", "type") or "").lower()
+    title = str(_field(occ, "occupation", "designation", "jobTitle", "role") or "").lower()
+    if not industry or not employment:
+        return None
+
+    # High-risk/hazard terms match as word prefixes (errs towards the LLM);
+    # low-risk industries must match whole words ("it" must not match "hospitality")
+    text = f"{industry} {title}"
+    if any(re.search(rf"\b{re.escape(term)}", text) for term in cfg['high_risk_industries'] + cfg['hazardous_terms']):
+        return None
+    if not any(re.search(rf"\b{re.escape(term)}\b", industry) for term in cfg['low_risk_industries']):
+        return None
+
+    score, reasons = cfg['base_score'], [f"Low-risk industry: {industry}"]
+    if "self" in employment:
+        score += 0.2
+        reasons.append("Self-employed")
+    elif "salaried" not in employment:
+        return None
+
+    return _result(score, "Rule-based: low-risk industry with standard employment.", reasons=reasons)
+
+
+# --- Financial ---
+
+def max_income_multiple(age: int) -> int:
+    ratios = UNDERWRITING_CONFIG['income_coverage_ratios']
+    if age < 30:
+        return ratios['under_30']
+    if age < 40:
+        return ratios['30_to_40']
+    if age < 50:
+        return ratios['40_to_50']
+    return ratios['over_50']
+
+
+def prescore_financial(mcp_data: Dict[str, Any], app: Dict[str, Any], age: Optional[int]) -> Optional[Dict[str, Any]]:
+    cfg = FAST_PATH_CONFIG['financial']
+    if age is None or not isinstance(mcp_data, dict):
+        return None
+    personal = app.get("personal_details", {})
+    fin = app.get("financial_information", {}) or {}
+    coverage = _number(_field(app.get("coverage_selection", {}) or {}, "coverageAmount")
+                       or _field(app.get("policy_selection", {}) or {}, "coverageAmount", "sumAssured"))
+    income = _number(_field(fin, "annualIncome", "annual_income") or personal.get("annualIncome")
+                     or _field(mcp_data, "annualIncome", "annual_income"))
+    if not coverage or not income or income <= 0:
+        return None
+
+    # MCP signals that need judgment
+    if _field(mcp_data, "eligible", "isEligible") is False:
+        return None
+    premium_ratio = _number(_field(mcp_data, "premium_to_income_ratio", "premiumToIncomeRatio"))
+    if premium_ratio is not None and premium_ratio > 0.15:
+        return None
+    liabilities = _number(_field(mcp_data, "total_liabilities", "totalLiabilities", "liabilities"))
+    if liabilities is not None and liabilities > income * cfg['max_liabilities_to_income']:
+        return None
+
+    ratio = round(coverage / income, 2)
+    limit = max_income_multiple(age)
+    if ratio > limit * cfg['max_ratio_utilisation']:
+        return None
+
+    employment = str(_field(app.get("occupation_details", {}) or {}, "employmentType", "employment_type") or "").lower()
+    score = cfg['base_score'] + (0.1 if "self" in employment else 0.0)
+    return _result(
+        score,
+        f"Rule-based: coverage is {ratio}x income, within the {limit}x limit for age {age}.",
+        income_to_coverage_ratio=ratio
+    )
+
+
+# --- Hit-ratio accounting ---
+
+_lock = threading.Lock()
+_stats: Dict[str, Dict[str, int]] = {}
+
+
+def record_path(node: str, path: str) -> None:
+    with _lock:
+        counts = _stats.setdefault(node, {"rules": 0, "llm": 0})
+        counts[path] = counts.get(path, 0) + 1
+
+
+def fast_path_stats() -> Dict[str, Dict[str, Any]]:
+    with _lock:
+        out = {}
+        for node, counts in _stats.items():
+            total = counts["rules"] + counts["llm"]
+            out[node] = {**counts, "hit_ratio": round(counts["rules"] / total, 4) if total else 0.0}
+        return out
@@ -0,0 +1,126 @@
+"""
+Deterministic underwriting decision engine.
+
+Computes `overall_risk_score` and `final_decision` from the component results
+using UNDERWRITING_CONFIG['risk_weights'] and ['risk_thresholds'], so the
+decision node no longer needs an LLM round-trip to do arithmetic.
+"""
+
+from typing import Any, Dict, Optional, Tuple
+
+from .config import UNDERWRITING_CONFIG, DECISION_CONFIG
+
+DECISIONS = ("Accept", "Manual Review", "Decline")
+
+# KYC returns a status/confidence rather than a risk score
+KYC_STATUS_RISK = {
+    "verified": 0.1,
+    "manual review": 0.5,
+    "rejected": 1.0
+}
+
+
+def _as_score(value: Any) -> Optional[float]:
+    try:
+        return min(1.0, max(0.0, float(value)))
+    except (TypeError, ValueError):
+        return None
+
+
+def component_risk(name: str, result: Optional[Dict[str, Any]]) -> Tuple[Optional[float], Optional[str]]:
+    """
+    Return (risk score, None) for a usable component result, or (None, problem)
+    when it is missing, errored, timed out or has no usable score.
+    """
+    if not result:
+        return None, "missing"
+    if "error" in result or result.get("status") in ("error", "timed_out", "skipped"):
+        return None, result.get("status") if result.get("status") in ("timed_out", "skipped") else "error"
+
+    score = _as_score(result.get("risk_score"))
+    if score is None and name == "kyc":
+        confidence = _as_score(result.get("kyc_confidence"))
+        status = str(result.get("kyc_status", "")).strip().lower()
+        if status == "rejected":
+            score = KYC_STATUS_RISK["rejected"]
+        elif confidence is not None:
+            score = round(1.0 - confidence, 4)
+        else:
+            score = KYC_STATUS_RISK.get(status)
+    if score is None:
+        return None, "no_score"
+    return score, None
+
+
+def decide(score: float, thresholds: Dict[str, float] = None) -> str:
+    thresholds = thresholds or UNDERWRITING_CONFIG['risk_thresholds']
+    if score <= thresholds['accept']:
+        return "Accept"
+    if score <= thresholds['manual_review']:
+        return "Manual Review"
+    return "Decline"
+
+
+def compute_decision(components: Dict[str, Optional[Dict[str, Any]]],
+                     weights: Dict[str, float] = None,
+                     thresholds: Dict[str, float] = None) -> Dict[str, Any]:
+    """
+    Weighted average of the component risk scores plus threshold decision.
+
+    Missing or errored components are excluded and the remaining weights are
+    renormalised. Because the decision was then made on incomplete data, an
+    "Accept" is floored to "Manual Review" when the missing weight exceeds
+    DECISION_CONFIG['max_missing_weight_for_accept'].
+    """
+    weights = weights or UNDERWRITING_CONFIG['risk_weights']
+    thresholds = thresholds or UNDERWRITING_CONFIG['risk_thresholds']
+
+    component_scores, missing = {}, {}
+    for name in weights:
+        score, problem = component_risk(name, components.get(name))
+        if problem:
+            missing[name] = problem
+        else:
+            component_scores[name] = score
+
+    present_weight = sum(weights[n] for n in component_scores)
+    missing_weight = round(sum(weights[n] for n in missing), 4)
+
+    if not component_scores or present_weight <= 0:
+        return {
+            "overall_risk_score": None,
+            "final_decision": "Manual Review",
+            "reasons": ["No usable component results - manual underwriting required"],
+            "component_scores": component_scores,
+            "missing_components": missing,
+            "decision_engine": "local"
+        }
+
+    overall = round(sum(weights[n] * s for n, s in component_scores.items()) / present_weight, 4)
+    decision = decide(overall, thresholds)
+    if decision == "Accept" and missing_weight > DECISION_CONFIG['max_missing_weight_for_accept']:
+        decision = "Manual Review"
+
+    # Top reasons: largest weighted contributions first, then data gaps
+    contributions = sorted(component_scores.items(), key=lambda kv: -weights[kv[0]] * kv[1])
+    reasons = [f"{name} risk {score:.2f} (weight {weights[name]})" for name, score in contributions[:3]]
+    reasons += [f"{name} result unavailable ({problem})" for name, problem in missing.items()]
+
+    return {
+        "overall_risk_score": overall,
+        "final_decision": decision,
+        "reasons": reasons[:3] if not missing else reasons,
+        "component_scores": component_scores,
+        "missing_components": missing,
+        "decision_engine": "local"
+    }
+
+
+def template_summary(decision: Dict[str, Any]) -> str:
+    """ Plain summary used when the LLM summary is disabled or fails. """
+    score = decision.get("overall_risk_score")
+    score_text = f"{score:.2f}" if isinstance(score, (int, float)) else "n/a"
+    text = f"Overall risk score {score_text} results in '{decision.get('final_decision')}'."
+    if decision.get("reasons"):
+        text += " Main factors: " + "; ".join(decision["reasons"][:3]) + "."
+    return text
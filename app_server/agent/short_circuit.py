@@ -0,0 +1,59 @@
+"""
+Early-exit rules for the underwriting graph.
+
+A rule fires when an earlier node has already decided the outcome (incomplete
+application, KYC rejection, clear health decline). The graph then skips the
+remaining component nodes and routes to a lightweight decision/report path.
+Rules and their decisions are configured in SHORT_CIRCUIT_CONFIG.
+"""
+
+from typing import Any, Dict, List, Optional
+
+from .config import SHORT_CIRCUIT_CONFIG
+
+
+def _rule(name: str, node: str, reason: str) -> Optional[Dict[str, Any]]:
+    cfg = SHORT_CIRCUIT_CONFIG.get(name, {})
+    if not SHORT_CIRCUIT_CONFIG['enabled'] or not cfg.get('enabled'):
+        return None
+    return {"rule": name, "node": node, "decision": cfg['decision'], "reason": reason}
+
+
+def after_ingest(app: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """ Incomplete applications: missing critical sections or no PAN to fetch MCP data with. """
+    missing: List[str] = [section for section, names in SHORT_CIRCUIT_CONFIG['missing_sections']['sections'].items()
+                          if not any(app.get(name) for name in names)]
+    if missing:
+        fired = _rule("missing_sections", "ingest", f"Missing critical sections: {', '.join(missing)}")
+        if fired:
+            return fired
+    if not (app.get("personal_details") or {}).get("panNumber"):
+        return _rule("missing_pan", "ingest", "PAN number not provided")
+    return None
+
+
+def after_component(node: str, result: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """ Component results that decide the application on their own. """
+    if not isinstance(result, dict) or "error" in result:
+        return None
+
+    if node == "kyc" and str(result.get("kyc_status", "")).strip().lower() == "rejected":
+        return _rule("kyc_rejected", node, "KYC verification rejected")
+
+    if node == "health" and result.get("recommendation") == "Decline":
+        try:
+            score = float(result.get("risk_score"))
+        except (TypeError, ValueError):
+            return None
+        if score >= SHORT_CIRCUIT_CONFIG['health_decline']['min_risk_score']:
+            return _rule("health_decline", node, f"Health underwriting declined (risk score {score:.2f})")
+    return None
+
+
+def should_skip(node: str, state: Dict[str, Any]) -> bool:
+    return bool(state.get("short_circuit")) and node in SHORT_CIRCUIT_CONFIG['skip_nodes']
+
+
+def keep_first(left: Optional[Dict[str, Any]], right: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """ Reducer: the first rule to fire wins when parallel branches fire in the same step. """
+    return left or right
@@ -0,0 +1,168 @@
+"""
+OpenTelemetry tracing for the underwriting service.
+
+One root span per underwriting request, a child span per graph node, and nested
+spans for each chat completion, MCP call, Mongo command and PDF render, carrying
+token and byte counts. Spans go to an OTLP collector, a JSON-lines file (for
+offline testing) or the console, selected by TRACING_CONFIG['exporter'].
+
+Only `opentelemetry-api` is needed to import this module; without the SDK (or
+with the exporter set to 'none') every span is a no-op.
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from opentelemetry import trace
+from pymongo import monitoring
+
+from .config import TRACING_CONFIG
+
+tracer = trace.get_tracer("app_server.agent")
+
+_provider = None
+_trace_file = None
+
+
+def _otlp_exporter():
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    endpoint = TRACING_CONFIG['otlp_endpoint'].rstrip("/")
+    if not endpoint.endswith("/v1/traces"):
+        endpoint += "/v1/traces"
+    return OTLPSpanExporter(endpoint=endpoint)
+
+
+def _file_exporter():
+    global _trace_file
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+    _trace_file = open(TRACING_CONFIG['file_path'], "a", encoding="utf-8")
+    return ConsoleSpanExporter(out=_trace_file, formatter=lambda span: span.to_json(indent=None) + "\n")
+
+
+def configure_tracing() -> bool:
+    """
+    Install the global tracer provider for the configured exporter.
+    Returns False (spans stay no-ops) when tracing is off or the SDK is missing.
+    """
+    global _provider
+    exporter_name = TRACING_CONFIG['exporter']
+    if _provider is not None or exporter_name == "none":
+        return _provider is not None
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter, SimpleSpanProcessor
+
+        provider = TracerProvider(resource=Resource.create({"service.name": TRACING_CONFIG['service_name']}))
+        if exporter_name == "otlp":
+            provider.add_span_processor(BatchSpanProcessor(_otlp_exporter()))
+        elif exporter_name == "file":
+            provider.add_span_processor(BatchSpanProcessor(_file_exporter()))
+        elif exporter_name == "console":
+            provider.add_span_processor(SimpleSpanProcessor(ConsoleSpanExporter()))
+        else:
+            print(f"⚠️  Unknown tracing exporter '{exporter_name}' - tracing disabled")
+            return False
+    except ImportError as e:
+        print(f"⚠️  Tracing requested but the OpenTelemetry SDK/exporter is not installed ({e}) - tracing disabled")
+        return False
+
+    trace.set_tracer_provider(provider)
+    _provider = provider
+    if TRACING_CONFIG['instrument_langchain']:
+        try:
+            from openinference.instrumentation.langchain import LangChainInstrumentor
+            LangChainInstrumentor().instrument(tracer_provider=provider)
+        except ImportError:
+            print("⚠️  openinference-instrumentation-langchain is not installed - LangChain spans disabled")
+    print(f"🔭 Tracing enabled ({exporter_name})")
+    return True
+
+
+def shutdown_tracing() -> None:
+    """ Flush pending spans (called on application shutdown and at the end of the CLI). """
+    global _provider, _trace_file
+    if _provider is not None:
+        _provider.shutdown()
+    if _trace_file is not None:
+        _trace_file.close()
+    _provider, _trace_file = None, None
+
+
+def _attributes(attributes: Dict[str, Any]) -> Dict[str, Any]:
+    # OTel attributes must be primitives; drop unset values
+    return {k: v if isinstance(v, (bool, int, float, str)) else str(v) for k, v in attributes.items() if v is not None}
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[trace.Span]:
+    """ Child span of the current one; exceptions are recorded and mark the span as an error. """
+    with tracer.start_as_current_span(name, attributes=_attributes(attributes)) as current:
+        yield current
+
+
+def set_attributes(current: trace.Span, **attributes: Any) -> None:
+    current.set_attributes(_attributes(attributes))
+
+
+def set_usage_attributes(current: trace.Span, resp: Any) -> None:
+    """ Token counts from a chat completion's `usage`. """
+    usage = getattr(resp, "usage", None)
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    set_attributes(
+        current,
+        **{
+            "gen_ai.response.model": getattr(resp, "model", None),
+            "gen_ai.usage.input_tokens": usage.prompt_tokens,
+            "gen_ai.usage.output_tokens": usage.completion_tokens,
+            "gen_ai.usage.cached_input_tokens": getattr(details, "cached_tokens", None)
+        }
+    )
+
+
+class MongoCommandTracing(monitoring.CommandListener):
+    """
+    pymongo command listener that records a span per command (find, insert, update...).
+    pymongo calls `started` on the calling thread, so the span nests under the active node span.
+    """
+
+    def __init__(self):
+        self._spans: Dict[Any, trace.Span] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(event):
+        return event.request_id, event.connection_id
+
+    def started(self, event) -> None:
+        collection = event.command.get(event.command_name)
+        current = tracer.start_span(f"mongo.{event.command_name}", attributes=_attributes({
+            "db.system": "mongodb",
+            "db.name": event.database_name,
+            "db.operation": event.command_name,
+            "db.mongodb.collection": collection if isinstance(collection, str) else None
+        }))
+        with self._lock:
+            self._spans[self._key(event)] = current
+
+    def _finish(self, event, error: Optional[str] = None) -> None:
+        with self._lock:
+            current = self._spans.pop(self._key(event), None)
+        if current is None:
+            return
+        if error:
+            current.set_status(trace.Status(trace.StatusCode.ERROR, error))
+        else:
+            batch = (event.reply.get("cursor") or {}).get("firstBatch") if isinstance(event.reply, dict) else None
+            if batch is not None:
+                current.set_attribute("db.response.returned_rows", len(batch))
+        current.end()
+
+    def succeeded(self, event) -> None:
+        self._finish(event)
+
+    def failed(self, event) -> None:
+        self._finish(event, error=str(event.failure))
@@ -1,15 +1,59 @@
-from fastapi import FastAPI, Body
-from fastapi.responses import StreamingResponse
-from app_server.agent.insurance_graph import insurance_graph
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Body, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from app_server.agent.insurance_graph import (insurance_graph, checkpointer, afetch_applications_from_mongodb,
+                                              node_result, run_config, agraph_input)
+from app_server.agent.config import BATCH_CONFIG, JOBS_CONFIG, RESULTS_CONFIG
+from app_server.agent.deadline import request_deadline
+from app_server.agent.jobs import JobWorkerPool, enqueue_job, get_job
+from app_server.agent.results import SingleFlight, ensure_result_indexes, incremental_reuse, lookup, save_result
+from app_server.agent.llm import aclose_clients
+from app_server.agent.mcp import aclose_http_client
+from app_server.agent.mongo import aclose_mongo_client, close_mongo_client
+from app_server.agent.cassette import close_cassette
+from app_server.agent.cache import llm_response_cache, ocr_cache
+from app_server.agent.guidelines import guidelines_index
+from app_server.agent.rules import fast_path_stats
+from app_server.agent.metrics import UNDERWRITINGS_IN_FLIGHT, UNDERWRITING_DURATION, UNDERWRITING_RESULTS, render_metrics
+from app_server.agent.tracing import configure_tracing, shutdown_tracing, span, set_attributes
+import asyncio
+import time
 import logging
 import sys
 import json
 import os
+from typing import Any, Dict, List, Optional, Tuple
 
 os.environ['SSL_CERT_FILE'] = './ca-bundle.crt'
 logging.basicConfig(level=logging.INFO, stream=sys.stderr)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_tracing()
+    # Index the underwriting guidelines once, before the first request
+    await asyncio.to_thread(guidelines_index.ensure_loaded)
+    # Mongo is not awaited at startup: clients connect on first use, indexes are created in the background
+    index_task = asyncio.create_task(asyncio.to_thread(ensure_result_indexes)) if RESULTS_CONFIG['enabled'] else None
+    job_workers = await JobWorkerPool(JOBS_CONFIG['workers']).start() if JOBS_CONFIG['workers'] > 0 else None
+    yield
+    if job_workers is not None:
+        await job_workers.stop()
+    # Release the pooled Azure OpenAI / MCP connections and flush pending spans
+    await aclose_clients()
+    await aclose_http_client()
+    close_cassette()
+    if checkpointer is not None:
+        await asyncio.to_thread(checkpointer.close)
+    if index_task is not None:
+        await index_task
+    await aclose_mongo_client()
+    await asyncio.to_thread(close_mongo_client)
+    shutdown_tracing()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 @app.get("/")
@@ -21,22 +65,300 @@ def health_check():
     """ Health check endpoint """
     return {"status": "ok"}
 
+@app.get("/cache/stats")
+def cache_stats():
+    """ Hit/miss counters for the LLM response and OCR caches """
+    return {"llm_response": llm_response_cache.stats(), "ocr_extraction": ocr_cache.stats()}
+
+@app.get("/fast-path/stats")
+def fast_path_statistics():
+    """ Share of health / occupation / financial components decided by rules instead of the LLM """
+    return fast_path_stats()
+
+@app.get("/metrics")
+def metrics():
+    """ Prometheus metrics: node / LLM / MCP / Mongo latency, token usage, in-flight work, errors """
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
+
+def _initial_state(application_id: str, bypass_cache: bool, deadline_seconds: Optional[float] = None,
+                   **extra: Any) -> Dict[str, Any]:
+    state = {"application_id": application_id, "llm_cache_bypass": bypass_cache, **extra}
+    if deadline_seconds is not None:
+        # Otherwise ingest starts the default deadline
+        state["deadline"] = request_deadline(deadline_seconds)
+    return state
+
+async def _run_underwriting(initial_state: Dict[str, Any], config: Dict[str, Any],
+                            resume: bool = False) -> Dict[str, Any]:
+    """
+    One graph run with the in-flight / duration metrics and the root trace span.
+    With `resume` an earlier run with the same run ID continues from its checkpoint.
+    """
+    start = time.perf_counter()
+    with UNDERWRITINGS_IN_FLIGHT.track_inprogress(), \
+            span("underwrite", **{"underwriting.application_id": initial_state.get("application_id"),
+                                  "underwriting.run_id": config["configurable"]["run_id"]}) as root:
+        final_state = await insurance_graph.ainvoke(await agraph_input(initial_state, config, resume), config)
+        decision = (final_state.get("policy_decision") or {}).get("final_decision", "none")
+        set_attributes(root, **{"underwriting.decision": decision})
+    UNDERWRITING_DURATION.labels(decision).observe(time.perf_counter() - start)
+    return final_state
+
+_single_flight = SingleFlight()
+
+async def _underwrite_shared(application_id: str, bypass_cache: bool, deadline_seconds: Optional[float],
+                             force: bool, incremental: bool) -> Tuple[int, Dict[str, Any]]:
+    """
+    (status code, response body) for a sync `/underwrite`: the stored result of an unchanged
+    application, or one graph run shared by all concurrent requests for the same document.
+    An amended application re-runs only the nodes its changed sections feed when `incremental`.
+    """
+    application, fingerprint, reused, changed = None, None, {}, []
+    if RESULTS_CONFIG['enabled']:
+        application, fingerprint, previous = await asyncio.to_thread(lookup, application_id)
+        fresh = force or bypass_cache
+        if previous and previous["content_hash"] == fingerprint and not fresh:
+            UNDERWRITING_RESULTS.labels("stored").inc()
+            return 200, {"status": "completed", "run_id": previous["run_id"], "reused": True,
+                         "decision": previous["decision"], "report": previous["report"]}
+        if application is not None and incremental and not fresh:
+            changed, reused = incremental_reuse(previous, application)
+
+    async def run() -> Tuple[int, Dict[str, Any]]:
+        config = run_config(application_id)
+        run_id = config["configurable"]["run_id"]
+        # Prefetched document: ingest skips its own Mongo read
+        extra = {"application": application} if application is not None else {}
+        if reused:
+            print(f"♻️  Incremental run: changed {changed}, reusing {sorted(reused)}")
+            extra["reused_results"] = reused
+        try:
+            final_state = await _run_underwriting(_initial_state(application_id, bypass_cache, deadline_seconds,
+                                                                 **extra), config)
+        except Exception as e:
+            logging.exception(f"Underwriting failed for ID: {application_id}")
+            return 500, {"status": "failed", "error": str(e), "run_id": run_id}
+        if fingerprint is not None:
+            try:
+                await asyncio.to_thread(save_result, application_id, application, fingerprint, final_state, run_id)
+            except Exception as e:
+                logging.warning(f"Could not store the result for ID {application_id}: {e}")
+        body = {"status": "completed", "run_id": run_id, "decision": final_state.get("policy_decision"),
+                "report": final_state.get("underwriting_report")}
+        if reused:
+            body["incremental"] = {"changed_sections": changed, "reused_nodes": sorted(reused)}
+        return 200, body
+
+    result, _ = await _single_flight.do((application_id, fingerprint, bypass_cache), run)
+    return result
+
 @app.post("/underwrite")
-async def underwrite_application(application_id: str = Body(..., embed=True)):
+async def underwrite_application(application_id: str = Body(..., embed=True),
+                                 bypass_cache: bool = Body(False, embed=True),
+                                 mode: str = Body("sync", embed=True),
+                                 deadline_seconds: Optional[float] = Body(None, embed=True),
+                                 run_id: Optional[str] = Body(None, embed=True),
+                                 force: bool = Body(False, embed=True),
+                                 incremental: Optional[bool] = Body(None, embed=True)):
     """
     Trigger the insurance underwriting workflow for a given application ID.
+    Set `bypass_cache` to force fresh LLM calls for this request.
+    `deadline_seconds` overrides DEADLINE_CONFIG['default_seconds']; nodes that run out
+    of time return "timed_out" results and the decision is made without them.
+    A failed run reports its `run_id`; send it back to resume from the last completed node.
+    Concurrent requests for one application share a single run, and an application whose
+    document has not changed since its last decision gets the stored result ("reused": true)
+    unless `force` (or `bypass_cache`) is set. For an amended application only the nodes fed
+    by the changed sections run again (`incremental`, default RESULTS_CONFIG['incremental']);
+    `force` re-runs everything.
+    With `mode="async"` the workflow is queued as a job and its id returned at once;
+    poll `GET /jobs/{job_id}` for progress and the decision.
     """
     logging.info(f"Received underwriting request for ID: {application_id}")
     
-    # Initialize state
-    initial_state = {"application_id": application_id}
-    
-    # Invoke the graph
-    final_state = await insurance_graph.ainvoke(initial_state)
+    if mode == "async":
+        job = await asyncio.to_thread(enqueue_job, application_id, bypass_cache)
+        return JSONResponse(status_code=202, content={
+            "status": job["status"], "job_id": job["_id"], "status_url": f"/jobs/{job['_id']}"
+        })
+    if mode != "sync":
+        raise HTTPException(status_code=400, detail="mode must be 'sync' or 'async'")
+
+    if run_id is None:
+        if incremental is None:
+            incremental = RESULTS_CONFIG['incremental']
+        status_code, body = await _underwrite_shared(application_id, bypass_cache, deadline_seconds, force,
+                                                     incremental)
+        return JSONResponse(status_code=status_code, content=jsonable_encoder(body))
+
+    # Resume the given run from its checkpoint
+    initial_state = _initial_state(application_id, bypass_cache, deadline_seconds)
+    config = run_config(application_id, run_id)
+    try:
+        final_state = await _run_underwriting(initial_state, config, resume=True)
+    except Exception as e:
+        logging.exception(f"Underwriting failed for ID: {application_id}")
+        return JSONResponse(status_code=500, content={"status": "failed", "error": str(e), "run_id": run_id})
     
     # Return relevant parts of the state
     return {
         "status": "completed",
+        "run_id": run_id,
         "decision": final_state.get("policy_decision"),
         "report": final_state.get("underwriting_report")
     }
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def _stream_underwriting(initial_state: Dict[str, Any], config: Dict[str, Any], resume: bool = False):
+    application_id = initial_state["application_id"]
+    run_id = config["configurable"]["run_id"]
+    start = time.perf_counter()
+    decision = "none"
+    with UNDERWRITINGS_IN_FLIGHT.track_inprogress(), \
+            span("underwrite", **{"underwriting.application_id": application_id,
+                                  "underwriting.run_id": run_id}) as root:
+        try:
+            final_state: Dict[str, Any] = {}
+            graph_input = await agraph_input(initial_state, config, resume)
+            async for mode, chunk in insurance_graph.astream(graph_input, config, stream_mode=["updates", "values"]):
+                if mode == "values":
+                    final_state = chunk
+                    continue
+                for node, update in chunk.items():
+                    yield _sse("node", {
+                        "node": node,
+                        "elapsed_seconds": round(time.perf_counter() - start, 3),
+                        "node_seconds": ((update or {}).get("node_timings") or {}).get(node),
+                        "output": node_result(update)
+                    })
+            decision = (final_state.get("policy_decision") or {}).get("final_decision", "none")
+            set_attributes(root, **{"underwriting.decision": decision})
+            yield _sse("complete", {
+                "status": "completed",
+                "run_id": run_id,
+                "elapsed_seconds": round(time.perf_counter() - start, 3),
+                "decision": final_state.get("policy_decision"),
+                "report": final_state.get("underwriting_report")
+            })
+        except Exception as e:
+            logging.exception(f"Streaming underwriting failed for ID: {application_id}")
+            yield _sse("error", {"status": "failed", "error": str(e), "run_id": run_id})
+            return
+    UNDERWRITING_DURATION.labels(decision).observe(time.perf_counter() - start)
+
+@app.post("/underwrite/stream")
+async def underwrite_application_stream(application_id: str = Body(..., embed=True),
+                                        bypass_cache: bool = Body(False, embed=True),
+                                        deadline_seconds: Optional[float] = Body(None, embed=True),
+                                        run_id: Optional[str] = Body(None, embed=True)):
+    """
+    Same workflow as `/underwrite`, streamed as server-sent events: one `node` event per
+    completed graph node (name, elapsed time, its output), then a `complete` event with
+    the decision and report (or an `error` event). Both carry the `run_id` to resume with.
+    """
+    logging.info(f"Received streaming underwriting request for ID: {application_id}")
+    initial_state = _initial_state(application_id, bypass_cache, deadline_seconds)
+    config = run_config(application_id, run_id)
+    return StreamingResponse(_stream_underwriting(initial_state, config, resume=run_id is not None),
+                             media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """ Status, per-node results so far and (once completed) the decision of an underwriting job """
+    job = await asyncio.to_thread(get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No job with id {job_id}")
+    return job
+
+def _check_filter(query: Any) -> None:
+    """ Reject filter operators that execute server-side JavaScript. """
+    if isinstance(query, dict):
+        for key, value in query.items():
+            if key in BATCH_CONFIG['forbidden_filter_operators']:
+                raise HTTPException(status_code=400, detail=f"Filter operator {key} is not allowed")
+            _check_filter(value)
+    elif isinstance(query, list):
+        for value in query:
+            _check_filter(value)
+
+async def _underwrite_item(application_id: str, application: Optional[Dict[str, Any]], bypass_cache: bool,
+                           semaphore: asyncio.Semaphore, deadline_seconds: Optional[float] = None) -> Dict[str, Any]:
+    """ One batch item; failures are reported in the item instead of failing the batch. """
+    if application is None:
+        return {"application_id": application_id, "status": "not_found"}
+    async with semaphore:
+        start = time.perf_counter()
+        config = run_config(application_id)
+        try:
+            # Prefetched document: ingest skips its own Mongo read
+            # The deadline starts when the item runs, not while it waits for a slot
+            final_state = await _run_underwriting(_initial_state(application_id, bypass_cache, deadline_seconds,
+                                                                 application=application), config)
+        except Exception as e:
+            logging.exception(f"Batch underwriting failed for ID: {application_id}")
+            # Resumable through /underwrite with this run_id
+            return {"application_id": application_id, "status": "failed", "error": str(e),
+                    "run_id": config["configurable"]["run_id"]}
+        return {
+            "application_id": application_id,
+            "status": "completed",
+            "run_id": config["configurable"]["run_id"],
+            "elapsed_seconds": round(time.perf_counter() - start, 3),
+            "decision": final_state.get("policy_decision"),
+            "report": final_state.get("underwriting_report")
+        }
+
+async def _stream_batch(ids: List[str], apps: Dict[str, Dict[str, Any]], concurrency: int, bypass_cache: bool,
+                        deadline_seconds: Optional[float] = None):
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = [asyncio.create_task(_underwrite_item(i, apps.get(i), bypass_cache, semaphore, deadline_seconds))
+             for i in ids]
+    counts = {"completed": 0, "failed": 0, "not_found": 0}
+    start = time.perf_counter()
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            item = await next_done
+            counts[item["status"]] += 1
+            yield json.dumps(item, default=str) + "\n"
+        yield json.dumps({"status": "batch_completed", "total": len(ids), **counts,
+                          "elapsed_seconds": round(time.perf_counter() - start, 3)}) + "\n"
+    finally:
+        # Client went away: stop the graphs still queued or running
+        for task in tasks:
+            task.cancel()
+
+@app.post("/underwrite/batch")
+async def underwrite_batch(application_ids: Optional[List[str]] = Body(None, embed=True),
+                           filter: Optional[Dict[str, Any]] = Body(None, embed=True),
+                           limit: Optional[int] = Body(None, embed=True),
+                           concurrency: Optional[int] = Body(None, embed=True),
+                           bypass_cache: bool = Body(False, embed=True),
+                           deadline_seconds: Optional[float] = Body(None, embed=True)):
+    """
+    Underwrite many applications, given as `application_ids` or a Mongo `filter` (with an
+    optional `limit`). Applications are prefetched in bulk and run at most `concurrency`
+    at a time; results stream back as NDJSON in completion order, one line per application,
+    followed by a `batch_completed` summary line. `deadline_seconds` applies to each application.
+    """
+    if (application_ids is None) == (filter is None):
+        raise HTTPException(status_code=400, detail="Provide exactly one of application_ids or filter")
+    max_items = BATCH_CONFIG['max_items']
+    concurrency = max(1, min(concurrency or BATCH_CONFIG['max_concurrency'], BATCH_CONFIG['max_concurrency']))
+
+    if application_ids is not None:
+        ids = list(dict.fromkeys(application_ids))
+        if len(ids) > max_items:
+            raise HTTPException(status_code=400, detail=f"Batch exceeds {max_items} applications")
+        apps = await afetch_applications_from_mongodb(ids, chunk_size=BATCH_CONFIG['prefetch_chunk_size'])
+    else:
+        _check_filter(filter)
+        apps = await afetch_applications_from_mongodb(query=filter, limit=min(limit or max_items, max_items))
+        ids = list(apps)
+
+    logging.info(f"Received batch underwriting request: {len(ids)} applications, {len(apps)} found, "
+                 f"concurrency {concurrency}")
+    return StreamingResponse(_stream_batch(ids, apps, concurrency, bypass_cache, deadline_seconds), media_type="application/x-ndjson")
@@ -0,0 +1,311 @@
+"""
+Offline end-to-end benchmark for the underwriting graph.
+
+Starts local stand-ins (stub Azure OpenAI + insurance API + document server,
+mongomock or a given Mongo URI seeded with synthetic applications), drives
+`insurance_graph` or the FastAPI app at a fixed concurrency and reports latency
+percentiles, throughput and LLM tokens per application. Needs the packages in
+benchmarks/requirements.txt on top of the service's own.
+
+    python -m benchmarks.run --applications 200 --concurrency 16
+    python -m benchmarks.run --mode api --concurrency 32 --json results.json
+    python -m benchmarks.run --baseline results.json --max-regression 0.15
+
+With --baseline the run exits non-zero when p95 latency or throughput regresses
+by more than --max-regression, so it can gate a deploy.
+"""
+
+import io
+import os
+import sys
+import json
+import logging
+import time
+import asyncio
+import argparse
+import tempfile
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from typing import Any, Dict, List, Optional
+
+from .stubs import LATENCY_DEFAULTS, StubServer
+from .synthetic import seed_applications
+
+APPLICATIONS_COLLECTION = "life_insurance_applications"
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """ Linear-interpolated percentile (pct in 0-100). """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low, high = int(rank), min(int(rank) + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline underwriting benchmark")
+    parser.add_argument("--mode", choices=["graph-async", "graph-sync", "api"], default="graph-async",
+                        help="ainvoke on one event loop, invoke on a thread pool, or POST /underwrite in-process")
+    parser.add_argument("--applications", type=int, default=50, help="synthetic applications to seed")
+    parser.add_argument("--requests", type=int, default=None, help="underwritings to run (default: one per application)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=2, help="underwritings run before measuring")
+    parser.add_argument("--incomplete-ratio", type=float, default=0.0, help="share of applications without a PAN")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-cache", action="store_true", help="disable the LLM response and OCR caches")
+    parser.add_argument("--stub-port", type=int, default=None,
+                        help="fixed stub server port; document URLs are part of the prompts, so replaying a "
+                             "recorded cassette (CASSETTE_MODE) needs the port it was recorded with")
+    parser.add_argument("--mongo-uri", default=None, help="real MongoDB to seed instead of mongomock")
+    for name, default in LATENCY_DEFAULTS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=float, default=default)
+    parser.add_argument("--quota-rpm", type=float, default=0, help="stub Azure quota, requests/min (0: unlimited)")
+    parser.add_argument("--quota-tpm", type=float, default=0, help="stub Azure quota, tokens/min (0: unlimited)")
+    parser.add_argument("--json", dest="json_path", default=None, help="write the results as JSON")
+    parser.add_argument("--baseline", default=None, help="results JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="allowed relative p95/throughput regression against --baseline")
+    parser.add_argument("--verbose", action="store_true", help="keep the graph's node logging")
+    return parser.parse_args(argv)
+
+
+def _configure_environment(args: argparse.Namespace, stub: StubServer) -> None:
+    # Must run before app_server is imported: clients read these at import time
+    os.environ["AZURE_OPENAI_ENDPOINT"] = stub.url
+    os.environ["AZURE_OPENAI_KEY"] = "benchmark"
+    os.environ["INSURANCE_API_BASE"] = stub.url
+    # The stub serves the documents; the OCR cache only downloads from allowed hosts
+    os.environ["DOCUMENT_STORE_HOSTS"] = urlsplit(stub.url).hostname
+    os.environ["MONGODB_URI"] = args.mongo_uri or "mongodb://mongomock"
+    os.environ.setdefault("TRACING_EXPORTER", "none")
+    # Size the client-side limiter to the stub's quota (0: unlimited, as in the stub)
+    os.environ.setdefault("AZURE_OPENAI_RPM", str(int(args.quota_rpm)))
+    os.environ.setdefault("AZURE_OPENAI_TPM", str(int(args.quota_tpm)))
+    if args.no_cache:
+        os.environ["LLM_CACHE_ENABLED"] = "false"
+        os.environ["OCR_CACHE_ENABLED"] = "false"
+    if not args.mongo_uri:
+        import pymongo
+        import mongomock
+        pymongo.MongoClient = mongomock.MongoClient
+        # mongomock has no custom BSON type registries and no async client
+        os.environ.setdefault("APPLICATION_CODEC", "json")
+        os.environ.setdefault("MONGO_ASYNC_DRIVER", "false")
+
+
+async def _drive_async(run_one, ids: List[str], concurrency: int) -> List[Dict[str, Any]]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(application_id: str) -> Dict[str, Any]:
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                outcome = await run_one(application_id)
+                return {"latency": time.perf_counter() - start, **outcome}
+            except Exception as e:
+                return {"latency": time.perf_counter() - start, "error": repr(e)}
+
+    return await asyncio.gather(*[one(i) for i in ids])
+
+
+def _drive_threads(run_one, ids: List[str], concurrency: int) -> List[Dict[str, Any]]:
+    def one(application_id: str) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            outcome = run_one(application_id)
+            return {"latency": time.perf_counter() - start, **outcome}
+        except Exception as e:
+            return {"latency": time.perf_counter() - start, "error": repr(e)}
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench") as pool:
+        return list(pool.map(one, ids))
+
+
+def _short_circuit_rule(decision: Optional[Dict[str, Any]]) -> Optional[str]:
+    return ((decision or {}).get("short_circuit") or {}).get("rule")
+
+
+def _outcome(final_state: Dict[str, Any]) -> Dict[str, Any]:
+    return {"node_timings": final_state.get("node_timings"),
+            "short_circuit": _short_circuit_rule(final_state.get("policy_decision"))}
+
+
+def _run_mode(args: argparse.Namespace, warmup_ids: List[str], ids: List[str], on_measure_start):
+    """ Run the warmup, call `on_measure_start`, then the measured underwritings; returns (results, wall seconds). """
+    from app_server.agent.insurance_graph import insurance_graph, run_config
+
+    if args.mode == "graph-sync":
+        def run_one(application_id):
+            return _outcome(insurance_graph.invoke({"application_id": application_id}, run_config(application_id)))
+        _drive_threads(run_one, warmup_ids, args.concurrency)
+        on_measure_start()
+        start = time.perf_counter()
+        results = _drive_threads(run_one, ids, args.concurrency)
+        return results, time.perf_counter() - start
+
+    if args.mode == "graph-async":
+        async def run_one(application_id):
+            return _outcome(await insurance_graph.ainvoke({"application_id": application_id},
+                                                          run_config(application_id)))
+
+        async def main():
+            await _drive_async(run_one, warmup_ids, args.concurrency)
+            on_measure_start()
+            start = time.perf_counter()
+            results = await _drive_async(run_one, ids, args.concurrency)
+            return results, time.perf_counter() - start
+        return asyncio.run(main())
+
+    # api: the real FastAPI app (lifespan included) over an in-process ASGI transport
+    import httpx
+    from app_server.app import app
+    if not os.path.exists(os.environ.get("SSL_CERT_FILE", "")):
+        os.environ.pop("SSL_CERT_FILE", None)
+
+    async def main():
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                async def run_one(application_id):
+                    # force: measure the graph, not the stored result of a warmup / repeated request
+                    resp = await client.post("/underwrite", json={"application_id": application_id, "force": True})
+                    resp.raise_for_status()
+                    return {"short_circuit": _short_circuit_rule(resp.json().get("decision"))}
+                await _drive_async(run_one, warmup_ids, args.concurrency)
+                on_measure_start()
+                start = time.perf_counter()
+                results = await _drive_async(run_one, ids, args.concurrency)
+                return results, time.perf_counter() - start
+    return asyncio.run(main())
+
+
+def summarize(args: argparse.Namespace, results: List[Dict[str, Any]], wall: float,
+              stub_stats: Dict[str, Any]) -> Dict[str, Any]:
+    ok = [r for r in results if "error" not in r]
+    latencies = [r["latency"] for r in ok]
+    count = max(1, len(results))
+    prompt = sum(stub_stats["prompt_tokens"].values())
+    completion = sum(stub_stats["completion_tokens"].values())
+
+    node_latencies: Dict[str, List[float]] = {}
+    for r in ok:
+        for node, seconds in (r.get("node_timings") or {}).items():
+            node_latencies.setdefault(node, []).append(seconds)
+
+    short_circuits: Dict[str, int] = {}
+    for r in ok:
+        if r.get("short_circuit"):
+            short_circuits[r["short_circuit"]] = short_circuits.get(r["short_circuit"], 0) + 1
+
+    return {
+        "mode": args.mode,
+        "concurrency": args.concurrency,
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "error_samples": [r["error"] for r in results if "error" in r][:3],
+        "wall_seconds": round(wall, 3),
+        "applications_per_second": round(len(ok) / wall, 3) if wall else None,
+        "latency_seconds": {
+            "p50": percentile(latencies, 50), "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99), "max": max(latencies) if latencies else None
+        },
+        "llm": {
+            "calls_per_application": round(sum(stub_stats["llm_calls"].values()) / count, 2),
+            "prompt_tokens_per_application": round(prompt / count, 1),
+            "completion_tokens_per_application": round(completion / count, 1),
+            "tokens_per_application": round((prompt + completion) / count, 1),
+            "calls_by_node": stub_stats["llm_calls"],
+            "throttled_per_application": round(stub_stats["throttled"] / count, 2)
+        },
+        "mcp_calls_per_application": round(sum(stub_stats["mcp_calls"].values()) / count, 2),
+        "document_fetches_per_application": round(stub_stats["document_fetches"] / count, 2),
+        "short_circuits": short_circuits,
+        "node_latency_seconds": {
+            node: {"p50": percentile(v, 50), "p95": percentile(v, 95)} for node, v in sorted(node_latencies.items())
+        }
+    }
+
+
+def print_summary(summary: Dict[str, Any]) -> None:
+    lat = summary["latency_seconds"]
+    fmt = lambda v: f"{v:.3f}" if isinstance(v, (int, float)) else "n/a"
+    print(f"\n📊 Benchmark ({summary['mode']}, concurrency {summary['concurrency']}): "
+          f"{summary['requests']} underwritings, {summary['errors']} errors, {summary['wall_seconds']}s wall")
+    print(f"   latency  p50 {fmt(lat['p50'])}s  p95 {fmt(lat['p95'])}s  p99 {fmt(lat['p99'])}s  max {fmt(lat['max'])}s")
+    print(f"   throughput {summary['applications_per_second']} applications/sec")
+    llm = summary["llm"]
+    print(f"   LLM {llm['calls_per_application']} calls/app, {llm['tokens_per_application']} tokens/app "
+          f"({llm['prompt_tokens_per_application']} prompt + {llm['completion_tokens_per_application']} completion), "
+          f"{llm['throttled_per_application']} 429s/app")
+    print(f"   MCP {summary['mcp_calls_per_application']} calls/app, "
+          f"documents {summary['document_fetches_per_application']} fetches/app")
+    if summary["short_circuits"]:
+        print("   short-circuits " + ", ".join(f"{rule} {n}" for rule, n in sorted(summary["short_circuits"].items())))
+    for node, stats in summary["node_latency_seconds"].items():
+        print(f"   {node:<20} p50 {fmt(stats['p50'])}s  p95 {fmt(stats['p95'])}s")
+    for sample in summary["error_samples"]:
+        print(f"   ⚠️  {sample}")
+
+
+def compare_to_baseline(summary: Dict[str, Any], baseline_path: str, max_regression: float) -> List[str]:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    failures = []
+    base_p95, p95 = baseline["latency_seconds"]["p95"], summary["latency_seconds"]["p95"]
+    if base_p95 and p95 and p95 > base_p95 * (1 + max_regression):
+        failures.append(f"p95 latency {p95:.3f}s vs baseline {base_p95:.3f}s")
+    base_tput, tput = baseline["applications_per_second"], summary["applications_per_second"]
+    if base_tput and tput is not None and tput < base_tput * (1 - max_regression):
+        failures.append(f"throughput {tput} vs baseline {base_tput} applications/sec")
+    base_tokens, tokens = baseline["llm"]["tokens_per_application"], summary["llm"]["tokens_per_application"]
+    if base_tokens and tokens > base_tokens * (1 + max_regression):
+        failures.append(f"tokens/application {tokens} vs baseline {base_tokens}")
+    return failures
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    latency = {name: getattr(args, name) for name in LATENCY_DEFAULTS}
+    stub = StubServer(latency, seed=args.seed, port=args.stub_port,
+                      quota_rpm=args.quota_rpm, quota_tpm=args.quota_tpm).start()
+    print(f"🧪 Stub OpenAI / insurance API / documents at {stub.url}")
+    _configure_environment(args, stub)
+
+    # Reports are written relative to the working directory
+    os.chdir(tempfile.mkdtemp(prefix="underwriting-bench-"))
+    from app_server.agent.insurance_graph import db
+    ids = seed_applications(db[APPLICATIONS_COLLECTION], args.applications, stub.url, args.seed, args.incomplete_ratio)
+    total = args.requests or len(ids)
+    run_ids = [ids[i % len(ids)] for i in range(total)]
+    warmup_ids = ids[:args.warmup]
+
+    # Node prints and per-request client logs would dominate the output at any useful request count
+    if not args.verbose:
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        results, wall = _run_mode(args, warmup_ids, run_ids, stub.stats.reset)
+    summary = summarize(args, results, wall, stub.stats.snapshot())
+    stub.stop()
+
+    print_summary(summary)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(summary, f, indent=2)
+    failures = []
+    # Synthetic applications always carry every required section (some under an accepted alias)
+    missing = summary["short_circuits"].get("missing_sections", 0)
+    if missing:
+        failures.append(f"{missing} complete applications short-circuited as missing sections")
+    if args.baseline:
+        failures += compare_to_baseline(summary, args.baseline, args.max_regression)
+    for failure in failures:
+        print(f"❌ Regression: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+"""
+Local stand-ins for the services the underwriting graph calls.
+
+One FastAPI app serves:
+- an Azure OpenAI-compatible chat completions endpoint with canned JSON per
+  node prompt, realistic `usage` token counts and a configurable latency model
+  (lognormal time-to-first-token plus a per-output-token cost);
+- the insurance API used by the MCP tools (/insurance-history, /financial-eligibility);
+- document images for OCR, with ETags so the HTTP-validator cache path is exercised.
+
+An optional quota (requests and tokens per minute, tokens counted as prompt plus
+max_tokens like Azure) answers over-quota chat completions with 429 and
+`retry-after-ms`.
+
+The server runs under uvicorn in a background thread; see StubServer.
+"""
+
+import time
+import json
+import socket
+import random
+import asyncio
+import hashlib
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+
+# Prompt marker -> node label, in the order they are checked
+NODE_MARKERS = [
+    ("document extraction model", "document_ocr"),
+    ("data-normalizer", "ingest"),
+    ("KYC reconciliation", "kyc"),
+    ("underwriting assistant", "health"),
+    ("financial eligibility engine", "financial"),
+    ("insurance history risk evaluator", "insurance_history"),
+    ("occupation risk assessor", "occupation"),
+    ("senior underwriter", "decision_summary"),
+    ("report writer", "report"),
+]
+
+LATENCY_DEFAULTS = {
+    "llm_ttft_ms": 400.0,        # median time to first token
+    "llm_ms_per_token": 8.0,     # per completion token
+    "llm_sigma": 0.35,           # lognormal spread of the TTFT
+    "mcp_median_ms": 80.0,
+    "mcp_sigma": 0.3,
+    "document_median_ms": 30.0,
+    "document_sigma": 0.3
+}
+
+
+def _stable_random(*parts: Any) -> random.Random:
+    seed = hashlib.sha256("|".join(map(str, parts)).encode("utf-8")).hexdigest()
+    return random.Random(int(seed[:16], 16))
+
+
+def _recommendation(score: float) -> str:
+    return "Accept" if score <= 0.3 else "Manual Review" if score <= 0.6 else "Decline"
+
+
+def _prompt_text(messages: List[Dict[str, Any]]) -> Tuple[str, int]:
+    """ Concatenated text of the messages and the number of attached images. """
+    texts, images = [], 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            texts.append(content)
+        elif isinstance(content, list):
+            for part in content:
+                if part.get("type") == "text":
+                    texts.append(part.get("text", ""))
+                elif part.get("type") == "image_url":
+                    images += 1
+    return "\n".join(texts), images
+
+
+def node_for_prompt(text: str) -> str:
+    for marker, node in NODE_MARKERS:
+        if marker in text:
+            return node
+    return "other"
+
+
+def canned_content(node: str, text: str) -> str:
+    """ Plausible response for a node prompt; scores are stable per prompt. """
+    rng = _stable_random(node, text)
+    score = round(rng.uniform(0.05, 0.7), 2)
+    if node == "document_ocr":
+        return json.dumps({"document_type": rng.choice(["PAN", "Aadhaar"]), "name": "Synthetic Applicant",
+                           "father_name": None, "gender": "M", "dob": "1990-01-01", "id_number": "ABCDE1234F"})
+    if node == "ingest":
+        return json.dumps({"patch": {}})
+    if node == "kyc":
+        confidence = round(rng.uniform(0.7, 0.98), 2)
+        return json.dumps({
+            "kyc_status": "Verified" if confidence > 0.75 else "Manual Review",
+            "kyc_confidence": confidence,
+            "personal_verification": {"name_match": True, "dob_match": True, "id_match": True, "overall": "verified"},
+            "nominee_verification": {"name_match": True, "dob_match": True, "overall": "verified"},
+            "mismatches": [], "red_flags": [],
+            "llm_explanation": "Form details match the submitted documents."
+        })
+    if node == "health":
+        return json.dumps({
+            "bmi": round(rng.uniform(19, 33), 1), "risk_score": score, "recommendation": _recommendation(score),
+            "risk_factors": ["Disclosed condition"], "medical_exam_required": score > 0.4,
+            "exam_type": "ML3" if score > 0.4 else None, "exam_reasons": ["Age/sum assured band"] if score > 0.4 else [],
+            "llm_explanation": "Assessed against the non-medical limits and disclosed history."
+        })
+    if node == "financial":
+        return json.dumps({"income_to_coverage_ratio": round(rng.uniform(5, 25), 1), "risk_score": score,
+                           "recommendation": _recommendation(score)})
+    if node == "insurance_history":
+        return json.dumps({"total_existing_coverage": rng.choice([0, 2500000, 5000000]), "risk_score": score,
+                           "recommendation": _recommendation(score), "red_flags": [],
+                           "llm_explanation": "No adverse history."})
+    if node == "occupation":
+        return json.dumps({"risk_score": score, "recommendation": _recommendation(score),
+                           "reasons": ["Industry risk band"]})
+    if node == "decision_summary":
+        return json.dumps({"ai_summary": "The applicant's combined risk profile supports the decision. "
+                                         "Key drivers are listed in the decision reasons."})
+    if node == "report":
+        return ("The applicant has been assessed across identity, health, financial, insurance history and "
+                "occupation dimensions. " * 3 + "\n\n" +
+                "Based on the weighted component scores the recommended decision is recorded in the decision "
+                "section, together with the main factors and any outstanding requirements. " * 2)
+    return json.dumps({})
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class Quota:
+    """
+    Per-minute request/token buckets holding 10 seconds' worth, like Azure's short
+    enforcement windows; `admit` returns 0 or the seconds until the call would fit.
+    """
+
+    WINDOW = 10  # seconds
+
+    def __init__(self, rpm: float = 0, tpm: float = 0):
+        self.limits = {"requests": rpm, "tokens": tpm}
+        self.available = {k: v * self.WINDOW / 60 for k, v in self.limits.items()}
+        self.updated = time.monotonic()
+
+    def admit(self, tokens: int) -> float:
+        now = time.monotonic()
+        for kind, limit in self.limits.items():
+            if limit:
+                self.available[kind] = min(limit * self.WINDOW / 60,
+                                           self.available[kind] + (now - self.updated) * limit / 60)
+        self.updated = now
+        cost = {"requests": 1, "tokens": tokens}
+        wait = max((cost[k] - self.available[k]) * 60 / limit for k, limit in self.limits.items() if limit) \
+            if any(self.limits.values()) else 0.0
+        if wait > 0:
+            return wait
+        for kind, limit in self.limits.items():
+            if limit:
+                self.available[kind] -= cost[kind]
+        return 0.0
+
+
+class StubStats:
+    """ Counters read by the benchmark runner (single event loop writes, so no locking needed). """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.llm_calls: Dict[str, int] = defaultdict(int)
+        self.prompt_tokens: Dict[str, int] = defaultdict(int)
+        self.completion_tokens: Dict[str, int] = defaultdict(int)
+        self.mcp_calls: Dict[str, int] = defaultdict(int)
+        self.throttled = 0
+        self.document_fetches = 0
+        self.document_heads = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "llm_calls": dict(self.llm_calls),
+            "prompt_tokens": dict(self.prompt_tokens),
+            "completion_tokens": dict(self.completion_tokens),
+            "mcp_calls": dict(self.mcp_calls),
+            "throttled": self.throttled,
+            "document_fetches": self.document_fetches,
+            "document_heads": self.document_heads
+        }
+
+
+def create_stub_app(latency: Optional[Dict[str, float]] = None, seed: int = 0,
+                    quota_rpm: float = 0, quota_tpm: float = 0) -> Tuple[FastAPI, StubStats]:
+    latency = {**LATENCY_DEFAULTS, **(latency or {})}
+    rng = random.Random(seed)
+    stats = StubStats()
+    quota = Quota(quota_rpm, quota_tpm)
+    app = FastAPI()
+
+    def sample_ms(median: float, sigma: float) -> float:
+        return median * rng.lognormvariate(0, sigma) if median > 0 else 0.0
+
+    @app.post("/openai/deployments/{deployment}/chat/completions")
+    async def chat_completions(deployment: str, request: Request):
+        body = await request.json()
+        text, images = _prompt_text(body.get("messages", []))
+        node = node_for_prompt(text)
+        content = canned_content(node, text)
+        prompt_tokens = estimate_tokens(text) + 85 * images
+        completion_tokens = min(estimate_tokens(content), body.get("max_tokens") or 4096)
+
+        wait = quota.admit(prompt_tokens + (body.get("max_tokens") or 4096))
+        if wait:
+            stats.throttled += 1
+            return Response(status_code=429, media_type="application/json",
+                            headers={"retry-after-ms": str(int(wait * 1000) + 1), "retry-after": str(int(wait) + 1)},
+                            content=json.dumps({"error": {"code": "429", "message": "Rate limit is exceeded."}}))
+
+        delay = sample_ms(latency["llm_ttft_ms"], latency["llm_sigma"]) + completion_tokens * latency["llm_ms_per_token"]
+        await asyncio.sleep(delay / 1000)
+
+        stats.llm_calls[node] += 1
+        stats.prompt_tokens[node] += prompt_tokens
+        stats.completion_tokens[node] += completion_tokens
+        return {
+            "id": f"chatcmpl-bench-{stats.llm_calls[node]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model") or deployment,
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens,
+                      "prompt_tokens_details": {"cached_tokens": 0}}
+        }
+
+    async def _mcp_delay(tool: str) -> None:
+        stats.mcp_calls[tool] += 1
+        await asyncio.sleep(sample_ms(latency["mcp_median_ms"], latency["mcp_sigma"]) / 1000)
+
+    @app.get("/insurance-history/{pan}")
+    async def insurance_history(pan: str):
+        await _mcp_delay("insurance_history")
+        r = _stable_random("history", pan)
+        policies = [{"policyNumber": f"P{r.randint(100000, 999999)}", "type": "Term", "status": "Active",
+                     "sumAssured": r.choice([2500000, 5000000, 10000000])} for _ in range(r.randint(0, 2))]
+        return {"pan": pan, "policies": policies, "claims": r.choice([0, 0, 0, 1]), "lapses": 0,
+                "underwritingFlag": r.choice(["clean", "clean", "review"])}
+
+    @app.get("/financial-eligibility/{pan}")
+    async def financial_eligibility(pan: str):
+        await _mcp_delay("financial_eligibility")
+        r = _stable_random("financial", pan)
+        income = r.choice([600000, 1200000, 2400000, 4800000])
+        return {"pan": pan, "annualIncome": income, "eligible": r.random() > 0.05,
+                "premium_to_income_ratio": round(r.uniform(0.01, 0.12), 3),
+                "total_liabilities": int(income * r.uniform(0, 1.5)), "creditScore": r.randint(650, 850)}
+
+    @app.api_route("/documents/{application_id}/{filename}", methods=["GET", "HEAD"])
+    async def document(application_id: str, filename: str, request: Request):
+        # Unique bytes per application/document so the OCR content cache behaves as in production
+        data = hashlib.sha256(f"{application_id}/{filename}".encode()).digest() * 1024
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        if request.method == "HEAD":
+            stats.document_heads += 1
+            return Response(headers={"etag": etag, "content-type": "image/jpeg", "content-length": str(len(data))})
+        stats.document_fetches += 1
+        await asyncio.sleep(sample_ms(latency["document_median_ms"], latency["document_sigma"]) / 1000)
+        return Response(content=data, media_type="image/jpeg", headers={"etag": etag})
+
+    return app, stats
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class StubServer:
+    """ Runs the stub app under uvicorn in a daemon thread. """
+
+    def __init__(self, latency: Optional[Dict[str, float]] = None, seed: int = 0, port: Optional[int] = None,
+                 quota_rpm: float = 0, quota_tpm: float = 0):
+        self.app, self.stats = create_stub_app(latency, seed, quota_rpm, quota_tpm)
+        self.port = port or _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self._server = uvicorn.Server(uvicorn.Config(
+            self.app, host="127.0.0.1", port=self.port, log_level="warning", access_log=False,
+            backlog=4096, timeout_keep_alive=30
+        ))
+        self._thread = threading.Thread(target=self._server.run, name="stub-server", daemon=True)
+
+    def start(self, timeout: float = 10.0) -> "StubServer":
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError("Stub server failed to start")
+            time.sleep(0.02)
+        return self
+
+    def stop(self) -> None:
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
@@ -0,0 +1,98 @@
+"""
+Synthetic life-insurance applications for the benchmark suite.
+
+The mix exercises the different graph paths: clean applications the rule-based
+fast path can decide, disclosed conditions and high-risk industries that need
+the LLM, non-ISO dates/phones for the normalizer, section aliases, and
+(optionally) incomplete applications that short-circuit after ingest.
+"""
+
+import random
+import string
+from datetime import date, timedelta
+from typing import Any, Dict, List
+
+FIRST_NAMES = ["Aarav", "Vivaan", "Aditya", "Ananya", "Diya", "Isha", "Kabir", "Meera", "Rohan", "Saanvi"]
+LAST_NAMES = ["Sharma", "Iyer", "Patel", "Reddy", "Nair", "Gupta", "Singh", "Das", "Menon", "Joshi"]
+CITIES = [("Bengaluru", "Karnataka"), ("Mumbai", "Maharashtra"), ("Chennai", "Tamil Nadu"),
+          ("Pune", "Maharashtra"), ("Hyderabad", "Telangana"), ("Kolkata", "West Bengal")]
+INDUSTRIES = ["IT", "Banking", "Education", "Healthcare", "Consulting", "Real Estate", "Jewellery", "Mining",
+              "Retail", "Manufacturing"]
+CONDITIONS = ["hypertension", "type 2 diabetes", "asthma", "thyroid disorder", "angioplasty in 2019"]
+
+
+def _pan(rng: random.Random) -> str:
+    letters = string.ascii_uppercase
+    return "".join(rng.choice(letters) for _ in range(5)) + f"{rng.randint(0, 9999):04d}" + rng.choice(letters)
+
+
+def _dob(rng: random.Random, age: int) -> date:
+    return date.today() - timedelta(days=age * 365 + rng.randint(0, 364))
+
+
+def make_application(index: int, rng: random.Random, document_base_url: str,
+                     incomplete_ratio: float = 0.0) -> Dict[str, Any]:
+    application_id = f"bench-{index:06d}"
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    city, state = rng.choice(CITIES)
+    age = rng.randint(21, 60)
+    dob = _dob(rng, age)
+    income = rng.choice([600000, 900000, 1200000, 1800000, 2400000, 4800000])
+    coverage = income * rng.choice([5, 10, 15, 20])
+    height = rng.randint(150, 190)
+    bmi = rng.uniform(19, 34)
+    health: Dict[str, Any] = {
+        "weight": round(bmi * (height / 100) ** 2),
+        "height": height,
+        "tobacco_consumption": rng.choice(["No", "No", "No", "Yes"])
+    }
+    if rng.random() < 0.3:
+        health["medical_history"] = rng.choice(CONDITIONS)
+
+    app = {
+        "_id": application_id,
+        "personal_details": {
+            "fullName": f"{first} {last}",
+            # Mix of ISO and day-first dates for the normalizer
+            "dob": dob.isoformat() if rng.random() < 0.7 else dob.strftime("%d/%m/%Y"),
+            "gender": rng.choice(["Male", "Female"]),
+            "address": f"{rng.randint(1, 300)} {rng.choice(['mg road', 'main street', 'park avenue'])}, {city.lower()}",
+            "state": state.upper() if rng.random() < 0.3 else state,
+            "panNumber": _pan(rng),
+            "occupation": rng.choice(["Engineer", "Teacher", "Manager", "Consultant", "Trader"]),
+            "annualIncome": income
+        },
+        "contact_info": {
+            "phone": rng.choice([f"9{rng.randint(100000000, 999999999)}", f"+91 9{rng.randint(100000000, 999999999)}"]),
+            "email": f"{first}.{last}{index}@Example.com"
+        },
+        "health_info": health,
+        "coverage_selection": {"coverageAmount": coverage, "term": rng.choice([10, 20, 30]), "selectedPlan": "Term Life"},
+        "nominee_details": {"name": f"{rng.choice(FIRST_NAMES)} {last}", "relation": rng.choice(["Spouse", "Parent", "Child"]),
+                            "dob": _dob(rng, rng.randint(5, 70)).isoformat()},
+        "payment": {"method": rng.choice(["upi", "card", "netbanking"]), "status": "paid"},
+        "occupation_details": {"employmentType": rng.choice(["Salaried", "Salaried", "Self-employed"]),
+                               "industry": rng.choice(INDUSTRIES)},
+        "financial_information": {"annualIncome": income},
+        "documents": [
+            {"docType": "PAN", "filename": "pan.jpg", "url": f"{document_base_url}/documents/{application_id}/pan.jpg"},
+            {"docType": "Aadhaar", "filename": "aadhaar.jpg",
+             "url": f"{document_base_url}/documents/{application_id}/aadhaar.jpg"}
+        ]
+    }
+    if index % 5 == 4:
+        # Some applications store health data under the accepted `health_information` alias
+        app["health_information"] = app.pop("health_info")
+    if rng.random() < incomplete_ratio:
+        del app["personal_details"]["panNumber"]
+    return app
+
+
+def seed_applications(collection, count: int, document_base_url: str, seed: int = 0,
+                      incomplete_ratio: float = 0.0) -> List[str]:
+    """ Insert `count` synthetic applications and return their ids. """
+    rng = random.Random(seed)
+    apps = [make_application(i, rng, document_base_url, incomplete_ratio) for i in range(count)]
+    collection.delete_many({"_id": {"$in": [a["_id"] for a in apps]}})
+    collection.insert_many(apps)
+    return [a["_id"] for a in apps]